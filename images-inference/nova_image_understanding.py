@@ -2,6 +2,8 @@
 import base64
 import boto3
 import json
+import sys
+from pathlib import Path
 
 # Create a Bedrock Runtime client in the AWS Region of your choice.
 client = boto3.client(
@@ -15,10 +17,25 @@ client = boto3.client(
 
 MODEL_ID = "us.amazon.nova-lite-v1:0"
 
+# Optional: downscale and re-encode the image before upload to cut payload size
+# and input tokens (requires Pillow). See performance/image_preprocess.py.
+PREPROCESS = False
+
+# Optional: add a prompt-cache point after the image so repeated calls with the
+# same image and system prompt read the prefix from cache (cheaper and faster).
+PROMPT_CACHE = False
+
 with open("media/test1.png", "rb") as image_file:
     binary_data = image_file.read()
-    base_64_encoded_data = base64.b64encode(binary_data)
-    base64_string = base_64_encoded_data.decode("utf-8")
+image_format = "png"
+if PREPROCESS:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "performance"))
+    from image_preprocess import ImagePreprocessor
+    image = ImagePreprocessor().process(binary_data)
+    binary_data, image_format = image.data, image.format
+    print(f"Preprocessed image: {image.original_bytes} -> {len(image.data)} bytes ({image.format})")
+base_64_encoded_data = base64.b64encode(binary_data)
+base64_string = base_64_encoded_data.decode("utf-8")
 # Define your system prompt(s).
 system_list = [    {
         "text": "You are an expert artist. When the user provides you with an image, provide 3 potential art titles"
@@ -31,7 +48,7 @@ message_list = [
         "content": [
             {
                 "image": {
-                    "format": "png",
+                    "format": image_format,
                     "source": {"bytes": base64_string},
                 }
             },
@@ -41,6 +58,8 @@ message_list = [
         ],
     }
 ]
+if PROMPT_CACHE:
+    message_list[0]["content"].insert(1, {"cachePoint": {"type": "default"}})
 # Configure the inference parameters.
 inf_params = {"max_new_tokens": 300, "top_p": 0.1, "top_k": 20, "temperature": 0.3}
 
@@ -55,6 +74,10 @@ response = client.invoke_model(modelId=MODEL_ID, body=json.dumps(native_request)
 model_response = json.loads(response["body"].read())
 print("[Full Response]")
 print(json.dumps(model_response, indent=2))
+if PROMPT_CACHE:
+    usage = model_response.get("usage", {})
+    print(f"Cache read: {usage.get('cacheReadInputTokenCount', 0)} tokens, "
+          f"cache write: {usage.get('cacheWriteInputTokenCount', 0)} tokens")
 content_text = model_response["output"]["message"]["content"][0]["text"]
 print("\n[Response Content Text]")
 print(content_text)
\ No newline at end of file
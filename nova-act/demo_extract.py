@@ -1,20 +1,40 @@
 """
 Nova Act Demo: Extract structured data from Amazon Best Sellers
+The result is cached with a page fingerprint (see extraction_cache.py): when the
+page has not changed since the last run, the browser agent is skipped.
 """
 from nova_act import NovaAct
 
-with NovaAct(starting_page="https://www.amazon.com/gp/bestsellers/wireless/7072561011") as nova:
-    result = nova.act(
-        "Extract the top 5 best-selling cellphones with rank, name, price, and rating",
-        schema={
-            "phones": [{
-                "rank": "int",
-                "name": "str",
-                "price": "str",
-                "rating": "str"
-            }]
-        }
-    )
-    print("Top 5 Best-Selling Cellphones:")
-    for phone in result.parsed_response.get("phones", []):
-        print(f"#{phone['rank']}: {phone['name']} - {phone['price']} ({phone['rating']})")
+from extraction_cache import ExtractionCache
+
+URL = "https://www.amazon.com/gp/bestsellers/wireless/7072561011"
+INSTRUCTION = "Extract the top 5 best-selling cellphones with rank, name, price, and rating"
+SCHEMA = {
+    "phones": [{
+        "rank": "int",
+        "name": "str",
+        "price": "str",
+        "rating": "str"
+    }]
+}
+
+cache = ExtractionCache()
+entry, fingerprint = cache.lookup(URL, INSTRUCTION, SCHEMA)
+# Entries written before failed extractions were filtered out may hold None: treat them as a miss
+if entry and entry["parsed_response"] is not None:
+    print("Page unchanged since the last run, using the cached result")
+    parsed_response = entry["parsed_response"]
+else:
+    with NovaAct(starting_page=URL) as nova:
+        result = nova.act(INSTRUCTION, schema=SCHEMA)
+    parsed_response = result.parsed_response
+    # Only cache a valid extraction: a failed one would be replayed until the page changes
+    if result.matches_schema and parsed_response is not None:
+        cache.store(URL, INSTRUCTION, SCHEMA, fingerprint, parsed_response)
+    else:
+        print(f"Extraction did not match the schema, not cached: {result.response}")
+        parsed_response = {}
+
+print("Top 5 Best-Selling Cellphones:")
+for phone in parsed_response.get("phones", []):
+    print(f"#{phone['rank']}: {phone['name']} - {phone['price']} ({phone['rating']})")
@@ -0,0 +1,170 @@
+"""
+Extraction cache for schema-based Nova Act runs, keyed on URL + instruction + schema
+
+Before the browser agent runs, the page is fingerprinted with a plain HTTP
+request. A conditional GET (If-None-Match / If-Modified-Since) is used when an
+earlier ETag or Last-Modified is known; otherwise the fingerprint is a hash
+of the HTML with scripts, styles, comments and whitespace stripped. If the
+fingerprint matches the cached entry, the stored parsed_response is returned
+and no agent steps are spent. Recurring jobs then only pay agent latency for
+pages that actually changed.
+
+Pages that refuse plain HTTP clients (bot checks, login walls) cannot be
+fingerprinted; they are treated as changed so the agent always runs.
+
+Usage:
+    python nova-act/extraction_cache.py show --cache .nova_act_cache.json
+    python nova-act/extraction_cache.py fingerprint https://example.com/page
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = ".nova_act_cache.json"
+FINGERPRINT_TIMEOUT_SECONDS = 10
+USER_AGENT = "Mozilla/5.0 (compatible; nova-act-extraction-cache)"
+
+# Parts of a page that change on every load without changing its content
+_VOLATILE_HTML = re.compile(r"<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->|<noscript\b.*?</noscript>",
+                            re.S | re.I)
+
+
+def cache_key(url, instruction, schema=None):
+    payload = json.dumps({"url": url, "instruction": instruction, "schema": schema}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_hash(html):
+    text = _VOLATILE_HTML.sub("", html)
+    text = re.sub(r"\s+", " ", text).strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def page_fingerprint(url, previous=None, timeout=FINGERPRINT_TIMEOUT_SECONDS):
+    """Fingerprint a page; returns (fingerprint, unchanged).
+
+    fingerprint is a dict with etag / last_modified / content_hash, or None if
+    the page could not be fetched. unchanged is True only when the server
+    answered 304 or the fingerprint matches `previous`.
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if previous and previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous and previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            fingerprint = {"etag": response.headers.get("ETag"),
+                           "last_modified": response.headers.get("Last-Modified"),
+                           "content_hash": None}
+            if not fingerprint["etag"]:
+                charset = response.headers.get_content_charset() or "utf-8"
+                fingerprint["content_hash"] = content_hash(response.read().decode(charset, errors="replace"))
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and previous:
+            return previous, True
+        return None, False
+    except (urllib.error.URLError, OSError, ValueError):
+        return None, False
+    return fingerprint, same_fingerprint(previous, fingerprint)
+
+
+def same_fingerprint(a, b):
+    """Compare on the strongest validator both sides have."""
+    if not a or not b:
+        return False
+    for field in ("etag", "content_hash", "last_modified"):
+        if a.get(field) and b.get(field):
+            return a[field] == b[field]
+    return False
+
+
+class ExtractionCache:
+    """JSON-file cache of extraction results; safe to share between pool workers."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_seconds=None):
+        self.path = Path(path)
+        self.max_age_seconds = max_age_seconds
+        self.entries = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.stats = {"hits": 0, "misses": 0, "unfingerprintable": 0, "expired": 0}
+        self._lock = threading.Lock()
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.entries, indent=2, ensure_ascii=False))
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, url, instruction, schema=None):
+        """Returns (entry or None, fingerprint); entry is only returned when the page is unchanged."""
+        key = cache_key(url, instruction, schema)
+        with self._lock:
+            entry = self.entries.get(key)
+        fingerprint, unchanged = page_fingerprint(url, entry["fingerprint"] if entry else None)
+        with self._lock:
+            if fingerprint is None:
+                self.stats["unfingerprintable"] += 1
+            elif entry and unchanged:
+                if self.max_age_seconds and time.time() - entry["extracted_at"] > self.max_age_seconds:
+                    self.stats["expired"] += 1
+                else:
+                    entry["hits"] += 1
+                    entry["checked_at"] = time.time()
+                    self.stats["hits"] += 1
+                    self.save()
+                    return entry, fingerprint
+            self.stats["misses"] += 1
+        return None, fingerprint
+
+    def store(self, url, instruction, schema, fingerprint, parsed_response, response=None):
+        """Only results with a usable fingerprint are stored; they could never be validated otherwise."""
+        if fingerprint is None:
+            return
+        now = time.time()
+        with self._lock:
+            self.entries[cache_key(url, instruction, schema)] = {
+                "url": url,
+                "instruction": instruction,
+                "schema": schema,
+                "fingerprint": fingerprint,
+                "parsed_response": parsed_response,
+                "response": response,
+                "extracted_at": now,
+                "checked_at": now,
+                "hits": 0,
+            }
+            self.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the Nova Act extraction cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="list cached extractions")
+    show.add_argument("--cache", default=DEFAULT_CACHE_PATH)
+    fp = sub.add_parser("fingerprint", help="fingerprint a page the way the cache does")
+    fp.add_argument("url")
+    args = parser.parse_args()
+
+    if args.command == "fingerprint":
+        start = time.time()
+        fingerprint, _ = page_fingerprint(args.url)
+        print(json.dumps(fingerprint, indent=2) if fingerprint else "Page could not be fingerprinted")
+        print(f"{time.time() - start:.2f}s")
+        return
+
+    cache = ExtractionCache(args.cache)
+    for entry in sorted(cache.entries.values(), key=lambda e: e["extracted_at"]):
+        validator = next((f for f in ("etag", "last_modified", "content_hash") if entry["fingerprint"].get(f)), "-")
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['extracted_at']))} "
+              f"hits {entry['hits']:>4} [{validator}] {entry['url']} :: {entry['instruction'][:60]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+Nova Act session pool: run many extraction tasks over N warm headless browsers
+
+Browser startup dominates a single-task run, so each worker thread keeps one
+NovaAct session open, navigates it to the next task's URL and reuses it. A
+worker starts its session on the first task that actually needs a browser.
+Sessions are recycled after a bounded number of tasks and after any failure.
+Each task gets its own timeout and max_steps budget, and results are written
+as JSON lines with per-phase and per-step timings.
+
+A NovaAct session is bound to the thread that started it (Playwright sync
+API), so every session lives and dies on its own worker thread.
+
+Usage:
+    python nova-act/session_pool.py nova-act/sample_tasks.jsonl --serve nova-act/sample_site --workers 3
+    python nova-act/session_pool.py tasks.jsonl --workflow demo-search --output results.jsonl
+    python nova-act/session_pool.py nova-act/sample_tasks.jsonl --serve nova-act/sample_site --stand-in
+
+Task file (one JSON object per line):
+    {"id": "p1", "url": "/products.html", "instruction": "...", "schema": {...}, "max_steps": 10, "timeout": 120}
+Relative URLs are resolved against the --serve address. With --cache, schema
+tasks whose page fingerprint is unchanged are answered from the extraction
+cache without touching a session (see extraction_cache.py).
+"""
+import argparse
+import functools
+import json
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from extraction_cache import DEFAULT_CACHE_PATH, ExtractionCache
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_TASKS_PER_SESSION = 20
+DEFAULT_MAX_STEPS = 15
+DEFAULT_TIMEOUT_SECONDS = 180
+DEFAULT_NAVIGATION_TIMEOUT_SECONDS = 30
+
+# Retrying these only burns the same budget again
+NO_RETRY_ERRORS = ("ActExceededMaxStepsError", "ActGuardrailsError", "ActBadRequestError",
+                   "ActDailyQuotaExceededError")
+
+
+def nova_act_factory(headless=True, navigation_timeout=DEFAULT_NAVIGATION_TIMEOUT_SECONDS, **kwargs):
+    """Session factory for real NovaAct browsers.
+
+    Call it on the thread that holds the workflow context (inside a @workflow
+    function): worker threads do not inherit ContextVars, so the current
+    workflow is captured here and passed to each session explicitly.
+    """
+    from nova_act import NovaAct, get_current_workflow
+
+    workflow = get_current_workflow()
+
+    def create(starting_page):
+        return NovaAct(starting_page=starting_page, headless=headless, workflow=workflow,
+                       go_to_url_timeout=navigation_timeout, **kwargs)
+
+    return create
+
+
+class StandInActError(Exception):
+    """Stand-in failure; the class name is reported the way Nova Act error names are."""
+
+    def __init__(self, kind, message):
+        self.kind = kind
+        super().__init__(message)
+
+
+class StandInSession:
+    """Offline stand-in with NovaAct's start/go_to_url/act/act_get/stop surface.
+
+    Pages are really fetched (so it works against --serve), while startup and
+    agent steps are simulated sleeps. parsed_response carries the page title
+    and link count rather than schema-shaped data.
+    """
+
+    def __init__(self, starting_page, start_seconds=2.0, step_seconds=0.3, failure_rate=0.05, seed=None):
+        self.starting_page = starting_page
+        self.start_seconds = start_seconds
+        self.step_seconds = step_seconds
+        self.failure_rate = failure_rate
+        self.session_id = f"stand-in-{random.getrandbits(32):08x}"
+        self._random = random.Random(seed)
+        self._html = ""
+
+    def start(self):
+        time.sleep(self.start_seconds)
+
+    def stop(self):
+        pass
+
+    def go_to_url(self, url):
+        with urllib.request.urlopen(url, timeout=DEFAULT_NAVIGATION_TIMEOUT_SECONDS) as response:
+            self._html = response.read().decode("utf-8", errors="replace")
+
+    def act_get(self, prompt, schema=None, timeout=None, max_steps=None):
+        steps = self._random.randint(1, 6)
+        if max_steps and steps > max_steps:
+            time.sleep(max_steps * self.step_seconds)
+            raise StandInActError("ActExceededMaxStepsError", f"exceeded max_steps={max_steps}")
+        step_times = [self._random.uniform(0.5, 1.5) * self.step_seconds for _ in range(steps)]
+        if timeout and sum(step_times) > timeout:
+            time.sleep(timeout)
+            raise StandInActError("ActTimeoutError", f"timed out after {timeout}s")
+        time.sleep(sum(step_times))
+        if self._random.random() < self.failure_rate:
+            raise StandInActError("ActActuationError", "stand-in actuation failure")
+        title = re.search(r"<title>(.*?)</title>", self._html, re.S | re.I)
+        parsed = {"title": title.group(1).strip() if title else None, "links": self._html.count("<a ")}
+        metadata = type("ActMetadata", (), {"session_id": self.session_id, "num_steps_executed": steps,
+                                            "step_server_times_s": step_times})
+        return type("ActGetResult", (), {"response": json.dumps(parsed), "parsed_response": parsed,
+                                         "matches_schema": None, "metadata": metadata})
+
+    act = act_get
+
+
+def stand_in_factory(seed=None):
+    seeds = random.Random(seed)
+    return lambda starting_page: StandInSession(starting_page, seed=seeds.random())
+
+
+class Task:
+    """One extraction: URL + instruction (+ optional JSON schema) with its own budgets."""
+
+    def __init__(self, spec, base_url=None, default_max_steps=DEFAULT_MAX_STEPS,
+                 default_timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.id = str(spec["id"])
+        self.url = spec["url"]
+        if self.url.startswith("/"):
+            if not base_url:
+                raise ValueError(f"task {self.id}: relative URL {self.url} needs --serve")
+            self.url = base_url + self.url
+        self.instruction = spec["instruction"]
+        self.schema = spec.get("schema")
+        self.max_steps = int(spec.get("max_steps", default_max_steps))
+        self.timeout = int(spec.get("timeout", default_timeout))
+        self.enqueued_at = None
+
+
+class TaskResult:
+    """Outcome of one task, including the timings of every phase it went through."""
+
+    def __init__(self, task, worker, session_generation):
+        self.task = task
+        self.worker = worker
+        self.session_generation = session_generation
+        self.ok = False
+        self.attempts = 0
+        self.response = None
+        self.parsed_response = None
+        self.matches_schema = None
+        self.error = None
+        self.error_type = None
+        self.session_id = None
+        self.steps = None
+        self.cached = False
+        self.timings = {"queue_wait_s": round(time.time() - task.enqueued_at, 3), "fingerprint_s": 0.0,
+                        "session_start_s": 0.0, "navigate_s": 0.0, "act_s": 0.0, "step_s": None}
+
+    def to_dict(self):
+        return {
+            "id": self.task.id,
+            "url": self.task.url,
+            "ok": self.ok,
+            "cached": self.cached,
+            "attempts": self.attempts,
+            "worker": self.worker,
+            "session_generation": self.session_generation,
+            "session_id": self.session_id,
+            "steps": self.steps,
+            "response": self.response,
+            "parsed_response": self.parsed_response,
+            "matches_schema": self.matches_schema,
+            "error_type": self.error_type,
+            "error": self.error,
+            "timings": {key: round(value, 3) if isinstance(value, float) else value
+                        for key, value in self.timings.items()},
+        }
+
+
+class SessionPool:
+    """N worker threads, each owning one warm session that is reused across tasks."""
+
+    def __init__(self, factory, workers=DEFAULT_WORKERS, max_tasks_per_session=DEFAULT_MAX_TASKS_PER_SESSION,
+                 retries=1, on_result=None, warm_page=None, cache=None):
+        self.factory = factory
+        # NovaAct only opens http(s) starting pages; defaults to the first task's URL
+        self.warm_page = warm_page
+        self.workers = workers
+        self.max_tasks_per_session = max_tasks_per_session
+        self.retries = retries
+        self.on_result = on_result
+        self.cache = cache
+        self.results = []
+        self.session_starts = []
+        self.recycles = {"task_limit": 0, "failure": 0}
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _start_session(self):
+        session = self.factory(self.warm_page)
+        start = time.time()
+        session.start()
+        elapsed = time.time() - start
+        with self._lock:
+            self.session_starts.append(elapsed)
+        return session, elapsed
+
+    @staticmethod
+    def _stop_session(session):
+        try:
+            session.stop()
+        except Exception:
+            pass  # a broken browser must not take the worker down with it
+
+    def _attempt(self, session, task, result):
+        start = time.time()
+        session.go_to_url(task.url)
+        result.timings["navigate_s"] += time.time() - start
+
+        start = time.time()
+        try:
+            if task.schema is not None:
+                act_result = session.act_get(task.instruction, schema=task.schema, timeout=task.timeout,
+                                             max_steps=task.max_steps)
+            else:
+                act_result = session.act(task.instruction, timeout=task.timeout, max_steps=task.max_steps)
+        finally:
+            result.timings["act_s"] += time.time() - start
+
+        metadata = act_result.metadata
+        result.ok = True
+        result.response = getattr(act_result, "response", None)
+        result.parsed_response = getattr(act_result, "parsed_response", None)
+        result.matches_schema = getattr(act_result, "matches_schema", None)
+        result.session_id = metadata.session_id
+        result.steps = metadata.num_steps_executed
+        step_times = [round(t, 3) for t in getattr(metadata, "step_server_times_s", None) or []]
+        result.timings["step_s"] = step_times or None
+
+    def _worker(self, index):
+        session = None
+        generation = 0
+        tasks_on_session = 0
+        try:
+            # Sessions start lazily on the first task that needs one (a cache
+            # miss), so a run answered entirely from the cache starts no browser;
+            # that task is charged for the startup
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    return
+                result = TaskResult(task, index, generation)
+                fingerprint = None
+                if self.cache is not None and task.schema is not None:
+                    start = time.time()
+                    entry, fingerprint = self.cache.lookup(task.url, task.instruction, task.schema)
+                    result.timings["fingerprint_s"] = time.time() - start
+                    if entry:
+                        result.ok = result.cached = True
+                        result.parsed_response = entry["parsed_response"]
+                        result.response = entry["response"]
+                        self._finish(result)
+                        continue
+                for attempt in range(self.retries + 1):
+                    result.attempts = attempt + 1
+                    try:
+                        if session is None:
+                            session, elapsed = self._start_session()
+                            generation += 1
+                            result.session_generation = generation
+                            result.timings["session_start_s"] += elapsed
+                        self._attempt(session, task, result)
+                        tasks_on_session += 1
+                        break
+                    except Exception as e:
+                        result.error_type = getattr(e, "kind", type(e).__name__)
+                        result.error = str(e)[:500]
+                        # The browser may be in an unknown state after any failure
+                        self._stop_session(session)
+                        session, tasks_on_session = None, 0
+                        with self._lock:
+                            self.recycles["failure"] += 1
+                        if result.error_type in NO_RETRY_ERRORS:
+                            break
+                if result.ok:
+                    result.error = result.error_type = None
+                    if self.cache is not None and task.schema is not None and result.matches_schema is not False \
+                            and result.parsed_response is not None:
+                        self.cache.store(task.url, task.instruction, task.schema, fingerprint,
+                                         result.parsed_response, result.response)
+                if session is not None and tasks_on_session >= self.max_tasks_per_session:
+                    self._stop_session(session)
+                    session, tasks_on_session = None, 0
+                    with self._lock:
+                        self.recycles["task_limit"] += 1
+                self._finish(result)
+        finally:
+            if session is not None:
+                self._stop_session(session)
+
+    def _finish(self, result):
+        with self._lock:
+            self.results.append(result)
+        if self.on_result:
+            self.on_result(result)
+
+    def run(self, tasks):
+        self.started_at = time.time()
+        if self.warm_page is None and tasks:
+            self.warm_page = tasks[0].url
+        for task in tasks:
+            task.enqueued_at = self.started_at
+            self._tasks.put(task)
+        for _ in range(self.workers):
+            self._tasks.put(None)
+        threads = [threading.Thread(target=self._worker, args=(i,), name=f"nova-act-{i}")
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.duration = time.time() - self.started_at
+        return self.results
+
+    def summary(self):
+        ok = [r for r in self.results if r.ok and not r.cached]
+        act_times = sorted(r.timings["act_s"] for r in ok)
+        steps = [r.steps for r in ok if r.steps]
+        return {
+            "tasks": len(self.results),
+            "ok": sum(r.ok for r in self.results),
+            "cache_hits": sum(r.cached for r in self.results),
+            "failed": sum(not r.ok for r in self.results),
+            "duration_s": round(self.duration, 2),
+            "tasks_per_minute": round(len(self.results) / self.duration * 60, 2) if self.duration else None,
+            "sessions_started": len(self.session_starts),
+            "mean_session_start_s": round(sum(self.session_starts) / len(self.session_starts), 2)
+            if self.session_starts else None,
+            "recycles": dict(self.recycles),
+            "mean_act_s": round(sum(act_times) / len(act_times), 2) if act_times else None,
+            "p95_act_s": round(act_times[int(0.95 * (len(act_times) - 1))], 2) if act_times else None,
+            "mean_steps": round(sum(steps) / len(steps), 2) if steps else None,
+            "errors": sorted({r.error_type for r in self.results if not r.ok}),
+        }
+
+
+def serve_directory(directory, port=0):
+    """Serve a directory of static pages locally (port 0 picks a free port); returns (server, base_url)."""
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def load_tasks(path, base_url=None, max_steps=DEFAULT_MAX_STEPS, timeout=DEFAULT_TIMEOUT_SECONDS):
+    with open(path) as f:
+        return [Task(json.loads(line), base_url, max_steps, timeout) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Nova Act extraction tasks over a pool of warm sessions")
+    parser.add_argument("tasks", help="task file (JSON lines)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent browser sessions")
+    parser.add_argument("--max-tasks-per-session", type=int, default=DEFAULT_MAX_TASKS_PER_SESSION)
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="default per-task step budget")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_SECONDS, help="default per-task timeout (s)")
+    parser.add_argument("--retries", type=int, default=1, help="retries per task on a fresh session")
+    parser.add_argument("--serve", metavar="DIR", help="serve static pages locally for relative task URLs")
+    parser.add_argument("--serve-port", type=int, default=8765,
+                        help="fixed so cached results stay keyed to the same URLs across runs")
+    parser.add_argument("--headed", action="store_true", help="show the browsers (debugging)")
+    parser.add_argument("--workflow", help="workflow definition name for AWS IAM authentication")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, metavar="PATH",
+                        help=f"reuse schema extractions for unchanged pages (default path: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-age", type=float, help="re-extract cached results older than this (s)")
+    parser.add_argument("--stand-in", action="store_true", help="simulated sessions, no browser or model calls")
+    parser.add_argument("--output", default="session_pool_results.jsonl")
+    args = parser.parse_args()
+
+    base_url = None
+    if args.serve:
+        server, base_url = serve_directory(Path(args.serve), args.serve_port)
+        print(f"Serving {args.serve} at {base_url}")
+    tasks = load_tasks(args.tasks, base_url, args.max_steps, args.timeout)
+
+    output = open(args.output, "w")
+    lock = threading.Lock()
+
+    def on_result(result):
+        with lock:
+            output.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+            output.flush()
+        status = "cached" if result.cached else "ok" if result.ok else f"FAILED {result.error_type}"
+        print(f"[worker {result.worker}] {result.task.id}: {status} | steps {result.steps} | "
+              f"act {result.timings['act_s']:.1f}s | start {result.timings['session_start_s']:.1f}s")
+
+    def run():
+        factory = stand_in_factory() if args.stand_in else nova_act_factory(headless=not args.headed)
+        pool = SessionPool(factory, args.workers, args.max_tasks_per_session, args.retries, on_result, cache=cache)
+        pool.run(tasks)
+        return pool
+
+    cache = ExtractionCache(args.cache, args.cache_max_age) if args.cache else None
+    print(f"Running {len(tasks)} tasks on {args.workers} sessions")
+    if args.workflow and not args.stand_in:
+        from nova_act import workflow
+        run = workflow(workflow_definition_name=args.workflow, model_id="nova-act-latest")(run)
+    pool = run()
+    output.close()
+
+    summary = pool.summary()
+    print(f"\n{summary['ok']}/{summary['tasks']} ok in {summary['duration_s']}s "
+          f"({summary['tasks_per_minute']} tasks/min)")
+    print(f"Sessions started: {summary['sessions_started']} (mean {summary['mean_session_start_s']}s) | "
+          f"recycled: {summary['recycles']}")
+    print(f"Act time: mean {summary['mean_act_s']}s, p95 {summary['p95_act_s']}s | mean steps {summary['mean_steps']}")
+    if cache is not None:
+        print(f"Cache: {summary['cache_hits']} hits | {cache.stats}")
+    if summary["errors"]:
+        print(f"Errors: {', '.join(summary['errors'])}")
+    print(f"Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
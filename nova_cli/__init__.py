@@ -0,0 +1,8 @@
+"""
+Consolidated command-line interface for the Nova examples: `nova text|image|video|embed|bench|analyze ...`
+
+Start-up is kept short for job wrappers that call the CLI many times: the
+top-level parser only knows subcommand names, a subcommand module is imported
+when it is selected, and boto3 / pandas / matplotlib are imported only when a
+command actually needs them. See `nova startup` for measuring it.
+"""
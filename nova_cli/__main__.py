@@ -0,0 +1,5 @@
+import sys
+
+from nova_cli.main import main
+
+sys.exit(main())
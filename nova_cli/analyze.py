@@ -0,0 +1,15 @@
+"""
+Analyze multi-region load test results (performance/analyze_multi_region.py)
+
+pandas, matplotlib and seaborn are imported after the options are parsed,
+so `nova analyze --help` and option errors return immediately.
+
+Example:
+    nova analyze --streaming
+    nova analyze --incremental --preview --html report.html
+"""
+from nova_cli.bench import run_tool
+
+
+def run(argv):
+    return run_tool("analyze_multi_region", argv, "nova analyze")
@@ -0,0 +1,75 @@
+"""
+Run a benchmark tool from performance/ in this process
+
+The tool keeps its own options: `nova bench api --stand-in --rounds 5` is
+`python performance/api_benchmark.py --stand-in --rounds 5`, minus a second
+interpreter start-up, and inside `nova run` the boto3 session is shared.
+
+Example:
+    nova bench                      # list tools
+    nova bench scenario scenarios/mixed_smoke.toml --time-scale 0.1
+"""
+import importlib
+import sys
+from pathlib import Path
+
+from nova_cli import session
+
+PERFORMANCE_DIR = Path(__file__).resolve().parent.parent / "performance"
+
+# name -> (module in performance/, description)
+TOOLS = {
+    "api": ("api_benchmark", "converse vs invoke_model vs streaming APIs"),
+    "scenario": ("scenario_runner", "scenario files and suites"),
+    "load": ("test_concurrent_96h_robust", "long-running concurrent load test"),
+    "multiprocess": ("multiprocess_load", "multi-process load generator"),
+    "replay": ("trace_replay", "production traffic replay"),
+    "batch": ("batch_inference", "batch inference jobs with real-time fallback"),
+    "image-batch": ("image_batching", "multi-image request batching"),
+    "preprocess": ("image_preprocess", "image downscale / re-encode"),
+    "concurrency": ("adaptive_concurrency", "adaptive concurrency limit"),
+    "router": ("region_router", "latency-aware region routing"),
+    "tiers": ("tier_scheduler", "cost-aware service tier scheduling"),
+    "coalescing": ("coalescing_client", "identical request coalescing"),
+    "changes": ("change_detection", "change-point detection over results"),
+}
+
+
+def run_tool(module_name, argv, prog):
+    """Import a performance/ module and call its main() with argv; returns the exit code."""
+    if str(PERFORMANCE_DIR) not in sys.path:
+        sys.path.insert(0, str(PERFORMANCE_DIR))
+    if session.configured():
+        # --profile / --region apply to the tool's own boto3.client() calls through the default session
+        session.get_session()
+    module = importlib.import_module(module_name)
+    saved_argv = sys.argv
+    sys.argv = [prog, *argv]
+    try:
+        module.main()
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+            return 1
+        return e.code or 0
+    finally:
+        sys.argv = saved_argv
+    return 0
+
+
+def print_tools(file=sys.stdout):
+    print("usage: nova bench TOOL [options]\n\ntools:", file=file)
+    for name, (module_name, text) in TOOLS.items():
+        print(f"  {name:<13} {text} (performance/{module_name}.py)", file=file)
+
+
+def run(argv):
+    if not argv or argv[0] in ("-h", "--help"):
+        print_tools()
+        return 0
+    if argv[0] not in TOOLS:
+        print_tools(sys.stderr)
+        print(f"nova bench: unknown tool '{argv[0]}'", file=sys.stderr)
+        return 2
+    module_name = TOOLS[argv[0]][0]
+    return run_tool(module_name, argv[1:], f"nova bench {argv[0]}")
@@ -0,0 +1,112 @@
+"""
+Shared options and converse / converse_stream call for the text, image and video commands
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from nova_cli import session
+
+DEFAULT_MODEL = "us.amazon.nova-lite-v1:0"
+PERFORMANCE_DIR = Path(__file__).resolve().parent.parent / "performance"
+
+
+def add_generation_arguments(parser, max_tokens=300):
+    parser.add_argument("--system", help="system prompt")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"model id (default: {DEFAULT_MODEL})")
+    parser.add_argument("--max-tokens", type=int, default=max_tokens)
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--top-p", type=float)
+    parser.add_argument("--stream", action="store_true", help="print tokens as they arrive (converse_stream)")
+    parser.add_argument("--json", action="store_true", help="print the full response as JSON")
+    parser.add_argument("--read-timeout", type=int, help="socket read timeout in seconds (long videos)")
+    parser.add_argument("--no-preflight", action="store_true",
+                        help="skip the local payload / token check (performance/preflight.py)")
+
+
+def read_prompt(value):
+    """'-' reads the prompt from stdin."""
+    return sys.stdin.read() if value == "-" else value
+
+
+def media_format(path):
+    return path.rsplit(".", 1)[-1].lower().replace("jpg", "jpeg")
+
+
+def import_performance(name):
+    """Import a module from performance/ (image preprocessing, preflight)."""
+    if str(PERFORMANCE_DIR) not in sys.path:
+        sys.path.insert(0, str(PERFORMANCE_DIR))
+    return __import__(name)
+
+
+def preflight(args, params):
+    """
+    Check payload size and estimated input tokens before uploading anything.
+    Oversize images are downscaled and inline videos moved to --upload-to when
+    possible; returns False when the request would be rejected by the service.
+    """
+    if args.no_preflight:
+        return True
+    checks = import_performance("preflight")
+    upload_to = getattr(args, "upload_to", None)
+    checker = checks.Preflight(args.model, s3=bool(upload_to))
+    decision = checker.check(params)
+    if decision.action == checks.DOWNSCALE:
+        saved = checks.downscale_images(params)
+        print(f"[preflight] {'; '.join(decision.reasons)} -> images downscaled ({saved:,} bytes saved)",
+              file=sys.stderr)
+        decision = checker.check(params)
+    elif decision.action == checks.S3:
+        upload = checks.s3_uploader(session.client("s3"), upload_to)
+        uris = checks.move_videos_to_s3(params, upload, getattr(args, "bucket_owner", None))
+        print(f"[preflight] {'; '.join(decision.reasons)} -> uploaded to {', '.join(uris)}", file=sys.stderr)
+        decision = checker.check(params)
+    if decision.action == checks.REJECT:
+        print(f"[preflight] not sent: {'; '.join(decision.reasons)}", file=sys.stderr)
+        return False
+    return True
+
+
+def generate(args, content):
+    """Send one user message; returns the exit code."""
+    client = session.client("bedrock-runtime", read_timeout=args.read_timeout)
+    params = {
+        "modelId": args.model,
+        "messages": [{"role": "user", "content": content}],
+        "inferenceConfig": {"maxTokens": args.max_tokens, "temperature": args.temperature},
+    }
+    if args.top_p is not None:
+        params["inferenceConfig"]["topP"] = args.top_p
+    if args.system:
+        params["system"] = [{"text": args.system}]
+    if not preflight(args, params):
+        return 1
+
+    start = time.time()
+    if not args.stream:
+        response = client.converse(**params)
+        if args.json:
+            response.pop("ResponseMetadata", None)
+            print(json.dumps(response, indent=2, ensure_ascii=False))
+        else:
+            print(response["output"]["message"]["content"][0]["text"])
+            usage = response["usage"]
+            print(f"\n[{time.time() - start:.2f}s, {usage['inputTokens']} in / {usage['outputTokens']} out]",
+                  file=sys.stderr)
+        return 0
+
+    ttft = None
+    usage = {}
+    for event in client.converse_stream(**params)["stream"]:
+        if "contentBlockDelta" in event:
+            if ttft is None:
+                ttft = time.time() - start
+            print(event["contentBlockDelta"]["delta"].get("text", ""), end="", flush=True)
+        elif "metadata" in event:
+            usage = event["metadata"].get("usage", {})
+    print()
+    print(f"[first token {ttft or 0:.2f}s, total {time.time() - start:.2f}s, "
+          f"{usage.get('inputTokens', 0)} in / {usage.get('outputTokens', 0)} out]", file=sys.stderr)
+    return 0
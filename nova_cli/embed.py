@@ -0,0 +1,49 @@
+"""
+Create a Nova multimodal embedding for text or an image
+
+Example:
+    nova embed --text "Hello, World!"
+    nova embed --image images/test1.png --dimension 384 --output vector.json
+"""
+import base64
+import json
+from pathlib import Path
+
+from nova_cli import session
+from nova_cli.common import media_format, read_prompt
+
+DEFAULT_MODEL = "amazon.nova-2-multimodal-embeddings-v1:0"
+PURPOSES = ("GENERIC_INDEX", "GENERIC_RETRIEVAL", "TEXT_RETRIEVAL", "IMAGE_RETRIEVAL", "VIDEO_RETRIEVAL",
+            "DOCUMENT_RETRIEVAL", "AUDIO_RETRIEVAL", "CLASSIFICATION", "CLUSTERING")
+
+
+def add_arguments(parser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--text", help="text to embed, or - to read it from stdin")
+    source.add_argument("--image", help="image file to embed")
+    parser.add_argument("--dimension", type=int, default=1024, choices=[256, 384, 1024, 3072])
+    parser.add_argument("--purpose", default="GENERIC_INDEX", choices=PURPOSES)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"model id (default: {DEFAULT_MODEL})")
+    parser.add_argument("--output", help="write the vector to a JSON file")
+
+
+def run(args):
+    params = {"embeddingPurpose": args.purpose, "embeddingDimension": args.dimension}
+    if args.image:
+        data = base64.b64encode(Path(args.image).read_bytes()).decode("utf-8")
+        params["image"] = {"format": media_format(args.image), "source": {"bytes": data}}
+    else:
+        params["text"] = {"truncationMode": "END", "value": read_prompt(args.text)}
+    request_body = {"taskType": "SINGLE_EMBEDDING", "singleEmbeddingParams": params}
+
+    response = session.client("bedrock-runtime").invoke_model(
+        body=json.dumps(request_body), modelId=args.model,
+        accept="application/json", contentType="application/json",
+    )
+    embedding = json.loads(response["body"].read())["embeddings"][0]["embedding"]
+    if args.output:
+        Path(args.output).write_text(json.dumps(embedding))
+        print(f"{len(embedding)}-dimension vector written to {args.output}")
+    else:
+        print(f"dimension {len(embedding)}: [{', '.join(f'{v:.4f}' for v in embedding[:8])}, ...]")
+    return 0
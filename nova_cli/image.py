@@ -0,0 +1,29 @@
+"""
+Ask a Nova model about an image
+
+Example:
+    nova image images/test1.png --prompt "Provide 3 potential art titles"
+    nova image photo.jpg --preprocess --stream
+"""
+from pathlib import Path
+
+from nova_cli.common import add_generation_arguments, generate, import_performance, media_format, read_prompt
+
+
+def add_arguments(parser):
+    parser.add_argument("image", help="image file (png, jpeg, gif, webp)")
+    parser.add_argument("--prompt", default="Describe this image.", help="question, or - to read it from stdin")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="downscale and re-encode before upload (Pillow, see performance/image_preprocess.py)")
+    add_generation_arguments(parser)
+
+
+def run(args):
+    data = Path(args.image).read_bytes()
+    image_format = media_format(args.image)
+    if args.preprocess:
+        image = import_performance("image_preprocess").ImagePreprocessor().process(data)
+        data, image_format = image.data, image.format
+    content = [{"image": {"format": image_format, "source": {"bytes": data}}},
+               {"text": read_prompt(args.prompt)}]
+    return generate(args, content)
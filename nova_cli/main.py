@@ -0,0 +1,58 @@
+"""
+Top-level dispatcher: parses global options and the subcommand name, then imports only that subcommand's module
+"""
+import argparse
+import importlib
+import sys
+
+from nova_cli import session
+
+# name -> (module, one-line help); modules are imported only when their command is selected
+COMMANDS = {
+    "text": ("nova_cli.text", "generate text (converse / converse_stream)"),
+    "image": ("nova_cli.image", "ask a question about an image"),
+    "video": ("nova_cli.video", "ask a question about a video file or S3 object"),
+    "embed": ("nova_cli.embed", "create a multimodal embedding for text or an image"),
+    "bench": ("nova_cli.bench", "run a benchmark tool from performance/"),
+    "analyze": ("nova_cli.analyze", "analyze multi-region load test results"),
+    "run": ("nova_cli.run", "run several subcommands from a file in one process"),
+    "startup": ("nova_cli.startup", "measure CLI start-up time with -X importtime"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="nova",
+        description="Amazon Bedrock Nova examples from one command line",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<10} {text}" for name, (_, text) in COMMANDS.items())
+               + "\n\nRun 'nova COMMAND --help' for the options of a command.",
+    )
+    parser.add_argument("--profile", help="AWS profile for the shared boto3 session")
+    parser.add_argument("--region", help="AWS region (default: from the AWS config, else us-east-1)")
+    parser.add_argument("command", choices=COMMANDS, metavar="COMMAND")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+
+def run_command(name, argv):
+    """Import one subcommand, parse its arguments and run it; returns the exit code.
+
+    Commands without add_arguments() wrap a tool that has its own parser and receive argv unparsed.
+    """
+    module = importlib.import_module(COMMANDS[name][0])
+    if not hasattr(module, "add_arguments"):
+        return module.run(argv) or 0
+    parser = argparse.ArgumentParser(prog=f"nova {name}", description=module.__doc__.strip().splitlines()[0])
+    module.add_arguments(parser)
+    return module.run(parser.parse_args(argv)) or 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(sys.argv[1:] if argv is None else argv)
+    if args.profile or args.region:
+        session.configure(profile=args.profile, region=args.region)
+    try:
+        return run_command(args.command, args.args)
+    except KeyboardInterrupt:
+        return 130
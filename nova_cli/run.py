@@ -0,0 +1,62 @@
+"""
+Run several subcommands from a file in one process
+
+Each non-empty line is one command as it would follow `nova` on the command
+line (a leading `nova` is ignored, # starts a comment). The interpreter,
+the subcommand modules and the boto3 session with its clients are set up
+once for the whole file instead of once per command.
+
+Example:
+    nova run jobs.txt
+    printf 'text "Hi"\\nembed --text "Hi"\\n' | nova run -
+"""
+import shlex
+import sys
+import time
+
+
+def add_arguments(parser):
+    parser.add_argument("file", help="command file, or - for stdin")
+    parser.add_argument("--keep-going", action="store_true", help="continue after a failing command")
+
+
+def read_commands(path):
+    lines = sys.stdin.read().splitlines() if path == "-" else open(path).read().splitlines()
+    commands = []
+    for line in lines:
+        argv = shlex.split(line, comments=True)
+        if argv and argv[0] == "nova":
+            argv = argv[1:]
+        if argv:
+            commands.append(argv)
+    return commands
+
+
+def run(args):
+    from nova_cli.main import COMMANDS, run_command
+
+    commands = read_commands(args.file)
+    start = time.time()
+    failed = 0
+    for i, argv in enumerate(commands, 1):
+        print(f"[{i}/{len(commands)}] nova {shlex.join(argv)}", file=sys.stderr)
+        command_start = time.time()
+        if argv[0] not in COMMANDS or argv[0] == "run":
+            print(f"  not a runnable command: {argv[0]}", file=sys.stderr)
+            code = 2
+        else:
+            try:
+                code = run_command(argv[0], argv[1:])
+            except SystemExit as e:
+                # argparse errors inside one command
+                code = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                print(f"  {type(e).__name__}: {e}", file=sys.stderr)
+                code = 1
+        print(f"  exit {code}, {time.time() - command_start:.2f}s", file=sys.stderr)
+        if code:
+            failed += 1
+            if not args.keep_going:
+                break
+    print(f"{len(commands)} commands, {failed} failed, {time.time() - start:.2f}s total", file=sys.stderr)
+    return 1 if failed else 0
@@ -0,0 +1,51 @@
+"""
+One boto3 session per process, shared by every subcommand
+
+Creating a boto3 session loads the service models and resolves credentials,
+which costs more than most short commands themselves. The session is created
+on first use, installed as boto3's default session so that the performance/
+tools calling boto3.client() directly reuse it, and clients are cached per
+(service, region, read timeout) for `nova run`.
+"""
+import threading
+
+DEFAULT_REGION = "us-east-1"
+
+_options = {"profile": None, "region": None}
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def configure(profile=None, region=None):
+    """Set the profile / region used when the session is created; must run before the first client() call."""
+    if _session is not None and profile != _options["profile"]:
+        raise RuntimeError("boto3 session already created with a different profile")
+    _options.update(profile=profile, region=region)
+
+
+def configured():
+    return bool(_options["profile"] or _options["region"])
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.Session(profile_name=_options["profile"], region_name=_options["region"])
+            boto3.DEFAULT_SESSION = _session
+        return _session
+
+
+def client(service="bedrock-runtime", region=None, read_timeout=None):
+    """Cached client; clients are thread-safe, so one per configuration is enough."""
+    session = get_session()
+    region = region or _options["region"] or session.region_name or DEFAULT_REGION
+    key = (service, region, read_timeout)
+    with _lock:
+        if key not in _clients:
+            from botocore.config import Config
+            config = Config(read_timeout=read_timeout) if read_timeout else None
+            _clients[key] = session.client(service, region_name=region, config=config)
+        return _clients[key]
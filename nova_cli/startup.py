@@ -0,0 +1,66 @@
+"""
+Measure CLI start-up time with python -X importtime
+
+Runs the CLI several times in fresh interpreters, reports the median wall
+time against a target and lists the slowest top-level imports of the last
+run, i.e. the ones worth deferring.
+
+Example:
+    nova startup                     # times `nova --help`, target 150 ms
+    nova startup --target-ms 400 text --help
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+LAUNCHER = Path(__file__).resolve().parent.parent / "nova"
+DEFAULT_TARGET_MS = 150
+
+
+def add_arguments(parser):
+    parser.add_argument("--repeat", type=int, default=5, help="runs to take the median over (default: 5)")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help=f"fail above this median wall time (default: {DEFAULT_TARGET_MS})")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("cli_args", nargs=argparse.REMAINDER, metavar="ARGS",
+                        help="CLI arguments to time, after the options above (default: --help)")
+
+
+def parse_importtime(stderr):
+    """-X importtime lines → [(module, self_us, cumulative_us, depth)]"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def run(args):
+    args.cli_args = [a for a in args.cli_args if a != "--"] or ["--help"]
+    command = [sys.executable, "-X", "importtime", str(LAUNCHER), *args.cli_args]
+    wall_ms = []
+    for _ in range(max(1, args.repeat)):
+        start = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall_ms.append((time.perf_counter() - start) * 1000)
+    imports = parse_importtime(result.stderr)
+
+    median = statistics.median(wall_ms)
+    import_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+    print(f"nova {' '.join(args.cli_args)}  (exit {result.returncode}, {len(wall_ms)} runs)")
+    print(f"  wall time   median {median:.0f} ms, min {min(wall_ms):.0f} ms, max {max(wall_ms):.0f} ms")
+    print(f"  imports     {import_ms:.0f} ms in {len(imports)} modules (last run)")
+    print(f"\n  slowest top-level imports (cumulative):")
+    top_level = sorted((i for i in imports if i[3] == 1), key=lambda i: -i[2])[:args.top]
+    for name, _, cumulative_us, _ in top_level:
+        print(f"    {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    ok = median <= args.target_ms
+    print(f"\n  {'PASS' if ok else 'FAIL'}: median {median:.0f} ms vs target {args.target_ms:.0f} ms")
+    return 0 if ok else 1
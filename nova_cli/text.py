@@ -0,0 +1,17 @@
+"""
+Generate text with a Nova model
+
+Example:
+    nova text "Write a short story about lucky dogs" --stream
+    echo "Summarize: ..." | nova text - --system "You are concise."
+"""
+from nova_cli.common import add_generation_arguments, generate, read_prompt
+
+
+def add_arguments(parser):
+    parser.add_argument("prompt", help="prompt text, or - to read it from stdin")
+    add_generation_arguments(parser)
+
+
+def run(args):
+    return generate(args, [{"text": read_prompt(args.prompt)}])
@@ -0,0 +1,35 @@
+"""
+Ask a Nova model about a video
+
+Local files are sent inline (25MB payload limit); larger videos must be in S3.
+With --upload-to, a local video that does not fit inline is uploaded there first.
+
+Example:
+    nova video media/animals.mp4 --prompt "Provide video titles for this clip."
+    nova video s3://my-bucket/clip.mp4 --bucket-owner 123456789012
+    nova video long_clip.mp4 --upload-to s3://my-bucket/nova-inputs
+"""
+from pathlib import Path
+
+from nova_cli.common import add_generation_arguments, generate, media_format, read_prompt
+
+
+def add_arguments(parser):
+    parser.add_argument("video", help="video file or s3:// URI (mp4, mov, mkv, webm, ...)")
+    parser.add_argument("--prompt", default="Describe this video.", help="question, or - to read it from stdin")
+    parser.add_argument("--bucket-owner", help="account id owning the S3 bucket, if different from the caller")
+    parser.add_argument("--upload-to", metavar="S3_URI",
+                        help="S3 prefix to upload local videos to when they exceed the inline payload limit")
+    add_generation_arguments(parser)
+
+
+def run(args):
+    if args.video.startswith("s3://"):
+        source = {"s3Location": {"uri": args.video}}
+        if args.bucket_owner:
+            source["s3Location"]["bucketOwner"] = args.bucket_owner
+    else:
+        source = {"bytes": Path(args.video).read_bytes()}
+    content = [{"video": {"format": media_format(args.video), "source": source}},
+               {"text": read_prompt(args.prompt)}]
+    return generate(args, content)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+自适应并发控制（Gradient / Vegas 风格，参考 Netflix concurrency-limits）
+- 根据短期 / 长期延迟梯度和限流信号持续调整在途并发上限
+- 每个窗口记录 并发 / 吞吐 / 延迟 曲线
+- 收敛到满足 SLO 的最大吞吐工作点，替代固定的 CONCURRENCY_LEVELS
+"""
+
+import argparse
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tier_scheduler import percentile
+
+
+class GradientConcurrencyLimit:
+    """Gradient2 算法：limit = limit × 梯度 + 排队余量"""
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=200, smoothing=0.5,
+                 tolerance=1.5, long_window=20, backoff=0.9):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.long_window = long_window
+        self.long_rtt = None
+        # 出现过延迟梯度 < 1 或限流，说明已经探到拐点
+        self.saturated = False
+
+    def update(self, short_rtt, throttled, slo_breached=False):
+        """每个窗口调用一次，返回新的并发上限；窗口内没有成功请求（short_rtt 为 None）时仍按限流退避"""
+        # 长期 RTT 为慢速 EWMA，作为无排队时的基线
+        if short_rtt is not None:
+            if self.long_rtt is None:
+                self.long_rtt = short_rtt
+            else:
+                self.long_rtt += (short_rtt - self.long_rtt) / self.long_window
+                # 短期延迟明显回落时，让长期基线更快跟上
+                if self.long_rtt / short_rtt > 2:
+                    self.long_rtt *= 0.95
+
+        if throttled or slo_breached:
+            self.saturated = True
+            new_limit = self.limit * self.backoff
+        elif short_rtt is None:
+            return int(self.limit)
+        else:
+            gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / short_rtt))
+            if gradient < 1.0:
+                self.saturated = True
+            queue_size = math.sqrt(self.limit)
+            new_limit = self.limit * gradient + queue_size
+
+        new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, new_limit))
+        return int(self.limit)
+
+
+class CurvePoint:
+    """一个控制窗口的观测"""
+
+    def __init__(self, limit, throughput, p50, p95, completed, failed, throttled):
+        self.limit = limit
+        self.throughput = throughput
+        self.p50 = p50
+        self.p95 = p95
+        self.completed = completed
+        self.failed = failed
+        self.throttled = throttled
+
+    def to_row(self):
+        return {
+            "limit": self.limit,
+            "throughput_rps": round(self.throughput, 4),
+            "p50_latency": round(self.p50 or 0, 1),
+            "p95_latency": round(self.p95 or 0, 1),
+            "completed": self.completed,
+            "failed": self.failed,
+            "throttled": self.throttled,
+        }
+
+
+class AdaptiveConcurrencyRunner:
+    """按控制器给出的上限持续保持在途请求，并记录曲线"""
+
+    def __init__(self, request_fn, slo_ms, limit=None, window_seconds=60,
+                 stable_windows=5, stable_tolerance=0.15):
+        self.request_fn = request_fn
+        self.slo_ms = slo_ms
+        self.limit = limit or GradientConcurrencyLimit()
+        self.window_seconds = window_seconds
+        self.stable_windows = stable_windows
+        self.stable_tolerance = stable_tolerance
+        self.curve = []
+        self._in_flight = 0
+        self._window = []
+        self._cond = threading.Condition()
+
+    def _call(self):
+        start_time = time.time()
+        result = {"success": False, "error": "request_fn 未返回"}
+        try:
+            result = self.request_fn()
+        except Exception as e:
+            # 异常按失败计入窗口（限流异常仍会被识别为 Throttling）
+            result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            latency = (time.time() - start_time) * 1000
+            with self._cond:
+                self._in_flight -= 1
+                self._window.append((latency, result))
+                self._cond.notify()
+
+    def _close_window(self, elapsed, current_limit):
+        with self._cond:
+            window, self._window = self._window, []
+        ok = [latency for latency, result in window if result.get("success")]
+        throttled = sum(1 for _, result in window
+                        if not result.get("success") and "Throttling" in result.get("error", ""))
+        p50 = percentile(ok, 50)
+        p95 = percentile(ok, 95)
+        point = CurvePoint(current_limit, len(ok) / elapsed, p50, p95,
+                           len(ok), len(window) - len(ok), throttled)
+        self.curve.append(point)
+        breached = p95 is not None and p95 > self.slo_ms
+        return point, self.limit.update(p50, throttled > 0, breached)
+
+    def _converged(self):
+        if not self.limit.saturated or len(self.curve) < self.stable_windows:
+            return False
+        recent = [p.limit for p in self.curve[-self.stable_windows:]]
+        return max(recent) - min(recent) <= max(1, self.stable_tolerance * max(recent))
+
+    def operating_point(self, knee_fraction=0.95):
+        """满足 SLO 且吞吐达到峰值 knee_fraction 的最小并发窗口（拐点）"""
+        eligible = [p for p in self.curve if p.p95 is not None and p.p95 <= self.slo_ms and p.throttled == 0]
+        if not eligible:
+            return None
+        peak = max(p.throughput for p in eligible)
+        return min((p for p in eligible if p.throughput >= knee_fraction * peak), key=lambda p: p.limit)
+
+    def run(self, max_seconds, should_continue=lambda: True, on_window=None):
+        current_limit = int(self.limit.limit)
+        deadline = time.time() + max_seconds
+        window_start = time.time()
+        with ThreadPoolExecutor(max_workers=self.limit.max_limit) as pool:
+            while should_continue() and time.time() < deadline:
+                with self._cond:
+                    while self._in_flight < current_limit:
+                        self._in_flight += 1
+                        pool.submit(self._call)
+                    self._cond.wait(timeout=0.5)
+
+                elapsed = time.time() - window_start
+                if elapsed >= self.window_seconds:
+                    point, current_limit = self._close_window(elapsed, current_limit)
+                    window_start = time.time()
+                    if on_window:
+                        on_window(point, current_limit)
+                    if self._converged():
+                        break
+        return self.operating_point()
+
+
+def main():
+    """对本地替身端点（固定容量）演示收敛过程"""
+    from stand_in_client import StandInClient
+
+    parser = argparse.ArgumentParser(description="自适应并发控制（本地替身演示）")
+    parser.add_argument("--capacity", type=int, default=20, help="替身端点容量")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--slo-ms", type=float, default=400)
+    parser.add_argument("--window-seconds", type=float, default=2)
+    parser.add_argument("--max-seconds", type=float, default=120)
+    args = parser.parse_args()
+
+    client = StandInClient(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 10, capacity=args.capacity)
+
+    def request_fn():
+        try:
+            client.invoke_model(modelId="stand-in", body="{}")
+            return {"success": True}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def on_window(point, new_limit):
+        print(f"  并发 {point.limit:4d} → {new_limit:4d} | 吞吐 {point.throughput:6.1f} rps | "
+              f"p50 {point.p50 or 0:6.0f}ms | p95 {point.p95 or 0:6.0f}ms | 限流 {point.throttled}")
+
+    runner = AdaptiveConcurrencyRunner(request_fn, args.slo_ms, window_seconds=args.window_seconds)
+    best = runner.run(args.max_seconds, on_window=on_window)
+    if best:
+        print(f"\n✅ 工作点: 并发 {best.limit}，吞吐 {best.throughput:.1f} rps，p95 {best.p95:.0f}ms")
+    else:
+        print("\n⚠️  没有满足 SLO 的窗口")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,46 @@
 #!/usr/bin/env python3
 """
 多区域 Nova 性能测试数据分析与可视化
+- pandas / matplotlib / seaborn 及依赖它们的模块在参数解析之后才导入（load_dependencies），--help 和参数错误立即返回
 """
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
-import numpy as np
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-# 设置中文字体支持
-plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
-sns.set_style("whitegrid")
+from incremental_analysis import IncrementalAggregator
+from change_detection import detect_changes
+from host_sampler import DEFAULT_INTERVAL_SECONDS as HOST_SAMPLE_INTERVAL_SECONDS, load_samples, window_pressure
+
+# 由 load_dependencies() 填充
+pd = plt = sns = None
+
+
+def load_dependencies():
+    """导入数据分析 / 绘图依赖并设置全局绘图样式（主进程和每个工作进程都需要调用，重复调用无开销）"""
+    global pd, plt, sns, summarize_files, PREVIEW_MAX_POINTS, lttb_downsample, write_html_report
+    global WeightedStats, token_totals, weighted_group_mean, weighted_group_std, weighted_quantiles, window_throughput
+    if pd is not None:
+        return
+    import pandas
+    import matplotlib.pyplot
+    import seaborn
+    from streaming_aggregation import summarize_files
+    from chart_render import PREVIEW_MAX_POINTS, lttb_downsample, write_html_report
+    from weighted_stats import (WeightedStats, token_totals, weighted_group_mean, weighted_group_std,
+                                weighted_quantiles, window_throughput)
+    pd, plt, sns = pandas, matplotlib.pyplot, seaborn
+
+    # 设置中文字体支持
+    plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
+    plt.rcParams['axes.unicode_minus'] = False
+    sns.set_style("whitegrid")
+
+# 图表输出分辨率；--preview 时降为 PREVIEW_DPI 并对时间线做 LTTB 降采样
+CHART_DPI = 300
+PREVIEW_DPI = 72
+PREVIEW = False
 
 # 区域配置
 REGIONS = {
@@ -25,34 +53,42 @@ REGIONS = {
     'ap-southeast-1': {'name': 'AP Southeast 1 (Singapore)', 'color': '#BB8FCE'}
 }
 
-def load_all_data():
-    """加载所有区域的数据"""
-    all_data = []
-    base_path = Path('/home/ubuntu/codes/nova/performance')
+BASE_PATH = Path('/home/ubuntu/codes/nova/performance')
 
+def find_data_files(base_path=BASE_PATH):
+    """列出所有区域的 CSV 文件 [(region_code, csv_file), ...]"""
+    files = []
     for region_code in REGIONS.keys():
-        if region_code == 'us-west-2':
-            data_dir = base_path / 'concurrent_96h_data_us_west_2'
-        else:
-            region_suffix = region_code.replace('-', '_')
-            data_dir = base_path / f'concurrent_96h_data_{region_suffix}'
+        region_suffix = region_code.replace('-', '_')
+        data_dir = base_path / f'concurrent_96h_data_{region_suffix}'
+        for csv_file in sorted(data_dir.glob('concurrent_96h_image_*.csv')):
+            files.append((region_code, csv_file))
+    return files
 
-        csv_files = list(data_dir.glob('concurrent_96h_image_*.csv'))
+def load_all_data():
+    """加载所有区域的数据"""
+    all_data = []
 
-        if csv_files:
-            for csv_file in csv_files:
-                df = pd.read_csv(csv_file)
-                df['region'] = region_code
-                df['region_name'] = REGIONS[region_code]['name']
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                all_data.append(df)
-                print(f"Loaded {len(df)} records from {region_code}")
+    for region_code, csv_file in find_data_files():
+        df = pd.read_csv(csv_file)
+        df['region'] = region_code
+        df['region_name'] = REGIONS[region_code]['name']
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        all_data.append(df)
+        print(f"Loaded {len(df)} records from {region_code}")
 
     if not all_data:
         raise ValueError("No data files found!")
 
     return pd.concat(all_data, ignore_index=True)
 
+def by_region_name(series):
+    """按区域代码聚合的 Series → (以区域名为索引的 Series, 对应颜色)，只需一次 groupby"""
+    colors = [REGIONS[region]['color'] for region in series.index]
+    named = series.copy()
+    named.index = [REGIONS[region]['name'] for region in series.index]
+    return named, colors
+
 def plot_latency_by_region_and_tier(df):
     """1. 各区域按服务层级的平均延迟对比"""
     fig, axes = plt.subplots(1, 3, figsize=(18, 6))
@@ -62,9 +98,8 @@ def plot_latency_by_region_and_tier(df):
 
     for idx, tier in enumerate(tiers):
         ax = axes[idx]
-        tier_data = df[df['tier'] == tier].groupby('region_name')['avg_server_latency'].mean().sort_values()
-
-        colors = [REGIONS[region]['color'] for region in df[df['tier'] == tier].groupby('region')['avg_server_latency'].mean().sort_values().index]
+        tier_data, colors = by_region_name(
+            weighted_group_mean(df[df['tier'] == tier], 'region', 'avg_server_latency').dropna().sort_values())
 
         tier_data.plot(kind='barh', ax=ax, color=colors)
         ax.set_title(f'{tier.upper()} Tier', fontsize=14, fontweight='bold')
@@ -77,7 +112,7 @@ def plot_latency_by_region_and_tier(df):
             ax.text(v + 50, i, f'{v:.0f}ms', va='center', fontsize=10)
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_1_latency_by_region_tier.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_1_latency_by_region_tier.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 1 saved: chart_1_latency_by_region_tier.png")
 
 def plot_latency_by_concurrency(df):
@@ -90,7 +125,11 @@ def plot_latency_by_concurrency(df):
 
     for idx, tier in enumerate(tiers):
         ax = axes[idx]
-        tier_data = df[df['tier'] == tier].groupby('concurrency')['avg_server_latency'].agg(['mean', 'std'])
+        tier_df = df[df['tier'] == tier]
+        tier_data = pd.DataFrame({
+            'mean': weighted_group_mean(tier_df, 'concurrency', 'avg_server_latency'),
+            'std': weighted_group_std(tier_df, 'concurrency', 'avg_server_latency'),
+        }).reindex(concurrencies)
 
         ax.bar(range(len(concurrencies)), tier_data['mean'],
                yerr=tier_data['std'], capsize=5, color='#3498db', alpha=0.7)
@@ -107,7 +146,7 @@ def plot_latency_by_concurrency(df):
                    ha='center', va='bottom', fontsize=10)
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_2_latency_by_concurrency.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_2_latency_by_concurrency.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 2 saved: chart_2_latency_by_concurrency.png")
 
 def plot_latency_timeline(df):
@@ -117,8 +156,16 @@ def plot_latency_timeline(df):
     for region_code, config in REGIONS.items():
         region_data = df[(df['region'] == region_code) & (df['tier'] == 'default')]
         if len(region_data) > 0:
-            # 按小时聚合数据
-            region_data = region_data.set_index('timestamp').resample('1H')['avg_server_latency'].mean()
+            if PREVIEW:
+                # 预览：直接对逐批次数据做 LTTB 降采样，保留尖峰且无需重采样
+                region_data = region_data.sort_values('timestamp')
+                keep = lttb_downsample(region_data['timestamp'].to_numpy().astype('datetime64[s]').astype('int64'),
+                                       region_data['avg_server_latency'].to_numpy(), PREVIEW_MAX_POINTS)
+                region_data = region_data.iloc[keep].set_index('timestamp')['avg_server_latency']
+            else:
+                # 按小时聚合数据（按成功请求数加权）
+                hourly = region_data.assign(hour=region_data['timestamp'].dt.floor('h'))
+                region_data = weighted_group_mean(hourly, 'hour', 'avg_server_latency').dropna()
             ax.plot(region_data.index, region_data.values,
                    label=config['name'], color=config['color'], linewidth=2, alpha=0.8)
 
@@ -130,20 +177,16 @@ def plot_latency_timeline(df):
     plt.xticks(rotation=45)
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_3_latency_timeline.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_3_latency_timeline.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 3 saved: chart_3_latency_timeline.png")
 
 def plot_success_rate(df):
     """4. 各区域成功率统计"""
     fig, ax = plt.subplots(figsize=(12, 6))
 
-    success_rate = df.groupby('region_name').apply(
-        lambda x: (x['successful'].sum() / (x['successful'].sum() + x['failed'].sum())) * 100
-    ).sort_values(ascending=False)
-
-    colors = [REGIONS[region]['color'] for region in df.groupby('region').apply(
-        lambda x: (x['successful'].sum() / (x['successful'].sum() + x['failed'].sum())) * 100
-    ).sort_values(ascending=False).index]
+    totals = df.groupby('region')[['successful', 'failed']].sum()
+    success_rate, colors = by_region_name(
+        (totals['successful'] / (totals['successful'] + totals['failed']) * 100).sort_values(ascending=False))
 
     success_rate.plot(kind='bar', ax=ax, color=colors, alpha=0.8)
     ax.set_title('Success Rate by Region', fontsize=16, fontweight='bold')
@@ -159,7 +202,7 @@ def plot_success_rate(df):
         ax.text(i, v + 0.1, f'{v:.2f}%', ha='center', va='bottom', fontsize=10, fontweight='bold')
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_4_success_rate.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_4_success_rate.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 4 saved: chart_4_success_rate.png")
 
 def plot_tier_comparison_heatmap(df):
@@ -167,7 +210,7 @@ def plot_tier_comparison_heatmap(df):
     fig, ax = plt.subplots(figsize=(10, 8))
 
     # 创建数据透视表
-    pivot_data = df.groupby(['region_name', 'tier'])['avg_server_latency'].mean().unstack()
+    pivot_data = weighted_group_mean(df, ['region_name', 'tier'], 'avg_server_latency').unstack()
     pivot_data = pivot_data[['flex', 'default', 'priority']]  # 确保顺序
 
     sns.heatmap(pivot_data, annot=True, fmt='.0f', cmap='RdYlGn_r',
@@ -177,7 +220,7 @@ def plot_tier_comparison_heatmap(df):
     ax.set_ylabel('Region', fontsize=12)
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_5_tier_heatmap.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_5_tier_heatmap.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 5 saved: chart_5_tier_heatmap.png")
 
 def plot_token_statistics(df):
@@ -187,8 +230,7 @@ def plot_token_statistics(df):
 
     # 输入 tokens
     ax1 = axes[0]
-    input_tokens = df.groupby('region_name')['avg_input_tokens'].mean().sort_values()
-    colors = [REGIONS[region]['color'] for region in df.groupby('region')['avg_input_tokens'].mean().sort_values().index]
+    input_tokens, colors = by_region_name(weighted_group_mean(df, 'region', 'avg_input_tokens').dropna().sort_values())
     input_tokens.plot(kind='barh', ax=ax1, color=colors, alpha=0.8)
     ax1.set_title('Average Input Tokens', fontsize=14, fontweight='bold')
     ax1.set_xlabel('Tokens', fontsize=12)
@@ -198,8 +240,7 @@ def plot_token_statistics(df):
 
     # 输出 tokens
     ax2 = axes[1]
-    output_tokens = df.groupby('region_name')['avg_output_tokens'].mean().sort_values()
-    colors = [REGIONS[region]['color'] for region in df.groupby('region')['avg_output_tokens'].mean().sort_values().index]
+    output_tokens, colors = by_region_name(weighted_group_mean(df, 'region', 'avg_output_tokens').dropna().sort_values())
     output_tokens.plot(kind='barh', ax=ax2, color=colors, alpha=0.8)
     ax2.set_title('Average Output Tokens', fontsize=14, fontweight='bold')
     ax2.set_xlabel('Tokens', fontsize=12)
@@ -208,7 +249,7 @@ def plot_token_statistics(df):
         ax2.text(v + 2, i, f'{v:.0f}', va='center', fontsize=10)
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_6_token_statistics.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_6_token_statistics.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 6 saved: chart_6_token_statistics.png")
 
 def plot_latency_distribution(df):
@@ -221,13 +262,17 @@ def plot_latency_distribution(df):
     colors_list = []
 
     for region_code, config in REGIONS.items():
-        region_data = df[(df['region'] == region_code) & (df['tier'] == 'default')]['avg_server_latency']
+        # 没有成功请求的批次平均延迟记为 0，不计入分布
+        region_rows = df[(df['region'] == region_code) & (df['tier'] == 'default') & (df['successful'] > 0)]
+        region_data = region_rows['avg_server_latency']
         if len(region_data) > 0:
             plot_data.append(region_data.values)
             labels.append(config['name'])
             colors_list.append(config['color'])
 
-    bp = ax.boxplot(plot_data, labels=labels, patch_artist=True, showmeans=True)
+    bp = ax.boxplot(plot_data, patch_artist=True, showmeans=True)
+    ax.set_xticks(range(1, len(labels) + 1))
+    ax.set_xticklabels(labels)
 
     # 设置颜色
     for patch, color in zip(bp['boxes'], colors_list):
@@ -240,82 +285,340 @@ def plot_latency_distribution(df):
     plt.xticks(rotation=45, ha='right')
 
     plt.tight_layout()
-    plt.savefig('/home/ubuntu/codes/nova/performance/chart_7_latency_distribution.png', dpi=300, bbox_inches='tight')
+    plt.savefig('/home/ubuntu/codes/nova/performance/chart_7_latency_distribution.png', dpi=CHART_DPI, bbox_inches='tight')
     print("✅ Chart 7 saved: chart_7_latency_distribution.png")
 
-def generate_summary_report(df):
-    """生成汇总报告"""
+def latency_stats(latency, weights):
+    """一组批次的加权延迟统计（报告中单个区域 / 层级的一项）"""
+    stats = WeightedStats()
+    stats.add_array(latency, weights)
+    p50, p95, p99 = weighted_quantiles(latency, weights, [0.50, 0.95, 0.99])
+    return {
+        'mean': stats.mean, 'ci95': stats.ci95, 'min': stats.min, 'max': stats.max, 'std': stats.std,
+        'p50': p50, 'p95': p95, 'p99': p99,
+    }
+
+def summarize_frame(df):
+    """从内存中的 DataFrame 计算汇总统计（结构与 StreamingSummary.to_report() 一致），均按请求数加权"""
+    default = df[df['tier'] == 'default']
+    regional = {}
+    for region_name, group in default.groupby('region_name'):
+        regional[region_name] = latency_stats(group['avg_server_latency'], group['successful'])
+        regional[region_name]['successful'] = group['successful'].sum()
+        regional[region_name]['failed'] = group['failed'].sum()
+
+    tiers = {tier: latency_stats(group['avg_server_latency'], group['successful'])
+             for tier, group in df.groupby('tier')}
+
+    start, end = df['timestamp'].min(), df['timestamp'].max()
+    input_tokens, output_tokens = token_totals(df)
+    windows = window_throughput(df)
+    duration = max((end - start).total_seconds(), 1)
+    requests = df['successful'].sum() + df['failed'].sum()
+    return {
+        'start': start,
+        'end': end,
+        'successful': df['successful'].sum(),
+        'failed': df['failed'].sum(),
+        'regional': regional,
+        'tiers': tiers,
+        'concurrency': weighted_group_mean(default, 'concurrency', 'avg_server_latency').dropna().to_dict(),
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'throughput': {
+            'requests_per_sec': requests / duration,
+            'tokens_per_sec': (input_tokens + output_tokens) / duration,
+            'peak_requests_per_sec': windows['requests_per_sec'].max(),
+            'peak_tokens_per_sec': windows['tokens_per_sec'].max(),
+        },
+    }
+
+def print_summary_report(report):
+    """打印汇总报告"""
     print("\n" + "="*80)
     print("📊 MULTI-REGION PERFORMANCE TEST SUMMARY REPORT")
     print("="*80)
 
     print(f"\n📅 Test Period:")
-    print(f"   Start: {df['timestamp'].min()}")
-    print(f"   End:   {df['timestamp'].max()}")
-    print(f"   Duration: {(df['timestamp'].max() - df['timestamp'].min()).total_seconds() / 3600:.1f} hours")
+    print(f"   Start: {report['start']}")
+    print(f"   End:   {report['end']}")
+    print(f"   Duration: {(report['end'] - report['start']).total_seconds() / 3600:.1f} hours")
 
+    total_calls = report['successful'] + report['failed']
     print(f"\n📈 Total Statistics:")
-    print(f"   Total API Calls: {df['successful'].sum() + df['failed'].sum():,}")
-    print(f"   Successful: {df['successful'].sum():,}")
-    print(f"   Failed: {df['failed'].sum():,}")
-    print(f"   Success Rate: {(df['successful'].sum() / (df['successful'].sum() + df['failed'].sum()) * 100):.3f}%")
-
-    print(f"\n🌍 Regional Performance (Default Tier):")
-    regional_stats = df[df['tier'] == 'default'].groupby('region_name').agg({
-        'avg_server_latency': ['mean', 'min', 'max', 'std'],
-        'successful': 'sum',
-        'failed': 'sum'
-    }).round(2)
-
-    for region in regional_stats.index:
-        stats = regional_stats.loc[region]
-        success_rate = stats[('successful', 'sum')] / (stats[('successful', 'sum')] + stats[('failed', 'sum')]) * 100
+    print(f"   Total API Calls: {total_calls:,}")
+    print(f"   Successful: {report['successful']:,}")
+    print(f"   Failed: {report['failed']:,}")
+    print(f"   Success Rate: {(report['successful'] / total_calls * 100):.3f}%")
+
+    print(f"\n🌍 Regional Performance (Default Tier, request-weighted):")
+    for region, stats in report['regional'].items():
+        success_rate = stats['successful'] / (stats['successful'] + stats['failed']) * 100
         print(f"\n   {region}:")
-        print(f"      Avg Latency: {stats[('avg_server_latency', 'mean')]:.0f}ms")
-        print(f"      Min Latency: {stats[('avg_server_latency', 'min')]:.0f}ms")
-        print(f"      Max Latency: {stats[('avg_server_latency', 'max')]:.0f}ms")
-        print(f"      Std Dev: {stats[('avg_server_latency', 'std')]:.0f}ms")
+        print(f"      Avg Latency: {stats['mean']:.0f}ms (95% CI {stats['ci95'][0]:.0f}-{stats['ci95'][1]:.0f}ms)")
+        print(f"      Min Latency: {stats['min']:.0f}ms")
+        print(f"      Max Latency: {stats['max']:.0f}ms")
+        print(f"      Std Dev: {stats['std']:.0f}ms")
+        print(f"      P50 / P95 / P99: {stats['p50']:.0f} / {stats['p95']:.0f} / {stats['p99']:.0f}ms")
         print(f"      Success Rate: {success_rate:.3f}%")
 
     print(f"\n🎯 Service Tier Comparison (All Regions):")
-    tier_stats = df.groupby('tier')['avg_server_latency'].agg(['mean', 'std']).round(2)
     for tier in ['flex', 'default', 'priority']:
-        if tier in tier_stats.index:
-            print(f"   {tier.upper()}: {tier_stats.loc[tier, 'mean']:.0f}ms (±{tier_stats.loc[tier, 'std']:.0f}ms)")
+        if tier in report['tiers']:
+            stats = report['tiers'][tier]
+            print(f"   {tier.upper()}: {stats['mean']:.0f}ms (±{stats['std']:.0f}ms, "
+                  f"95% CI {stats['ci95'][0]:.0f}-{stats['ci95'][1]:.0f}ms, P95 {stats['p95']:.0f}ms)")
 
     print(f"\n⚡ Concurrency Impact (Default Tier):")
-    concurrency_stats = df[df['tier'] == 'default'].groupby('concurrency')['avg_server_latency'].mean().round(2)
-    for conc, latency in concurrency_stats.items():
+    for conc, latency in report['concurrency'].items():
         print(f"   Concurrency {conc}: {latency:.0f}ms")
 
     print(f"\n💰 Token Consumption:")
-    total_input = df['avg_input_tokens'].sum()
-    total_output = df['avg_output_tokens'].sum()
+    total_input = report['input_tokens']
+    total_output = report['output_tokens']
     print(f"   Total Input Tokens: {total_input:,.0f}")
     print(f"   Total Output Tokens: {total_output:,.0f}")
     print(f"   Total Tokens: {(total_input + total_output):,.0f}")
 
+    throughput = report['throughput']
+    print(f"\n🚀 Throughput (peak = busiest hour):")
+    print(f"   Requests/sec: {throughput['requests_per_sec']:.3f} (peak {throughput['peak_requests_per_sec']:.3f})")
+    print(f"   Tokens/sec: {throughput['tokens_per_sec']:.1f} (peak {throughput['peak_tokens_per_sec']:.1f})")
+
     print("\n" + "="*80)
 
+def generate_summary_report(df):
+    """生成汇总报告"""
+    print_summary_report(summarize_frame(df))
+
+# 图表注册表：(名称, 绘图函数, 依赖的层级；None 表示全部层级)
+CHARTS = [
+    ('chart_1_latency_by_region_tier', plot_latency_by_region_and_tier, None),
+    ('chart_2_latency_by_concurrency', plot_latency_by_concurrency, None),
+    ('chart_3_latency_timeline', plot_latency_timeline, ['default']),
+    ('chart_4_success_rate', plot_success_rate, None),
+    ('chart_5_tier_heatmap', plot_tier_comparison_heatmap, None),
+    ('chart_6_token_statistics', plot_token_statistics, None),
+    ('chart_7_latency_distribution', plot_latency_distribution, ['default']),
+]
+
+def configure_rendering(preview):
+    """设置渲染参数（主进程和每个工作进程都需要调用）"""
+    global CHART_DPI, PREVIEW
+    plt.switch_backend('Agg')
+    PREVIEW = preview
+    CHART_DPI = PREVIEW_DPI if preview else 300
+
+_worker_df = None
+
+def _init_worker(df, preview):
+    """进程池初始化：每个工作进程只接收一次 DataFrame"""
+    global _worker_df
+    load_dependencies()
+    configure_rendering(preview)
+    _worker_df = df
+
+def _render_chart(name, df=None):
+    plot = {chart_name: fn for chart_name, fn, _ in CHARTS}[name]
+    plot(_worker_df if df is None else df)
+    plt.close('all')
+    return name
+
+def render_charts(df, names, jobs, preview):
+    """每个工作进程渲染一张图；jobs <= 1 时在当前进程顺序渲染"""
+    if jobs <= 1 or len(names) <= 1:
+        configure_rendering(preview)
+        for name in names:
+            _render_chart(name, df)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(names)),
+                             initializer=_init_worker, initargs=(df, preview)) as pool:
+        for _ in pool.map(_render_chart, names):
+            pass
+
+def load_incremental():
+    """增量模式：只折叠新追加的行，返回 (小时粒度 DataFrame, 需要重绘的图表名, 聚合器)"""
+    aggregator = IncrementalAggregator(BASE_PATH / 'analysis_state.json')
+    dirty = aggregator.update(find_data_files())
+    if not aggregator.aggregates:
+        raise ValueError("No data files found!")
+
+    df = aggregator.to_frame()
+    df['region_name'] = df['region'].map(lambda r: REGIONS[r]['name'])
+    stale = aggregator.charts_to_render([(name, tiers) for name, _, tiers in CHARTS], dirty)
+    print(f"🔄 Incremental: {len(dirty)} aggregate buckets changed, {len(stale)}/{len(CHARTS)} charts stale")
+    return df, stale, aggregator
+
+def print_change_alerts(alerts, path):
+    """变点检测结果：逐条打印并保存 CSV"""
+    print("\n" + "="*80)
+    print("CHANGE-POINT ALERTS (CUSUM over seasonal baseline)")
+    print("="*80)
+    if not alerts:
+        print("\nNo degradations detected")
+        return
+    rows = []
+    for alert in alerts:
+        region, tier, concurrency, metric = alert.key
+        print(f"  {REGIONS[region]['name']:30} {tier:8} conc={concurrency:<3} {metric:11} "
+              f"start {alert.start:%m-%d %H:%M}  detected {alert.detected_at:%m-%d %H:%M}  "
+              f"{alert.baseline:.4g} -> {alert.level:.4g} ({alert.magnitude:+.4g})")
+        rows.append({'region': region, 'tier': tier, 'concurrency': concurrency, 'metric': metric,
+                     'start': alert.start, 'detected_at': alert.detected_at, 'baseline': alert.baseline,
+                     'level': alert.level, 'magnitude': alert.magnitude})
+    pd.DataFrame(rows).to_csv(path, index=False)
+    print(f"\n{len(alerts)} alerts saved: {path}")
+
+# 延迟异常判定：相对同一 (区域, 层级, 并发) 前 ANOMALY_WINDOW 个批次的滚动中位数，
+# 超出 ANOMALY_MAD_SCALE 倍稳健标准差且至少高出 ANOMALY_MIN_RATIO
+ANOMALY_WINDOW = 60
+ANOMALY_MAD_SCALE = 4
+ANOMALY_MIN_RATIO = 0.25
+
+def load_host_samples():
+    """各区域 host_samples_*.csv → {region_code: 按时间排序的采样}"""
+    samples = {}
+    for region_code in REGIONS:
+        data_dir = BASE_PATH / f"concurrent_96h_data_{region_code.replace('-', '_')}"
+        paths = sorted(data_dir.glob('host_samples_*.csv'))
+        if paths:
+            samples[region_code] = load_samples(paths)
+    return samples
+
+def _latency_anomalies(series):
+    """滚动中位数 / MAD 基线上的高延迟点（布尔 Series），只看之前的批次"""
+    history = series.shift(1).rolling(ANOMALY_WINDOW, min_periods=10)
+    median = history.median()
+    mad = (series.shift(1) - median).abs().rolling(ANOMALY_WINDOW, min_periods=10).median() * 1.4826
+    threshold = median + (ANOMALY_MAD_SCALE * mad).clip(lower=ANOMALY_MIN_RATIO * median)
+    return series > threshold
+
+def attribute_latency_anomalies(df, host_samples):
+    """客户端延迟异常的批次归因：窗口内主机有瓶颈 → client host；服务端延迟同时异常 → bedrock；其余 → network"""
+    rows = []
+    # 同一轮的各层级批次依次执行，轮次起点是 timestamp，时长是各批次 batch_time 之和
+    round_seconds = df.groupby(['region', 'timestamp'])['batch_time'].transform('sum')
+    df = df.assign(round_seconds=round_seconds)
+    for (region, tier, concurrency), group in df.sort_values('timestamp').groupby(['region', 'tier', 'concurrency']):
+        client = _latency_anomalies(group['avg_client_latency'])
+        server = _latency_anomalies(group['avg_server_latency'])
+        samples = host_samples.get(region, [])
+        for index in group.index[client]:
+            row = group.loc[index]
+            # CSV 中的 timestamp 是本地时间（naive），而主机采样是 epoch 秒；pandas 会把 naive 当作 UTC
+            start = row['timestamp'].to_pydatetime().timestamp()
+            reasons = window_pressure(samples, start, start + row['round_seconds'], HOST_SAMPLE_INTERVAL_SECONDS)
+            if reasons:
+                cause = 'client host'
+            elif server[index]:
+                cause = 'bedrock'
+            else:
+                cause = 'network' if samples else 'unknown (no host samples)'
+            rows.append({'region': region, 'tier': tier, 'concurrency': concurrency, 'timestamp': row['timestamp'],
+                         'client_latency': row['avg_client_latency'], 'server_latency': row['avg_server_latency'],
+                         'cause': cause, 'host_pressure': ';'.join(reasons)})
+    return rows
+
+def print_host_attribution(rows, path):
+    """延迟异常归因：逐条打印、按原因汇总并保存 CSV"""
+    print("\n" + "="*80)
+    print("LATENCY ANOMALY ATTRIBUTION (client host vs Bedrock)")
+    print("="*80)
+    if not rows:
+        print("\nNo latency anomalies detected")
+        return
+    for row in rows:
+        detail = f" [{row['host_pressure']}]" if row['host_pressure'] else ""
+        print(f"  {REGIONS[row['region']]['name']:30} {row['tier']:8} conc={row['concurrency']:<3} "
+              f"{row['timestamp']:%m-%d %H:%M}  client {row['client_latency']:.0f}ms / "
+              f"server {row['server_latency']:.0f}ms  -> {row['cause']}{detail}")
+    frame = pd.DataFrame(rows)
+    print("\nBy cause:")
+    for cause, count in frame['cause'].value_counts().items():
+        print(f"  {cause:28} {count:>5}")
+    frame.to_csv(path, index=False)
+    print(f"\n{len(rows)} anomalies saved: {path}")
+
 def main():
+    parser = argparse.ArgumentParser(description='Multi-region Nova performance analysis')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fold in only rows appended since the last run and redraw only stale charts')
+    parser.add_argument('--streaming', action='store_true',
+                        help='summary report only, computed in one chunked pass with bounded memory')
+    parser.add_argument('--chunksize', type=int,
+                        help='rows per chunk in streaming mode (default: streaming_aggregation.DEFAULT_CHUNKSIZE)')
+    parser.add_argument('--jobs', type=int, default=min(len(CHARTS), os.cpu_count() or 1),
+                        help='chart rendering processes, one figure per worker (1 = render serially)')
+    parser.add_argument('--preview', action='store_true',
+                        help=f'fast preview: {PREVIEW_DPI} dpi and LTTB-decimated timeline')
+    parser.add_argument('--html', metavar='PATH',
+                        help='also write a self-contained interactive HTML report')
+    parser.add_argument('--no-charts', action='store_true', help='skip PNG rendering (e.g. with --html)')
+    parser.add_argument('--detect-changes', action='store_true',
+                        help='run change-point detection over per-region/tier latency and error-rate series')
+    parser.add_argument('--host-correlation', action='store_true',
+                        help='flag latency anomalies and attribute them to the client host (host_samples_*.csv) '
+                             'or to Bedrock')
+    args = parser.parse_args()
+    load_dependencies()
+
+    if args.streaming:
+        from streaming_aggregation import DEFAULT_CHUNKSIZE
+        print("🚀 Streaming multi-region test data...")
+        sources = find_data_files()
+        if not sources:
+            raise ValueError("No data files found!")
+        summary = summarize_files(sources, {code: cfg['name'] for code, cfg in REGIONS.items()},
+                                  args.chunksize or DEFAULT_CHUNKSIZE)
+        print_summary_report(summary.to_report())
+        return
+
     print("🚀 Loading multi-region test data...")
-    df = load_all_data()
+    aggregator = None
+    if args.incremental:
+        df, stale, aggregator = load_incremental()
+    else:
+        df = load_all_data()
+        stale = [name for name, _, _ in CHARTS]
 
     print(f"\n✅ Loaded {len(df):,} total records from {df['region'].nunique()} regions")
     print(f"   Regions: {', '.join(df['region'].unique())}")
     print(f"   Concurrency Levels: {sorted(df['concurrency'].unique())}")
     print(f"   Service Tiers: {sorted(df['tier'].unique())}")
 
-    print("\n📊 Generating charts...")
-    plot_latency_by_region_and_tier(df)
-    plot_latency_by_concurrency(df)
-    plot_latency_timeline(df)
-    plot_success_rate(df)
-    plot_tier_comparison_heatmap(df)
-    plot_token_statistics(df)
-    plot_latency_distribution(df)
+    if args.no_charts:
+        stale = []
+    else:
+        print("\n📊 Generating charts...")
+        for name, _, _ in CHARTS:
+            if name not in stale:
+                print(f"⏭️  {name}.png unchanged, skipped")
+        render_charts(df, [name for name, _, _ in CHARTS if name in stale], args.jobs, args.preview)
+
+    if args.html:
+        write_html_report(df, args.html, REGIONS)
+        print(f"🌐 Interactive report saved: {args.html}")
+
+    if aggregator is not None:
+        # 小时粒度的 DataFrame 只用于绘图；汇总统计由聚合桶中的批次级统计合并
+        print_summary_report(aggregator.summary({code: cfg['name'] for code, cfg in REGIONS.items()}).to_report())
+    else:
+        generate_summary_report(df)
+
+    if args.detect_changes:
+        print_change_alerts(detect_changes(df), BASE_PATH / 'change_alerts.csv')
+
+    if args.host_correlation:
+        if args.incremental:
+            print("\n⚠️  --host-correlation needs per-batch rows, skipped in --incremental mode")
+        else:
+            host_samples = load_host_samples()
+            print(f"\n🖥️  Host samples: {sum(len(s) for s in host_samples.values()):,} from {len(host_samples)} regions")
+            print_host_attribution(attribute_latency_anomalies(df, host_samples), BASE_PATH / 'host_attribution.csv')
 
-    generate_summary_report(df)
+    if aggregator is not None:
+        aggregator.mark_rendered(stale)
+        aggregator.save()
 
     print("\n✅ All charts generated successfully!")
     print("📁 Charts saved in: /home/ubuntu/codes/nova/performance/")
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+调用方式对比基准：converse / converse_stream / invoke_model / invoke_model_with_response_stream
+- 同一负载先构造 messages-v1 请求体，再转换成 converse 参数，四种接口的请求语义完全一致
+- 按轮交错执行：每轮每个负载把四种接口随机排序后提交到同一线程池，共享并发度和时间段，排除网络 / 服务波动的偏差
+- 每次请求记录：首 token 时间（非流式接口等于总延迟）、总延迟、服务端耗时（由此得到客户端开销）、收发字节、客户端 CPU
+- 收发字节：真实 boto3 客户端通过 botocore 事件钩子测量 HTTP 头 + 正文（不含 TLS 开销）；替身端点只能按负载估算
+- 客户端 CPU 用线程 CPU 时间（time.thread_time）计量，包含序列化、签名、解析和事件流解码
+- 前若干轮为预热（建立连接、加载凭证），不计入结果
+- 负载默认为短文本、长文本和图片，也可从场景文件读取（text / image / video / streaming 类型）
+
+用法:
+    python api_benchmark.py --stand-in --rounds 10
+    python api_benchmark.py --rounds 30 --concurrency 8 --output api_benchmark.json --csv api_benchmark.csv
+    python api_benchmark.py --scenario scenarios/prompt_cache.toml --apis converse,invoke_model
+"""
+
+import argparse
+import base64
+import copy
+import csv
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tier_scheduler import percentile
+from workloads import Workload, is_throttle
+
+APIS = ("converse", "converse_stream", "invoke_model", "invoke_model_with_response_stream")
+STREAMING_APIS = ("converse_stream", "invoke_model_with_response_stream")
+
+DEFAULT_WORKLOADS = [
+    {"name": "short_text", "type": "text", "system": "You are a concise assistant.",
+     "prompt": "Explain what time to first token means.", "max_tokens": 300},
+    {"name": "long_text", "type": "text", "system": "You are a concise assistant.",
+     "prompt": "Summarize the following notes in three sentences.", "prompt_tokens": 4000, "max_tokens": 300},
+    {"name": "image", "type": "image", "image": "test_image.png", "max_tokens": 300},
+]
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def canonical_request(workload, request_id):
+    """负载 → 与接口无关的请求（媒体为原始字节），四种接口都由它生成，保证语义一致"""
+    body = workload.build_body(request_id)
+    request = {"messages": copy.deepcopy(body["messages"]), "inferenceConfig": dict(body["inferenceConfig"])}
+    if body.get("system"):
+        request["system"] = copy.deepcopy(body["system"])
+    for message in request["messages"]:
+        for block in message["content"]:
+            for kind in ("image", "video", "document"):
+                if kind in block:
+                    source = block[kind]["source"]
+                    source["bytes"] = base64.b64decode(source["bytes"])
+    return request
+
+
+def build_params(api, model, request, tier):
+    """按接口生成调用参数；invoke_model 的 base64 编码和 JSON 序列化在这里完成，converse 的由 botocore 完成，
+    因此都在 CPU 计时之内"""
+    if api.startswith("converse"):
+        params = {"modelId": model, **request}
+        if tier != "default":
+            params["serviceTier"] = {"type": tier}
+    else:
+        params = {"modelId": model, "body": json.dumps({"schemaVersion": "messages-v1", **request}, default=_b64),
+                  "contentType": "application/json", "accept": "application/json"}
+        if tier != "default":
+            params["serviceTier"] = tier
+    return params
+
+
+def _header_bytes(headers):
+    # "Name: value\r\n"
+    return sum(len(str(k)) + len(str(v)) + 4 for k, v in headers.items())
+
+
+class WireMeter:
+    """统计真实 boto3 客户端每次请求的收发字节；请求在哪个线程发起，计数就记在哪个线程"""
+
+    def __init__(self, client):
+        self._local = threading.local()
+        self.attached = hasattr(client, "meta")
+        if self.attached:
+            client.meta.events.register("before-send.bedrock-runtime", self._on_send)
+            client.meta.events.register("after-call.bedrock-runtime", self._on_response)
+
+    def reset(self):
+        self._local.sent = 0
+        self._local.received = 0
+        self._local.in_stream = False
+        self._local.response = None
+
+    def _on_send(self, request, **kwargs):
+        body = request.body or b""
+        # 重试时每次发送都计入
+        self._local.sent += (len(body) if isinstance(body, (bytes, bytearray, str)) else 0) \
+            + _header_bytes(request.headers) + len(request.method) + len(request.url)
+
+    def _on_response(self, http_response, **kwargs):
+        local = self._local
+        local.response = http_response
+        # converse 等输出非流式的操作在 after-call 之前已由 botocore 读完正文（content 已缓存）
+        content = getattr(http_response, "_content", None)
+        local.received = len(content) if content is not None else 0
+        local.in_stream = False
+        raw = http_response.raw
+        if content is not None or not hasattr(raw, "stream"):
+            return
+        # invoke_model 的正文（StreamingBody → raw.read）和事件流（raw.stream）都在 after-call 之后才被读取，
+        # 分块传输时 tell() 不计数，因此包一层按读到的数据计数；
+        # 非分块时 raw.stream() 内部会调用 raw.read()，in_stream 避免重复计数
+        read, stream = raw.read, raw.stream
+
+        def counting_read(*args, **kwargs):
+            data = read(*args, **kwargs)
+            if not local.in_stream:
+                local.received += len(data or b"")
+            return data
+
+        def counting_stream(*args, **kwargs):
+            local.in_stream = True
+            try:
+                for data in stream(*args, **kwargs):
+                    local.received += len(data)
+                    yield data
+            finally:
+                local.in_stream = False
+
+        raw.read = counting_read
+        raw.stream = counting_stream
+
+    def measure(self):
+        """请求结束（正文 / 流已读完）后调用，返回 (发送字节, 接收字节)；未挂钩或无响应时为 None"""
+        response = getattr(self._local, "response", None)
+        if not self.attached or response is None:
+            return None, None
+        return self._local.sent, self._local.received + _header_bytes(response.headers)
+
+
+def _estimate_request_bytes(params):
+    """替身端点：按 boto3 序列化后的 JSON 正文估算"""
+    if "body" in params:
+        return len(params["body"])
+    payload = {k: v for k, v in params.items() if k != "modelId"}
+    return len(json.dumps(payload, default=_b64))
+
+
+def _call_converse(client, params, start):
+    response = client.converse(**params)
+    payload = {k: v for k, v in response.items() if k != "ResponseMetadata"}
+    server_ms = response.get("metrics", {}).get("latencyMs")
+    return None, response.get("usage", {}), server_ms, len(json.dumps(payload))
+
+
+def _call_converse_stream(client, params, start):
+    response = client.converse_stream(**params)
+    ttft = None
+    usage = {}
+    server_ms = None
+    size = 0
+    for event in response["stream"]:
+        size += len(json.dumps(event))
+        if ttft is None and "contentBlockDelta" in event:
+            ttft = int((time.time() - start) * 1000)
+        if "metadata" in event:
+            usage = event["metadata"].get("usage", {})
+            server_ms = event["metadata"].get("metrics", {}).get("latencyMs")
+    return ttft, usage, server_ms, size
+
+
+def _call_invoke_model(client, params, start):
+    response = client.invoke_model(**params)
+    raw = response["body"].read()
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    server_ms = headers.get("x-amzn-bedrock-invocation-latency")
+    return None, json.loads(raw).get("usage", {}), int(server_ms) if server_ms else None, len(raw)
+
+
+def _call_invoke_stream(client, params, start):
+    response = client.invoke_model_with_response_stream(**params)
+    ttft = None
+    usage = {}
+    server_ms = None
+    size = 0
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        size += len(chunk["bytes"])
+        payload = json.loads(chunk["bytes"])
+        if ttft is None and "contentBlockDelta" in payload:
+            ttft = int((time.time() - start) * 1000)
+        if "metadata" in payload:
+            usage = payload["metadata"].get("usage", {})
+        metrics = payload.get("amazon-bedrock-invocationMetrics")
+        if metrics:
+            server_ms = metrics.get("invocationLatency")
+    return ttft, usage, server_ms, size
+
+
+CALLERS = {
+    "converse": _call_converse,
+    "converse_stream": _call_converse_stream,
+    "invoke_model": _call_invoke_model,
+    "invoke_model_with_response_stream": _call_invoke_stream,
+}
+
+
+def run_once(client, meter, api, workload, request_id, tier):
+    """执行一次请求并计量；异常记录为失败结果"""
+    request = canonical_request(workload, request_id)
+    row = {"workload": workload.name, "api": api, "request_id": request_id, "ok": True, "error": None,
+           "throttled": False}
+    meter.reset()
+    cpu_start = time.thread_time()
+    start = time.time()
+    try:
+        params = build_params(api, workload.model, request, tier)
+        ttft, usage, server_ms, payload_bytes = CALLERS[api](client, params, start)
+    except Exception as e:
+        row.update(ok=False, error=str(e)[:200], throttled=is_throttle(e),
+                   latency_ms=int((time.time() - start) * 1000))
+        return row
+    latency = int((time.time() - start) * 1000)
+    cpu_ms = (time.thread_time() - cpu_start) * 1000
+
+    sent, received = meter.measure()
+    estimated = sent is None
+    if estimated:
+        sent, received = _estimate_request_bytes(params), payload_bytes
+    row.update(
+        latency_ms=latency,
+        # 非流式接口拿到响应时所有 token 一起到达
+        ttft_ms=ttft if ttft is not None else latency,
+        server_ms=server_ms,
+        overhead_ms=latency - server_ms if server_ms is not None else None,
+        bytes_sent=sent,
+        bytes_received=received,
+        bytes_estimated=estimated,
+        cpu_ms=round(cpu_ms, 3),
+        input_tokens=usage.get("inputTokens", 0),
+        output_tokens=usage.get("outputTokens", 0),
+    )
+    return row
+
+
+def build_schedule(workloads, apis, rounds, seed=0):
+    """每轮每个负载把接口随机排序，返回 [(轮次, 接口, 负载)]"""
+    rng = random.Random(seed)
+    schedule = []
+    for round_index in range(rounds):
+        for workload in workloads:
+            order = list(apis)
+            rng.shuffle(order)
+            schedule.extend((round_index, api, workload) for api in order)
+    return schedule
+
+
+def run_benchmark(client, workloads, apis=APIS, rounds=10, warmup_rounds=1, concurrency=4, tier="default", seed=0):
+    """交错执行全部请求，返回非预热轮次的逐请求结果"""
+    meter = WireMeter(client)
+    schedule = build_schedule(workloads, apis, warmup_rounds + rounds, seed)
+
+    def task(item):
+        index, (round_index, api, workload) = item
+        row = run_once(client, meter, api, workload, index, tier)
+        row["round"] = round_index
+        row["warmup"] = round_index < warmup_rounds
+        return row
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        rows = list(executor.map(task, enumerate(schedule)))
+    return [row for row in rows if not row["warmup"]]
+
+
+def _avg(values):
+    return sum(values) / len(values) if values else None
+
+
+def summarize(rows):
+    """按 (负载, 接口) 汇总，并为每个负载给出各指标最优的接口"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row["workload"], {}).setdefault(row["api"], []).append(row)
+
+    report = {}
+    for workload, by_api in groups.items():
+        stats = {}
+        for api, api_rows in by_api.items():
+            ok = [r for r in api_rows if r["ok"]]
+
+            def values(field):
+                return [r[field] for r in ok if r.get(field) is not None]
+
+            stats[api] = {
+                "requests": len(api_rows),
+                "errors": len(api_rows) - len(ok),
+                "throttled": sum(r["throttled"] for r in api_rows),
+                "ttft_p50_ms": percentile(values("ttft_ms"), 50),
+                "ttft_p95_ms": percentile(values("ttft_ms"), 95),
+                "latency_p50_ms": percentile(values("latency_ms"), 50),
+                "latency_p95_ms": percentile(values("latency_ms"), 95),
+                "overhead_p50_ms": percentile(values("overhead_ms"), 50),
+                "avg_bytes_sent": round(_avg(values("bytes_sent")) or 0),
+                "avg_bytes_received": round(_avg(values("bytes_received")) or 0),
+                "bytes_estimated": any(r.get("bytes_estimated") for r in ok),
+                "cpu_p50_ms": percentile(values("cpu_ms"), 50),
+                "cpu_avg_ms": round(_avg(values("cpu_ms")) or 0, 3),
+                "avg_output_tokens": round(_avg(values("output_tokens")) or 0, 1),
+            }
+
+        def best(metric, candidates=None):
+            usable = {api: s[metric] for api, s in stats.items()
+                      if s[metric] is not None and (candidates is None or api in candidates)}
+            return min(usable, key=usable.get) if usable else None
+
+        report[workload] = {
+            "apis": stats,
+            "best": {
+                "latency": best("latency_p50_ms"),
+                "ttft": best("ttft_p50_ms", STREAMING_APIS),
+                "bytes_sent": best("avg_bytes_sent"),
+                "cpu": best("cpu_p50_ms"),
+            },
+        }
+    return report
+
+
+def _fmt(value, spec=".0f"):
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(report):
+    for workload, entry in report.items():
+        print(f"\n📋 {workload}")
+        print(f"  {'接口':<34} {'成功/总数':>9} {'TTFT p50/p95':>15} {'延迟 p50/p95':>15} {'客户端开销':>10} "
+              f"{'发送 KB':>9} {'接收 KB':>9} {'CPU ms':>8}")
+        for api in APIS:
+            s = entry["apis"].get(api)
+            if not s:
+                continue
+            mark = "~" if s["bytes_estimated"] else ""
+            print(f"  {api:<34} {s['requests'] - s['errors']:>4}/{s['requests']:<4} "
+                  f"{_fmt(s['ttft_p50_ms']):>7}/{_fmt(s['ttft_p95_ms']):<7} "
+                  f"{_fmt(s['latency_p50_ms']):>7}/{_fmt(s['latency_p95_ms']):<7} "
+                  f"{_fmt(s['overhead_p50_ms']):>10} "
+                  f"{mark}{s['avg_bytes_sent'] / 1024:>8.1f} {mark}{s['avg_bytes_received'] / 1024:>8.1f} "
+                  f"{_fmt(s['cpu_p50_ms'], '.2f'):>8}")
+        best = entry["best"]
+        print(f"  🏆 总延迟最低: {best['latency'] or '-'}  首 token 最快: {best['ttft'] or '-'}  "
+              f"请求最小: {best['bytes_sent'] or '-'}  CPU 最低: {best['cpu'] or '-'}")
+    if any(s["bytes_estimated"] for entry in report.values() for s in entry["apis"].values()):
+        print("\n  ~ 替身端点无 HTTP 层：字节数按 JSON 负载估算（不含事件流帧头），CPU 不含 botocore 序列化和签名")
+
+
+def load_workloads(scenario_path=None, model=None):
+    """默认负载或场景文件中的负载；embedding 不支持 converse，跳过"""
+    if scenario_path:
+        from scenario_runner import load_scenario
+        scenario = load_scenario(scenario_path)
+        specs, base_dir = scenario["workloads"], Path(scenario_path).parent
+        model = model or scenario.get("model")
+    else:
+        specs, base_dir = DEFAULT_WORKLOADS, Path(__file__).parent
+    workloads = []
+    for spec in specs:
+        if spec["type"] == "embedding":
+            print(f"⚠️  跳过 {spec.get('name', 'embedding')}：embedding 模型不支持 converse")
+            continue
+        spec = {**spec, "type": "text" if spec["type"] == "streaming" else spec["type"]}
+        workloads.append(Workload(spec, base_dir, default_model=model))
+    return workloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='converse / invoke_model 及其流式接口的对比基准')
+    parser.add_argument('--apis', default=','.join(APIS), help='参与对比的接口，逗号分隔 (默认: 全部四种)')
+    parser.add_argument('--scenario', help='从场景文件读取负载（默认: 短文本 / 长文本 / 图片）')
+    parser.add_argument('--rounds', type=int, default=10, help='计入结果的轮数 (默认: 10)')
+    parser.add_argument('--warmup-rounds', type=int, default=1, help='预热轮数 (默认: 1)')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发请求数 (默认: 4)')
+    parser.add_argument('--tier', default='default', choices=['flex', 'default', 'priority'])
+    parser.add_argument('--region', default='us-west-2')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0')
+    parser.add_argument('--seed', type=int, default=0, help='接口排序的随机种子')
+    parser.add_argument('--stand-in', action='store_true', help='使用本地替身端点')
+    parser.add_argument('--output', help='汇总报告 JSON')
+    parser.add_argument('--csv', help='逐请求结果 CSV')
+    args = parser.parse_args()
+
+    apis = [api.strip() for api in args.apis.split(',')]
+    unknown = set(apis) - set(APIS)
+    if unknown:
+        parser.error(f"未知接口: {', '.join(sorted(unknown))}（可选: {', '.join(APIS)}）")
+    workloads = load_workloads(args.scenario, args.model)
+
+    if args.stand_in:
+        from stand_in_client import StandInClient
+        client = StandInClient(region=args.region, latency_ms=800, output_tokens=150,
+                               unary_generation=True)
+    else:
+        import boto3
+        from botocore.config import Config
+        client = boto3.client("bedrock-runtime", region_name=args.region,
+                              config=Config(max_pool_connections=max(10, args.concurrency)))
+
+    total = (args.rounds + args.warmup_rounds) * len(workloads) * len(apis)
+    print(f"🚀 {len(workloads)} 个负载 × {len(apis)} 种接口，{args.rounds} 轮（另 {args.warmup_rounds} 轮预热），"
+          f"共 {total} 次请求，并发 {args.concurrency}")
+    start = time.time()
+    rows = run_benchmark(client, workloads, apis, args.rounds, args.warmup_rounds, args.concurrency,
+                         args.tier, args.seed)
+    print(f"⏱️  用时 {time.time() - start:.1f}s")
+
+    report = summarize(rows)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"config": vars(args), "report": report}, f, indent=2, ensure_ascii=False)
+        print(f"📁 报告: {args.output}")
+    if args.csv:
+        fields = ["round", "workload", "api", "request_id", "ok", "ttft_ms", "latency_ms", "server_ms", "overhead_ms",
+                  "bytes_sent", "bytes_received", "bytes_estimated", "cpu_ms", "input_tokens", "output_tokens",
+                  "throttled", "error"]
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"📁 逐请求结果: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
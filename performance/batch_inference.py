@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+离线批量推理：Bedrock 批处理作业（model invocation job）与实时调用的自动路由
+- 数据集（JSONL / CSV，每行一条：id, type, prompt, system, image, text, max_tokens）
+  → 与 text/、images-inference/、mme/ 脚本相同结构的请求体 → 分片 JSONL（recordId + modelInput）
+- 分片上传到 S3 后提交作业，作业状态写入本地状态文件，中断后可用同一 --work-dir 续查
+- 作业输出（*.jsonl.out）逐行流式解析，按 recordId 拼回数据集顺序
+- 路由：记录数达到下限且截止时间宽于批处理最长周转时走批处理（约半价、不占实时配额），否则实时调用
+- --stand-in 使用本地目录模拟 S3、后台线程模拟控制面，无需 AWS 账号即可完整跑通
+
+用法:
+    python batch_inference.py dataset.jsonl --stand-in --output results.jsonl
+    python batch_inference.py dataset.jsonl --s3-uri s3://my-bucket/nova-batch \\
+        --role-arn arn:aws:iam::123456789012:role/BedrockBatch --deadline-hours 48 --output results.jsonl
+"""
+
+import argparse
+import base64
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from image_preprocess import image_format
+from stand_in_client import StandInClient
+from workloads import DEFAULT_EMBEDDING_MODEL, is_throttle
+
+# 批处理作业配额（按模型不同，以控制台 Service Quotas 为准）
+MIN_RECORDS_PER_JOB = 100
+MAX_RECORDS_PER_JOB = 50000
+MAX_FILE_BYTES = 1024 ** 3
+MAX_JOB_BYTES = 5 * 1024 ** 3
+# 批处理作业承诺的最长周转时间
+BATCH_TURNAROUND_HOURS = 24
+
+# 低于这个记录数时作业排队和轮询的开销不值得，直接实时调用
+DEFAULT_BATCH_MIN_RECORDS = 1000
+# 实时调用的预估吞吐（受账号配额限制，按需调整）
+DEFAULT_REALTIME_RPS = 5.0
+DEFAULT_SHARD_RECORDS = 10000
+DEFAULT_MAX_TOKENS = 300
+MAX_REALTIME_ATTEMPTS = 5
+
+TERMINAL_STATES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+SUCCESS_STATES = ("Completed", "PartiallyCompleted")
+RECORD_TYPES = ("text", "image", "embedding")
+
+
+def load_dataset(path):
+    """逐行读取数据集；缺少 id 时用行号"""
+    path = Path(path)
+    with open(path) as f:
+        rows = (json.loads(line) for line in f if line.strip()) if path.suffix in (".jsonl", ".json") \
+            else csv.DictReader(f)
+        for index, row in enumerate(rows):
+            row = {key: value for key, value in row.items() if value not in (None, "")}
+            row.setdefault("id", str(index))
+            row.setdefault("type", "image" if row.get("image") else "text")
+            if row["type"] not in RECORD_TYPES:
+                raise ValueError(f"第 {index + 1} 行: 未知类型 {row['type']}（可选: {', '.join(RECORD_TYPES)}）")
+            yield row
+
+
+def count_records(path):
+    return sum(1 for _ in load_dataset(path))
+
+
+def record_id(index):
+    """recordId 为 11 位字母数字；数据集 id 可能含任意字符，按序号编码、拼回时再还原"""
+    return f"R{index:010d}"
+
+
+def _image_block(path, base_dir):
+    data = (Path(base_dir) / path).read_bytes()
+    return {"format": image_format(data), "source": {"bytes": base64.b64encode(data).decode("utf-8")}}
+
+
+def build_model_input(row, base_dir="."):
+    """数据集一行 → invoke_model 请求体（与仓库各脚本构造的结构一致）"""
+    if row["type"] == "embedding":
+        params = {"embeddingPurpose": "GENERIC_INDEX", "embeddingDimension": int(row.get("dimension", 1024))}
+        if row.get("image"):
+            params["image"] = _image_block(row["image"], base_dir)
+        else:
+            params["text"] = {"truncationMode": "END", "value": row["text"]}
+        return {"taskType": "SINGLE_EMBEDDING", "singleEmbeddingParams": params}
+
+    content = []
+    if row["type"] == "image":
+        content.append({"image": _image_block(row["image"], base_dir)})
+    content.append({"text": row.get("prompt", "What do you see in this image?")})
+    body = {
+        "schemaVersion": "messages-v1",
+        "messages": [{"role": "user", "content": content}],
+        "inferenceConfig": {"maxTokens": int(row.get("max_tokens", DEFAULT_MAX_TOKENS)),
+                            "temperature": float(row.get("temperature", 0.3))},
+    }
+    if row.get("system"):
+        body["system"] = [{"text": row["system"]}]
+    return body
+
+
+def parse_model_output(model_output=None, error=None):
+    """模型输出或错误 → 结果行（批处理与实时共用）"""
+    if error is not None:
+        return {"ok": False, "error": error}
+    usage = model_output.get("usage", {})
+    result = {"ok": True, "input_tokens": usage.get("inputTokens", 0),
+              "output_tokens": usage.get("outputTokens", 0)}
+    if "embeddings" in model_output:
+        result["embedding"] = model_output["embeddings"][0]["embedding"]
+    else:
+        result["text"] = model_output["output"]["message"]["content"][0]["text"]
+    return result
+
+
+def choose_route(records, deadline_hours=None, realtime_rps=DEFAULT_REALTIME_RPS,
+                 batch_min_records=DEFAULT_BATCH_MIN_RECORDS):
+    """按数据量和截止时间选择 batch / realtime，返回 (route, 原因)"""
+    realtime_hours = records / realtime_rps / 3600
+    if records < max(batch_min_records, MIN_RECORDS_PER_JOB):
+        return "realtime", f"{records} 条低于批处理下限 {max(batch_min_records, MIN_RECORDS_PER_JOB)}"
+    if deadline_hours is None or deadline_hours >= BATCH_TURNAROUND_HOURS:
+        return "batch", f"{records} 条，截止时间不早于批处理最长周转 {BATCH_TURNAROUND_HOURS}h"
+    if realtime_hours <= deadline_hours:
+        return "realtime", (f"截止 {deadline_hours}h 早于批处理最长周转 {BATCH_TURNAROUND_HOURS}h，"
+                            f"实时预计 {realtime_hours:.1f}h")
+    # 两条路都不能保证：批处理通常远早于最长周转完成，且不受实时配额限制
+    return "batch", f"实时预计 {realtime_hours:.1f}h 也超过截止 {deadline_hours}h，批处理更可能按时完成"
+
+
+def _split_uri(uri):
+    match = re.match(r"s3://([^/]+)/?(.*)", uri)
+    if not match:
+        raise ValueError(f"不是 S3 URI: {uri}")
+    return match.group(1), match.group(2).rstrip("/")
+
+
+class S3Storage:
+    """S3 上传 / 列举 / 逐行读取"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, local_path, uri):
+        bucket, key = _split_uri(uri)
+        self.client.upload_file(str(local_path), bucket, key)
+
+    def list(self, prefix_uri):
+        bucket, prefix = _split_uri(prefix_uri)
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield f"s3://{bucket}/{item['Key']}"
+
+    def iter_lines(self, uri):
+        bucket, key = _split_uri(uri)
+        for line in self.client.get_object(Bucket=bucket, Key=key)["Body"].iter_lines():
+            yield line.decode("utf-8")
+
+
+class LocalStorage:
+    """本地目录模拟 S3：s3://bucket/key ↔ root/bucket/key"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, uri):
+        bucket, key = _split_uri(uri)
+        return self.root / bucket / key
+
+    def upload(self, local_path, uri):
+        path = self._path(uri)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Path(local_path).read_bytes())
+
+    def write_lines(self, uri, lines):
+        path = self._path(uri)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def list(self, prefix_uri):
+        bucket, prefix = _split_uri(prefix_uri)
+        base = self.root / bucket
+        if not base.exists():
+            return
+        for path in sorted(base.rglob("*")):
+            key = path.relative_to(base).as_posix()
+            if path.is_file() and key.startswith(prefix):
+                yield f"s3://{bucket}/{key}"
+
+    def iter_lines(self, uri):
+        with open(self._path(uri)) as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+
+class StandInBatchControlPlane:
+    """
+    模拟 bedrock 控制面的 create / get / stop_model_invocation_job
+    - 后台线程按 Submitted → Validating → InProgress → Completed 推进
+    - 逐条记录交给替身运行时生成输出，按 error_rate 注入记录级错误
+    - 输出写到 {output}/{job_id}/{输入文件名}.out，与 Bedrock 的布局一致
+    """
+
+    def __init__(self, storage, turnaround_seconds=3.0, record_error_rate=0.01, seed=None):
+        self.storage = storage
+        self.turnaround_seconds = turnaround_seconds
+        self.runtime = StandInClient(latency_ms=1, jitter_ms=0, error_rate=record_error_rate, seed=seed)
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig, **kwargs):
+        job_id = uuid.uuid4().hex[:12]
+        arn = f"arn:aws:bedrock:local:000000000000:model-invocation-job/{job_id}"
+        job = {"jobArn": arn, "jobName": jobName, "modelId": modelId, "roleArn": roleArn,
+               "status": "Submitted", "submitTime": time.time(),
+               "inputDataConfig": inputDataConfig, "outputDataConfig": outputDataConfig}
+        with self._lock:
+            self.jobs[arn] = job
+        threading.Thread(target=self._process, args=(job, job_id), daemon=True).start()
+        return {"jobArn": arn}
+
+    def _set(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _process(self, job, job_id):
+        step = self.turnaround_seconds / 3
+        time.sleep(step)
+        self._set(job, status="Validating")
+        time.sleep(step)
+        if job["status"] == "Stopping":
+            self._set(job, status="Stopped", endTime=time.time())
+            return
+        self._set(job, status="InProgress")
+        input_prefix = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        output_prefix = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"].rstrip("/")
+        failed = 0
+        for uri in list(self.storage.list(input_prefix)):
+            def outputs():
+                nonlocal failed
+                for line in self.storage.iter_lines(uri):
+                    record = json.loads(line)
+                    entry = {"recordId": record["recordId"], "modelInput": record["modelInput"]}
+                    try:
+                        response = self.runtime.invoke_model(modelId=job["modelId"],
+                                                             body=json.dumps(record["modelInput"]))
+                        entry["modelOutput"] = json.loads(response["body"].read())
+                    except Exception as e:
+                        failed += 1
+                        entry["error"] = {"errorCode": 503, "errorMessage": str(e)[:200]}
+                    yield json.dumps(entry)
+            self.storage.write_lines(f"{output_prefix}/{job_id}/{uri.rsplit('/', 1)[-1]}.out", outputs())
+        time.sleep(step)
+        self._set(job, status="PartiallyCompleted" if failed else "Completed", endTime=time.time())
+
+    def get_model_invocation_job(self, jobIdentifier):
+        with self._lock:
+            return dict(self.jobs[jobIdentifier])
+
+    def stop_model_invocation_job(self, jobIdentifier):
+        self._set(self.jobs[jobIdentifier], status="Stopping")
+        return {}
+
+
+def plan_jobs(line_sizes):
+    """
+    各作业的记录数：记录数、字节数都不超过作业上限，并在所需作业数之间均分，
+    避免最后剩下一个低于 MIN_RECORDS_PER_JOB 的小作业（Bedrock 会拒绝）
+    """
+    n = len(line_sizes)
+    jobs_left = max(1, math.ceil(n / MAX_RECORDS_PER_JOB), math.ceil(sum(line_sizes) / MAX_JOB_BYTES))
+    counts = []
+    start = 0
+    while start < n:
+        remaining = n - start
+        jobs_left = max(jobs_left, math.ceil(remaining / MAX_RECORDS_PER_JOB))
+        target = math.ceil(remaining / jobs_left)
+        count = job_bytes = 0
+        while count < target and job_bytes + line_sizes[start + count] <= MAX_JOB_BYTES:
+            job_bytes += line_sizes[start + count]
+            count += 1
+        count = max(count, 1)
+        counts.append(count)
+        start += count
+        jobs_left = max(1, jobs_left - 1)
+    if counts and min(counts) < MIN_RECORDS_PER_JOB:
+        raise ValueError(f"作业记录数 {min(counts)} 低于批处理下限 {MIN_RECORDS_PER_JOB}，请改用实时调用")
+    return counts
+
+
+def write_shards(rows, base_dir, out_dir, shard_records=DEFAULT_SHARD_RECORDS):
+    """
+    两遍写分片：先把请求行流式写入临时文件并记下每行大小，按 plan_jobs 均分作业后再切成分片
+    返回 [[{"path", "first", "count"}, ...], ...]（每个作业一组，first 为分片首条记录的序号）
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    spool_path = out_dir / "records.spool"
+    sizes = array("q")
+    with open(spool_path, "wb") as spool:
+        for index, row in enumerate(rows):
+            line = (json.dumps({"recordId": record_id(index), "modelInput": build_model_input(row, base_dir)})
+                    + "\n").encode("utf-8")
+            spool.write(line)
+            sizes.append(len(line))
+
+    jobs = []
+    index = 0
+    with open(spool_path, "rb") as spool:
+        for job_index, count in enumerate(plan_jobs(sizes)):
+            end = index + count
+            shards = []
+            while index < end:
+                path = out_dir / f"job{job_index:03d}-shard{len(shards):04d}.jsonl"
+                first = index
+                shard_bytes = 0
+                with open(path, "wb") as shard:
+                    while index < end and index - first < shard_records and \
+                            (index == first or shard_bytes + sizes[index] <= MAX_FILE_BYTES):
+                        shard.write(spool.readline())
+                        shard_bytes += sizes[index]
+                        index += 1
+                shards.append({"path": path, "first": first, "count": index - first})
+            jobs.append(shards)
+    os.remove(spool_path)
+    return jobs
+
+
+def dataset_fingerprint(path):
+    """数据集内容的 sha256 与记录数；续查前确认数据集没有变化"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return {"sha256": digest.hexdigest(), "records": count_records(path)}
+
+
+class BatchJobTracker:
+    """提交作业并把状态持久化到 state.json，支持中断后续查"""
+
+    def __init__(self, control, storage, work_dir):
+        self.control = control
+        self.storage = storage
+        self.work_dir = Path(work_dir)
+        self.state_path = self.work_dir / "state.json"
+        self.state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+
+    def save(self):
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.state, indent=2, ensure_ascii=False))
+        os.replace(tmp_path, self.state_path)
+
+    def resumable(self, fingerprint):
+        """状态文件对应同一份数据集，且还有未结束的作业时才续查"""
+        jobs = self.state.get("jobs")
+        return bool(jobs) and self.state.get("dataset") == fingerprint and \
+            any(job["status"] not in TERMINAL_STATES for job in jobs)
+
+    def submit(self, shard_groups, model_id, s3_uri, role_arn, name, fingerprint=None):
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        self.state = {"run_id": run_id, "model_id": model_id, "dataset": fingerprint, "jobs": []}
+        for index, shards in enumerate(shard_groups):
+            input_uri = f"{s3_uri.rstrip('/')}/{run_id}/input/job{index:03d}/"
+            output_uri = f"{s3_uri.rstrip('/')}/{run_id}/output/job{index:03d}/"
+            for shard in shards:
+                self.storage.upload(shard["path"], input_uri + shard["path"].name)
+            job_name = re.sub(r"[^a-zA-Z0-9-]", "-", f"{name}-{run_id}-{index}")[:63]
+            response = self.control.create_model_invocation_job(
+                jobName=job_name, roleArn=role_arn, modelId=model_id,
+                inputDataConfig={"s3InputDataConfig": {"s3Uri": input_uri, "s3InputFormat": "JSONL"}},
+                outputDataConfig={"s3OutputDataConfig": {"s3Uri": output_uri}},
+                timeoutDurationInHours=BATCH_TURNAROUND_HOURS)
+            self.state["jobs"].append({
+                "job_arn": response["jobArn"], "job_name": job_name, "output_uri": output_uri,
+                "status": "Submitted", "message": None,
+                "shards": [{"name": s["path"].name, "first": s["first"], "count": s["count"]} for s in shards]})
+            self.save()
+            print(f"📤 作业 {job_name}: {sum(s['count'] for s in shards)} 条 / {len(shards)} 个分片 → {input_uri}")
+
+    def refresh(self):
+        for job in self.state["jobs"]:
+            if job["status"] in TERMINAL_STATES:
+                continue
+            response = self.control.get_model_invocation_job(jobIdentifier=job["job_arn"])
+            if response["status"] != job["status"]:
+                print(f"   {job['job_name']}: {job['status']} → {response['status']}")
+            job["status"] = response["status"]
+            job["message"] = response.get("message")
+        self.save()
+        return [job["status"] for job in self.state["jobs"]]
+
+    def wait(self, poll_seconds=60, timeout_hours=BATCH_TURNAROUND_HOURS * 2):
+        deadline = time.time() + timeout_hours * 3600
+        while not all(status in TERMINAL_STATES for status in self.refresh()):
+            if time.time() > deadline:
+                raise TimeoutError(f"作业 {timeout_hours}h 内未结束，状态见 {self.state_path}")
+            time.sleep(poll_seconds)
+        return self.state["jobs"]
+
+    def iter_results(self):
+        """
+        按记录顺序产出 (序号, 结果行)：作业、分片按提交顺序，每次只把一个分片的输出读进内存排序
+        （分片内输出行的顺序不保证与输入一致）
+        """
+        for job in self.state["jobs"]:
+            if job["status"] not in SUCCESS_STATES:
+                continue
+            # 输出为 {output}/{job_id}/{输入文件名}.out；跳过 manifest.json.out
+            outputs = {uri.rsplit("/", 1)[-1][:-len(".out")]: uri
+                       for uri in self.storage.list(job["output_uri"]) if uri.endswith(".jsonl.out")}
+            for shard in job["shards"]:
+                if shard["name"] not in outputs:
+                    continue
+                results = {}
+                for line in self.storage.iter_lines(outputs[shard["name"]]):
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    error = entry.get("error")
+                    if error is not None:
+                        error = f"{error.get('errorCode')}: {error.get('errorMessage')}"
+                    results[int(entry["recordId"][1:])] = parse_model_output(entry.get("modelOutput"), error)
+                for index in sorted(results):
+                    yield index, results[index]
+
+
+def run_realtime(client, model_ids, rows, base_dir, workers=8):
+    """实时路径：有界并发调用 invoke_model，限流时指数退避重试；产出 (序号, 结果行)"""
+    results = []
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def call(index, row):
+        try:
+            body = json.dumps(build_model_input(row, base_dir))
+            model_id = model_ids[row["type"] == "embedding"]
+            for attempt in range(MAX_REALTIME_ATTEMPTS):
+                try:
+                    response = client.invoke_model(modelId=model_id, body=body, contentType="application/json",
+                                                   accept="application/json")
+                    result = parse_model_output(json.loads(response["body"].read()))
+                    break
+                except Exception as e:
+                    result = parse_model_output(error=str(e)[:200])
+                    if not is_throttle(e) or attempt == MAX_REALTIME_ATTEMPTS - 1:
+                        break
+                    time.sleep(min(30, 2 ** attempt))
+            with lock:
+                results.append((index, result))
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 信号量限制已提交未完成的任务数，避免一次把整个数据集的请求体读进内存
+        for index, row in enumerate(rows):
+            slots.acquire()
+            pool.submit(call, index, row)
+    return results
+
+
+def write_results(dataset, results, output, route):
+    """按数据集顺序写出；results 为序号递增的 (序号, 结果行)，与数据集逐行归并，输出中缺失的记录记为失败"""
+    results = iter(results)
+    pending = next(results, None)
+    counts = {"ok": 0, "failed": 0, "missing": 0, "input_tokens": 0, "output_tokens": 0}
+    with open(output, "w") as f:
+        for index, row in enumerate(load_dataset(dataset)):
+            while pending is not None and pending[0] < index:
+                pending = next(results, None)
+            if pending is not None and pending[0] == index:
+                result = pending[1]
+                pending = next(results, None)
+            else:
+                counts["missing"] += 1
+                result = {"ok": False, "error": "missing from job output"}
+            counts["ok" if result["ok"] else "failed"] += 1
+            counts["input_tokens"] += result.get("input_tokens", 0)
+            counts["output_tokens"] += result.get("output_tokens", 0)
+            f.write(json.dumps({"id": row["id"], "route": route, **result}, ensure_ascii=False) + "\n")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线批量推理（批处理作业 / 实时自动路由）')
+    parser.add_argument('dataset', help='数据集（.jsonl 或 .csv）')
+    parser.add_argument('--output', required=True, help='结果 JSONL（按数据集顺序）')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0')
+    parser.add_argument('--embedding-model', default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--route', choices=['auto', 'batch', 'realtime'], default='auto')
+    parser.add_argument('--deadline-hours', type=float, help='结果最晚需要在多少小时内拿到')
+    parser.add_argument('--realtime-rps', type=float, default=DEFAULT_REALTIME_RPS, help='实时调用的预估吞吐')
+    parser.add_argument('--batch-min-records', type=int, default=DEFAULT_BATCH_MIN_RECORDS)
+    parser.add_argument('--workers', type=int, default=8, help='实时调用并发数')
+    parser.add_argument('--s3-uri', help='批处理输入输出的 S3 前缀')
+    parser.add_argument('--role-arn', help='Bedrock 读写该前缀所用的服务角色')
+    parser.add_argument('--work-dir', help='分片与作业状态目录（默认 batch_runs/<数据集名>）')
+    parser.add_argument('--shard-records', type=int, default=DEFAULT_SHARD_RECORDS)
+    parser.add_argument('--poll-seconds', type=float, default=60)
+    parser.add_argument('--stand-in', action='store_true', help='本地模拟 S3、控制面和运行时')
+    args = parser.parse_args()
+
+    dataset = Path(args.dataset)
+    base_dir = dataset.parent
+    work_dir = Path(args.work_dir or Path("batch_runs") / dataset.stem)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.stand_in:
+        storage = LocalStorage(work_dir / "s3")
+        control = StandInBatchControlPlane(storage, turnaround_seconds=3)
+        runtime = StandInClient(region=args.region, latency_ms=200)
+        s3_uri = args.s3_uri or "s3://stand-in-bucket/nova-batch"
+        role_arn = args.role_arn or "arn:aws:iam::000000000000:role/stand-in"
+        poll_seconds = min(args.poll_seconds, 0.5)
+    else:
+        import boto3
+        storage = S3Storage(boto3.client("s3", region_name=args.region))
+        control = boto3.client("bedrock", region_name=args.region)
+        runtime = boto3.client("bedrock-runtime", region_name=args.region)
+        s3_uri, role_arn, poll_seconds = args.s3_uri, args.role_arn, args.poll_seconds
+
+    tracker = BatchJobTracker(control, storage, work_dir)
+    fingerprint = dataset_fingerprint(dataset)
+    if args.route != "realtime" and tracker.resumable(fingerprint):
+        route = "batch"
+        print(f"🔁 续查 {tracker.state_path} 中的 {len(tracker.state['jobs'])} 个作业")
+    else:
+        if tracker.state.get("jobs"):
+            changed = tracker.state.get("dataset") != fingerprint
+            print(f"🆕 {tracker.state_path} 中的作业{'对应的数据集已变化' if changed else '均已结束'}，开始新的运行")
+        records = fingerprint["records"]
+        route, reason = choose_route(records, args.deadline_hours, args.realtime_rps, args.batch_min_records)
+        if args.route != "auto":
+            route, reason = args.route, "命令行指定"
+        print(f"🧭 {records} 条记录 → {route}（{reason}）")
+
+        if route == "batch":
+            if not (s3_uri and role_arn):
+                print("❌ 批处理需要 --s3-uri 和 --role-arn")
+                sys.exit(1)
+            models = {row["type"] == "embedding" for row in load_dataset(dataset)}
+            if len(models) > 1:
+                print("❌ 一个批处理作业只能对应一个模型，请把嵌入记录和生成记录拆成两个数据集")
+                sys.exit(1)
+            model_id = args.embedding_model if models == {True} else args.model
+            groups = write_shards(load_dataset(dataset), base_dir, work_dir / "shards", args.shard_records)
+            tracker.submit(groups, model_id, s3_uri, role_arn, dataset.stem, fingerprint)
+
+    start = time.time()
+    if route == "batch":
+        jobs = tracker.wait(poll_seconds)
+        for job in jobs:
+            if job["status"] not in SUCCESS_STATES:
+                print(f"⚠️  作业 {job['job_name']} 状态 {job['status']}: {job['message']}")
+        results = tracker.iter_results()
+    else:
+        results = sorted(run_realtime(runtime, (args.model, args.embedding_model), load_dataset(dataset), base_dir,
+                                      args.workers), key=lambda item: item[0])
+
+    counts = write_results(dataset, results, args.output, route)
+    print(f"\n📊 {route}: 成功 {counts['ok']} | 失败 {counts['failed']}（其中输出缺失 {counts['missing']}）| "
+          f"输入 {counts['input_tokens']:,} / 输出 {counts['output_tokens']:,} token | {time.time() - start:.1f}s")
+    print(f"📁 结果: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+延迟 / 错误率的在线变点检测
+- 季节性基线：按小时（一天 24 个桶）维护 EWMA，先去掉日内周期
+- 对残差做 CUSUM，超过阈值即告警，给出劣化开始时间和幅度
+- 单点标准化残差截断在 Z_CLIP，单个异常批次（如 1 并发时的一次失败）不会直接告警
+- 纯在线计算，可在压测进程内逐批次调用，也可在分析阶段回放历史 CSV
+"""
+
+import argparse
+import csv
+import json
+import math
+from datetime import datetime
+
+Z_CLIP = 3.0
+
+
+class SeasonalBaseline:
+    """按小时的日内季节性基线"""
+
+    def __init__(self, alpha=0.05, min_samples=10):
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.buckets = {}
+        self.global_mean = None
+        self.global_count = 0
+
+    def expected(self, timestamp):
+        bucket = self.buckets.get(timestamp.hour)
+        if bucket is not None and bucket[1] >= self.min_samples:
+            return bucket[0]
+        return self.global_mean
+
+    def update(self, timestamp, value):
+        # 前 1/alpha 个样本用算术平均，避免 EWMA 被首个（噪声）样本主导
+        self.global_count += 1
+        self.global_mean = (self.global_mean or 0.0) + max(self.alpha, 1 / self.global_count) * (value - (self.global_mean or 0.0))
+        bucket = self.buckets.setdefault(timestamp.hour, [0.0, 0])
+        bucket[1] += 1
+        bucket[0] += max(self.alpha, 1 / bucket[1]) * (value - bucket[0])
+
+
+class ChangeAlert:
+    """一次检测到的劣化"""
+
+    def __init__(self, key, start, detected_at, baseline, level):
+        self.key = key
+        self.start = start
+        self.detected_at = detected_at
+        self.baseline = baseline
+        self.level = level
+
+    @property
+    def magnitude(self):
+        """相对基线的变化（新水平 - 基线）"""
+        return self.level - self.baseline
+
+    def to_dict(self):
+        return {
+            'key': list(self.key),
+            'start': self.start.isoformat(),
+            'detected_at': self.detected_at.isoformat(),
+            'baseline': round(self.baseline, 4),
+            'level': round(self.level, 4),
+            'magnitude': round(self.magnitude, 4),
+        }
+
+    def __str__(self):
+        name = ' / '.join(str(k) for k in self.key)
+        return (f"{name}: 从 {self.start:%m-%d %H:%M} 起劣化 {self.baseline:.4g} → {self.level:.4g} "
+                f"({self.magnitude:+.4g})，{self.detected_at:%m-%d %H:%M} 检出")
+
+
+class CusumDetector:
+    """单序列的单边（上升方向）CUSUM"""
+
+    def __init__(self, key, warmup=30, k=0.5, h=8.0, min_sigma=0.0, min_relative_sigma=0.0, seasonal=True):
+        self.key = key
+        self.warmup = warmup
+        self.k = k
+        self.h = h
+        self.min_sigma = min_sigma
+        self.min_relative_sigma = min_relative_sigma
+        self.baseline = SeasonalBaseline() if seasonal else None
+        self._reset()
+
+    def _reset(self):
+        # 残差的 Welford 统计，用于估计噪声水平
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.level_mean = 0.0
+        self.s = 0.0
+        self.run = []
+
+    def _sigma(self):
+        sigma = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return max(sigma, self.min_sigma, self.min_relative_sigma * abs(self.level_mean), 1e-9)
+
+    def observe(self, timestamp, value):
+        """输入一个观测，返回 ChangeAlert 或 None"""
+        if self.baseline:
+            expected = self.baseline.expected(timestamp)
+        else:
+            # 不做季节性修正时，以预热期均值作为固定期望
+            expected = self.level_mean if self.n else None
+        residual = value - expected if expected is not None else 0.0
+
+        if self.n < self.warmup:
+            self.n += 1
+            delta = residual - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (residual - self.mean)
+            self.level_mean += (value - self.level_mean) / self.n
+            if self.baseline:
+                self.baseline.update(timestamp, value)
+            return None
+
+        # 基线本身就是期望，残差不再减去预热期均值（预热期基线仍在收敛，其均值有偏）
+        z = min(residual / self._sigma(), Z_CLIP)
+        self.s = max(0.0, self.s + z - self.k)
+        if self.baseline:
+            # 基线始终更新：只用“看起来正常”的样本会让基线向下偏
+            self.baseline.update(timestamp, value)
+        if self.s == 0.0:
+            self.run = []
+            return None
+
+        self.run.append((timestamp, value, value - residual))
+        if self.s < self.h:
+            return None
+
+        # 幅度：偏移段内的实际均值 vs 同时段的基线期望
+        baseline = sum(e for _, _, e in self.run) / len(self.run)
+        level = sum(v for _, v, _ in self.run) / len(self.run)
+        alert = ChangeAlert(self.key, self.run[0][0], timestamp, baseline, level)
+        # 告警后以新水平重新学习
+        self._reset()
+        if self.baseline:
+            self.baseline = SeasonalBaseline()
+        return alert
+
+
+class ChangeMonitor:
+    """按 (区域, 层级, 并发, 指标) 管理多个检测器
+    并发级别是计划内的阶跃，单独成序列，避免切换级别时误报"""
+
+    # 每个指标的最小噪声水平，防止基线方差接近 0 时微小抖动就告警
+    # 延迟按基线的相对比例，错误率按绝对值
+    MIN_SIGMA = {'error_rate': 0.02}
+    MIN_RELATIVE_SIGMA = {'latency_ms': 0.05}
+
+    def __init__(self, warmup=30, k=0.5, h=8.0, seasonal=True):
+        self.warmup = warmup
+        self.k = k
+        self.h = h
+        self.seasonal = seasonal
+        self.detectors = {}
+        self.alerts = []
+
+    def observe(self, region, tier, concurrency, metric, timestamp, value):
+        key = (region, tier, concurrency, metric)
+        detector = self.detectors.get(key)
+        if detector is None:
+            detector = self.detectors[key] = CusumDetector(
+                key, self.warmup, self.k, self.h, self.MIN_SIGMA.get(metric, 0.0),
+                self.MIN_RELATIVE_SIGMA.get(metric, 0.0), self.seasonal)
+        alert = detector.observe(timestamp, value)
+        if alert is not None:
+            self.alerts.append(alert)
+        return alert
+
+    def observe_batch(self, region, tier, concurrency, timestamp, successful, failed, avg_latency):
+        """压测批次结果 → 延迟和错误率两个序列；返回本次产生的告警列表"""
+        alerts = []
+        if successful:
+            alerts.append(self.observe(region, tier, concurrency, 'latency_ms', timestamp, avg_latency))
+        if successful + failed:
+            alerts.append(self.observe(region, tier, concurrency, 'error_rate', timestamp,
+                                       failed / (successful + failed)))
+        return [a for a in alerts if a is not None]
+
+
+def detect_changes(df, **kwargs):
+    """分析阶段：按时间顺序回放 DataFrame，返回告警列表"""
+    monitor = ChangeMonitor(**kwargs)
+    ordered = df.sort_values('timestamp')
+    columns = ['region', 'tier', 'concurrency', 'timestamp', 'successful', 'failed', 'avg_server_latency']
+    for row in ordered[columns].itertuples(index=False):
+        monitor.observe_batch(row.region, row.tier, int(row.concurrency), row.timestamp.to_pydatetime(),
+                              int(row.successful), int(row.failed), float(row.avg_server_latency))
+    return monitor.alerts
+
+
+def main():
+    """对单个压测 CSV 回放检测"""
+    parser = argparse.ArgumentParser(description='延迟 / 错误率变点检测')
+    parser.add_argument('csv_files', nargs='+')
+    parser.add_argument('--region', default='local')
+    parser.add_argument('--h', type=float, default=8.0, help='CUSUM 告警阈值（单位：标准差）')
+    parser.add_argument('--no-seasonal', action='store_true', help='不使用按小时的季节性基线')
+    parser.add_argument('--json', action='store_true', help='以 JSON 行输出告警')
+    args = parser.parse_args()
+
+    monitor = ChangeMonitor(h=args.h, seasonal=not args.no_seasonal)
+    for path in args.csv_files:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                monitor.observe_batch(args.region, row['tier'], int(row['concurrency']),
+                                      datetime.fromisoformat(row['timestamp']), int(row['successful']),
+                                      int(row['failed']), float(row['avg_server_latency']))
+
+    for alert in monitor.alerts:
+        print(json.dumps(alert.to_dict(), ensure_ascii=False) if args.json else f"🚨 {alert}")
+    if not monitor.alerts:
+        print("✅ 未检测到劣化")
+
+
+if __name__ == "__main__":
+    main()
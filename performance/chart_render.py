@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+图表渲染辅助
+- LTTB（Largest-Triangle-Three-Buckets）时间序列降采样，预览模式下保留尖峰形状
+- 自包含的交互式 HTML 报告（内联 SVG + 少量 JS，不依赖外部资源，也不重新渲染 PNG）
+"""
+
+import html
+
+import numpy as np
+
+PREVIEW_MAX_POINTS = 300
+
+
+def lttb_downsample(x, y, n_out=PREVIEW_MAX_POINTS):
+    """返回被选中点的下标；x 需单调递增且为数值"""
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    selected = np.empty(n_out, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+    # 首尾之外的点均分到 n_out - 2 个桶
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # 下一个桶的平均点作为三角形第三个顶点（最后一个桶用末尾点）
+        next_end = min(int((i + 2) * every) + 1, n)
+        if end < next_end:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def _svg_timeline(series, width=960, height=360, pad=48):
+    """series: [(name, color, [epoch_seconds...], [latency...]), ...]"""
+    xs = [v for _, _, x, _ in series for v in x]
+    ys = [v for _, _, _, y in series for v in y]
+    if not xs:
+        return '<p>No data</p>'
+    x_min, x_max = min(xs), max(xs)
+    y_min, y_max = 0, max(ys) * 1.1 or 1
+    x_span = (x_max - x_min) or 1
+
+    def sx(v):
+        return pad + (v - x_min) / x_span * (width - 2 * pad)
+
+    def sy(v):
+        return height - pad - (v - y_min) / (y_max - y_min) * (height - 2 * pad)
+
+    parts = [f'<svg viewBox="0 0 {width} {height}" width="100%" role="img">',
+             f'<line x1="{pad}" y1="{height - pad}" x2="{width - pad}" y2="{height - pad}" stroke="#999"/>',
+             f'<line x1="{pad}" y1="{pad}" x2="{pad}" y2="{height - pad}" stroke="#999"/>',
+             f'<text x="{pad}" y="{pad - 10}" font-size="12">{y_max:.0f} ms</text>']
+    for i, (name, color, x, y) in enumerate(series):
+        points = ' '.join(f'{sx(a):.1f},{sy(b):.1f}' for a, b in zip(x, y))
+        parts.append(f'<g class="series" data-series="{i}">')
+        parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="2" points="{points}"/>')
+        for a, b in zip(x, y):
+            parts.append(f'<circle cx="{sx(a):.1f}" cy="{sy(b):.1f}" r="3" fill="{color}" data-tip="{html.escape(name)}: {b:.0f} ms"/>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def write_html_report(df, path, regions, max_points=PREVIEW_MAX_POINTS):
+    """生成交互式 HTML：可切换区域的延迟时间线 + 区域 × 层级汇总表"""
+    series = []
+    for region_code, config in regions.items():
+        region_data = df[(df['region'] == region_code) & (df['tier'] == 'default')].sort_values('timestamp')
+        if len(region_data) == 0:
+            continue
+        x = region_data['timestamp'].to_numpy().astype('datetime64[s]').astype('int64')
+        y = region_data['avg_server_latency'].to_numpy()
+        keep = lttb_downsample(x, y, max_points)
+        series.append((config['name'], config['color'], x[keep].tolist(), y[keep].tolist()))
+
+    table = df.groupby(['region_name', 'tier']).agg(
+        latency=('avg_server_latency', 'mean'),
+        successful=('successful', 'sum'),
+        failed=('failed', 'sum'),
+    ).reset_index()
+    rows = '\n'.join(
+        f'<tr><td>{html.escape(r.region_name)}</td><td>{r.tier}</td><td>{r.latency:.0f}</td>'
+        f'<td>{r.successful / max(1, r.successful + r.failed) * 100:.3f}%</td></tr>'
+        for r in table.itertuples())
+
+    legend = '\n'.join(
+        f'<label><input type="checkbox" checked data-series="{i}"> '
+        f'<span style="color:{color}">■</span> {html.escape(name)}</label>'
+        for i, (name, color, _, _) in enumerate(series))
+
+    document = f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Multi-Region Nova Performance</title>
+<style>
+body {{ font-family: "DejaVu Sans", sans-serif; margin: 24px; }}
+table {{ border-collapse: collapse; }} td, th {{ border: 1px solid #ddd; padding: 4px 10px; text-align: right; }}
+#tip {{ position: fixed; background: #333; color: #fff; padding: 2px 6px; font-size: 12px; display: none; }}
+label {{ margin-right: 12px; }}
+</style></head><body>
+<h1>Latency Timeline (Default Tier)</h1>
+<div>{legend}</div>
+{_svg_timeline(series)}
+<h1>Region × Tier Summary</h1>
+<table><tr><th>Region</th><th>Tier</th><th>Avg Latency (ms)</th><th>Success Rate</th></tr>
+{rows}
+</table>
+<div id="tip"></div>
+<script>
+const tip = document.getElementById('tip');
+document.querySelectorAll('circle[data-tip]').forEach(c => {{
+  c.addEventListener('mousemove', e => {{ tip.textContent = c.dataset.tip; tip.style.display = 'block';
+    tip.style.left = (e.clientX + 12) + 'px'; tip.style.top = (e.clientY + 12) + 'px'; }});
+  c.addEventListener('mouseleave', () => tip.style.display = 'none');
+}});
+document.querySelectorAll('input[data-series]').forEach(box => box.addEventListener('change', () => {{
+  document.querySelector('g[data-series="' + box.dataset.series + '"]').style.display = box.checked ? '' : 'none';
+}}));
+</script>
+</body></html>
+'''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+相同请求合并（singleflight）
+- 包装 bedrock-runtime 客户端，接口不变（invoke_model / invoke_model_with_response_stream）
+- 并发中的相同请求（规范化 body + 模型 + 层级 的哈希）只发出一次调用，结果分发给所有调用方
+- 流式响应通过多播缓冲区分发，晚加入的调用方从头回放已收到的事件
+- 统计实际发出的调用数与被合并的调用数
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def request_key(params):
+    """规范化请求体后计算哈希；非 JSON（含非 UTF-8）的 body 按原始字节处理"""
+    body = params.get("body", b"")
+    canonical = body if isinstance(body, (bytes, bytearray)) else str(body).encode("utf-8")
+    try:
+        # json.loads 可直接解析 UTF-8 / UTF-16 / UTF-32 字节；解码失败同样是 ValueError
+        canonical = json.dumps(json.loads(canonical), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256()
+    digest.update(params.get("modelId", "").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(params.get("serviceTier", "default").encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical)
+    return digest.hexdigest()
+
+
+class _Flight:
+    """一次在途调用"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class MulticastStream:
+    """流式事件多播缓冲区：一个生产者，多个可随时加入的消费者"""
+
+    def __init__(self, upstream):
+        self._upstream = upstream
+        self._events = []
+        self._finished = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._started = False
+
+    def _pump(self):
+        try:
+            for event in self._upstream:
+                with self._cond:
+                    self._events.append(event)
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def subscribe(self):
+        """从第一个事件开始迭代，直到上游结束"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._events) and not self._finished:
+                    self._cond.wait()
+                if index < len(self._events):
+                    event = self._events[index]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            index += 1
+            yield event
+
+
+class CoalescingClient:
+    """对相同的并发请求做 singleflight 合并"""
+
+    def __init__(self, client):
+        self._client = client
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.stream_calls = 0
+        self.stream_coalesced = 0
+
+    def __getattr__(self, name):
+        # 其余方法（converse、start_async_invoke 等）直接透传
+        return getattr(self._client, name)
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+            return flight, True
+
+    def _land(self, key, flight):
+        with self._lock:
+            del self._flights[key]
+        flight.done.set()
+
+    def invoke_model(self, **params):
+        key = "invoke:" + request_key(params)
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                response = self._client.invoke_model(**params)
+                # 响应体只能读一次，先读出再分发给每个调用方
+                flight.result = (dict(response), response["body"].read())
+            except Exception as e:
+                flight.error = e
+            with self._lock:
+                self.calls += 1
+            self._land(key, flight)
+        else:
+            flight.done.wait()
+            with self._lock:
+                self.coalesced += 1
+
+        if flight.error is not None:
+            raise flight.error
+        response, payload = flight.result
+        response = dict(response)
+        response["body"] = io.BytesIO(payload)
+        return response
+
+    def invoke_model_with_response_stream(self, **params):
+        key = "stream:" + request_key(params)
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                response = self._client.invoke_model_with_response_stream(**params)
+                multicast = MulticastStream(response["body"])
+                multicast.start()
+                flight.result = (dict(response), multicast)
+            except Exception as e:
+                flight.error = e
+            with self._lock:
+                self.stream_calls += 1
+            # 流建立后即可让后来者加入；流结束时再移除，保证晚到的请求仍能合并
+            flight.done.set()
+            if flight.error is not None:
+                self._land(key, flight)
+            else:
+                threading.Thread(target=self._land_after_stream, args=(key, flight), daemon=True).start()
+        else:
+            flight.done.wait()
+            with self._lock:
+                self.stream_coalesced += 1
+
+        if flight.error is not None:
+            raise flight.error
+        response, multicast = flight.result
+        response = dict(response)
+        response["body"] = multicast.subscribe()
+        return response
+
+    def _land_after_stream(self, key, flight):
+        for _ in flight.result[1].subscribe():
+            pass
+        self._land(key, flight)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "stream_calls": self.stream_calls,
+                "stream_coalesced": self.stream_coalesced,
+            }
+
+
+def main():
+    """本地替身演示：同一张图片 + 同一问题的并发请求只发出一次调用"""
+    from stand_in_client import StandInClient
+
+    parser = argparse.ArgumentParser(description="相同请求合并（本地替身演示）")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    upstream = StandInClient(latency_ms=args.latency_ms, jitter_ms=0, output_tokens=20)
+    client = CoalescingClient(upstream)
+    body = json.dumps({
+        "schemaVersion": "messages-v1",
+        "messages": [{"role": "user", "content": [{"text": "Provide art titles for this image."}]}],
+        "inferenceConfig": {"maxTokens": 300},
+    })
+
+    def unary(_):
+        response = client.invoke_model(modelId="us.amazon.nova-lite-v1:0", body=body)
+        return json.loads(response["body"].read())["usage"]["outputTokens"]
+
+    def streaming(_):
+        response = client.invoke_model_with_response_stream(modelId="us.amazon.nova-lite-v1:0", body=body)
+        return sum(1 for event in response["body"] if b"contentBlockDelta" in event["chunk"]["bytes"])
+
+    for name, fn in [("invoke_model", unary), ("invoke_model_with_response_stream", streaming)]:
+        calls_before = upstream.calls
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(fn, range(args.concurrency)))
+        elapsed = time.time() - start_time
+        print(f"{name:36} 调用方 {len(results)} | 上游调用 {upstream.calls - calls_before} | "
+              f"结果一致 {len(set(results)) == 1} | 耗时 {elapsed:.2f}s")
+
+    print(f"\n统计: {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+压测客户端主机的资源采样
+- 后台线程按固定间隔读取 /proc：每核 CPU（含 iowait / steal）、运行队列、上下文切换、本进程 RSS / 线程数 / fd 数、
+  可用内存与换页、TCP 连接状态与本地端口占用、网卡收发字节
+- 每个采样一行追加到 host_samples_*.csv（与批次 / 逐请求记录使用同一时间轴），内存中只保留最近一段供实时判断
+- host_pressure(sample) 判断主机本身是否成为瓶颈（CPU 打满、换页、fd / 端口将耗尽等），
+  压测时按批次窗口提示，分析时用于区分延迟异常来自客户端主机还是 Bedrock
+- 非 Linux（没有 /proc）时采样器不启动
+
+用法（单独运行，打印采样）:
+    python host_sampler.py --interval 2 --count 10
+"""
+
+import argparse
+import csv
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+DEFAULT_INTERVAL_SECONDS = 5
+RECENT_SAMPLES = 720  # 5 秒间隔约 1 小时
+
+# /proc/net/tcp 的状态码
+TCP_STATES = {"01": "established", "02": "syn_sent", "06": "time_wait", "08": "close_wait"}
+
+# 主机瓶颈判定阈值
+HOST_LIMITS = {
+    "cpu_max_core_pct": 95,     # 某个核打满（单进程 GIL 受限时最先出现）
+    "cpu_avg_pct": 85,
+    "cpu_steal_pct": 10,        # 虚拟机被宿主抢占
+    "cpu_iowait_pct": 20,
+    "run_queue_per_core": 2,
+    "swap_pages_per_s": 10,
+    "mem_available_mb": 500,
+    "fd_used_ratio": 0.9,
+    "local_ports_used_ratio": 0.8,
+    "syn_sent": 50,             # 大量连接卡在建连
+}
+
+SAMPLE_FIELDS = ["timestamp", "cpu_avg_pct", "cpu_max_core_pct", "cpu_iowait_pct", "cpu_steal_pct", "cores",
+                 "run_queue", "load1", "ctx_switches_per_s", "proc_cpu_pct", "proc_voluntary_cs_per_s",
+                 "proc_involuntary_cs_per_s", "rss_mb", "threads", "fds", "fd_limit", "mem_available_mb",
+                 "swap_used_mb", "swap_pages_per_s", "tcp_established", "tcp_syn_sent", "tcp_time_wait",
+                 "tcp_close_wait", "local_ports_used", "local_port_range", "net_rx_bytes_per_s",
+                 "net_tx_bytes_per_s", "pressure"]
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _fields(text):
+    """'Key:   value unit' 行 → {Key: 第一个数值}"""
+    values = {}
+    for line in text.splitlines():
+        key, _, rest = line.partition(":")
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            values[key.strip()] = int(parts[0])
+    return values
+
+
+def read_counters():
+    """一次读取所有累计计数器和瞬时值（原始值，速率由相邻两次相减得到）"""
+    counters = {"time": time.time(), "cores": {}}
+    for line in _read("/proc/stat").splitlines():
+        parts = line.split()
+        if parts[0].startswith("cpu") and parts[0] != "cpu":
+            # user nice system idle iowait irq softirq steal
+            values = [int(v) for v in parts[1:9]]
+            counters["cores"][parts[0]] = values
+        elif parts[0] == "ctxt":
+            counters["ctxt"] = int(parts[1])
+        elif parts[0] == "procs_running":
+            counters["run_queue"] = int(parts[1])
+    counters["load1"] = float(_read("/proc/loadavg").split()[0])
+
+    status = _fields(_read("/proc/self/status"))
+    counters["rss_kb"] = status.get("VmRSS", 0)
+    counters["threads"] = status.get("Threads", 0)
+    counters["voluntary_cs"] = status.get("voluntary_ctxt_switches", 0)
+    counters["involuntary_cs"] = status.get("nonvoluntary_ctxt_switches", 0)
+    # /proc/self/stat 第 14、15 项为 utime / stime（时钟滴答）；comm 可能含空格，从最后一个 ')' 之后切分
+    stat = _read("/proc/self/stat").rsplit(")", 1)[1].split()
+    counters["proc_ticks"] = int(stat[11]) + int(stat[12])
+    counters["fds"] = len(os.listdir("/proc/self/fd"))
+
+    meminfo = _fields(_read("/proc/meminfo"))
+    counters["mem_available_kb"] = meminfo.get("MemAvailable", 0)
+    counters["swap_used_kb"] = meminfo.get("SwapTotal", 0) - meminfo.get("SwapFree", 0)
+    vmstat = dict(line.split() for line in _read("/proc/vmstat").splitlines())
+    counters["swap_pages"] = int(vmstat.get("pswpin", 0)) + int(vmstat.get("pswpout", 0))
+
+    states = dict.fromkeys(TCP_STATES.values(), 0)
+    local_ports = set()
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            lines = _read(path).splitlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            parts = line.split()
+            state = TCP_STATES.get(parts[3])
+            if state:
+                states[state] += 1
+            # 主动发起的连接（非监听）占用本地临时端口
+            if parts[3] != "0A":
+                local_ports.add(parts[1].rsplit(":", 1)[1])
+    counters["tcp"] = states
+    counters["local_ports_used"] = len(local_ports)
+
+    rx = tx = 0
+    for line in _read("/proc/net/dev").splitlines()[2:]:
+        name, _, data = line.partition(":")
+        if name.strip() == "lo":
+            continue
+        values = data.split()
+        rx += int(values[0])
+        tx += int(values[8])
+    counters["net_rx"], counters["net_tx"] = rx, tx
+    return counters
+
+
+def _port_range():
+    try:
+        low, high = _read("/proc/sys/net/ipv4/ip_local_port_range").split()
+        return int(high) - int(low) + 1
+    except (OSError, ValueError):
+        return None
+
+
+def _fd_limit():
+    try:
+        import resource
+        return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError):
+        return None
+
+
+def make_sample(previous, current, fd_limit=None, port_range=None):
+    """相邻两次计数器 → 一条采样（速率、百分比）"""
+    elapsed = max(1e-6, current["time"] - previous["time"])
+    core_busy = []
+    iowait = steal = total_all = busy_all = 0
+    for name, values in current["cores"].items():
+        before = previous["cores"].get(name)
+        if not before:
+            continue
+        delta = [a - b for a, b in zip(values, before)]
+        total = sum(delta) or 1
+        idle = delta[3] + delta[4]
+        core_busy.append(100 * (total - idle) / total)
+        total_all += total
+        busy_all += total - idle
+        iowait += delta[4]
+        steal += delta[7]
+    total_all = total_all or 1
+    ticks_per_s = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    sample = {
+        "timestamp": round(current["time"], 3),
+        "cpu_avg_pct": round(100 * busy_all / total_all, 1),
+        "cpu_max_core_pct": round(max(core_busy), 1) if core_busy else 0,
+        "cpu_iowait_pct": round(100 * iowait / total_all, 1),
+        "cpu_steal_pct": round(100 * steal / total_all, 1),
+        "cores": len(current["cores"]),
+        "run_queue": current["run_queue"],
+        "load1": current["load1"],
+        "ctx_switches_per_s": round((current["ctxt"] - previous["ctxt"]) / elapsed),
+        "proc_cpu_pct": round(100 * (current["proc_ticks"] - previous["proc_ticks"]) / ticks_per_s / elapsed, 1),
+        "proc_voluntary_cs_per_s": round((current["voluntary_cs"] - previous["voluntary_cs"]) / elapsed),
+        "proc_involuntary_cs_per_s": round((current["involuntary_cs"] - previous["involuntary_cs"]) / elapsed),
+        "rss_mb": round(current["rss_kb"] / 1024, 1),
+        "threads": current["threads"],
+        "fds": current["fds"],
+        "fd_limit": fd_limit,
+        "mem_available_mb": round(current["mem_available_kb"] / 1024),
+        "swap_used_mb": round(current["swap_used_kb"] / 1024),
+        "swap_pages_per_s": round((current["swap_pages"] - previous["swap_pages"]) / elapsed, 1),
+        "tcp_established": current["tcp"]["established"],
+        "tcp_syn_sent": current["tcp"]["syn_sent"],
+        "tcp_time_wait": current["tcp"]["time_wait"],
+        "tcp_close_wait": current["tcp"]["close_wait"],
+        "local_ports_used": current["local_ports_used"],
+        "local_port_range": port_range,
+        "net_rx_bytes_per_s": round((current["net_rx"] - previous["net_rx"]) / elapsed),
+        "net_tx_bytes_per_s": round((current["net_tx"] - previous["net_tx"]) / elapsed),
+    }
+    sample["pressure"] = ";".join(host_pressure(sample))
+    return sample
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    return float(value)
+
+
+def host_pressure(sample, limits=HOST_LIMITS):
+    """采样 → 主机瓶颈原因列表（空列表表示主机正常）；sample 的值可以是数字或 CSV 读出的字符串"""
+    get = lambda key: _number(sample.get(key))
+    reasons = []
+    if (get("cpu_max_core_pct") or 0) >= limits["cpu_max_core_pct"] or (get("cpu_avg_pct") or 0) >= limits["cpu_avg_pct"]:
+        reasons.append("cpu")
+    if (get("cpu_steal_pct") or 0) >= limits["cpu_steal_pct"]:
+        reasons.append("steal")
+    if (get("cpu_iowait_pct") or 0) >= limits["cpu_iowait_pct"]:
+        reasons.append("iowait")
+    if (get("run_queue") or 0) > limits["run_queue_per_core"] * (get("cores") or 1):
+        reasons.append("run_queue")
+    if (get("swap_pages_per_s") or 0) >= limits["swap_pages_per_s"]:
+        reasons.append("swap")
+    if get("mem_available_mb") is not None and get("mem_available_mb") < limits["mem_available_mb"]:
+        reasons.append("memory")
+    if get("fd_limit") and (get("fds") or 0) >= limits["fd_used_ratio"] * get("fd_limit"):
+        reasons.append("fds")
+    if get("local_port_range") and (get("local_ports_used") or 0) >= limits["local_ports_used_ratio"] * get("local_port_range"):
+        reasons.append("ports")
+    if (get("tcp_syn_sent") or 0) >= limits["syn_sent"]:
+        reasons.append("syn_sent")
+    return reasons
+
+
+def window_pressure(samples, start, end, interval=DEFAULT_INTERVAL_SECONDS):
+    """[start, end] 时间窗口（向后多取一个采样间隔，速率采样描述的是它之前的一段时间）内出现过的瓶颈原因"""
+    reasons = []
+    for sample in samples:
+        if start <= float(sample["timestamp"]) <= end + interval:
+            for reason in (sample["pressure"].split(";") if sample["pressure"] else []):
+                if reason not in reasons:
+                    reasons.append(reason)
+    return reasons
+
+
+def load_samples(paths):
+    """读取一个或多个 host_samples CSV，按时间排序"""
+    samples = []
+    for path in paths:
+        with open(path, newline='') as f:
+            samples.extend(csv.DictReader(f))
+    samples.sort(key=lambda s: float(s["timestamp"]))
+    return samples
+
+
+class HostSampler:
+    """后台采样线程；path 为 None 时只保留内存中的最近采样"""
+
+    def __init__(self, path=None, interval=DEFAULT_INTERVAL_SECONDS, recent=RECENT_SAMPLES):
+        self.path = Path(path) if path else None
+        self.interval = interval
+        self.recent = deque(maxlen=recent)
+        self.available = Path("/proc/stat").exists()
+        self._fd_limit = _fd_limit()
+        self._port_range = _port_range()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if not self.available:
+            return False
+        self._thread = threading.Thread(target=self._run, name="host-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        previous = read_counters()
+        while not self._stop.wait(self.interval):
+            try:
+                current = read_counters()
+            except (OSError, ValueError, IndexError):
+                continue
+            sample = make_sample(previous, current, self._fd_limit, self._port_range)
+            previous = current
+            with self._lock:
+                self.recent.append(sample)
+            if self.path:
+                self._write(sample)
+
+    def _write(self, sample):
+        new_file = not self.path.exists()
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SAMPLE_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(sample)
+
+    def latest(self):
+        with self._lock:
+            return self.recent[-1] if self.recent else None
+
+    def pressure_between(self, start, end):
+        """批次时间窗口内的主机瓶颈原因（实时使用）"""
+        with self._lock:
+            samples = list(self.recent)
+        return window_pressure(samples, start, end, self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='客户端主机资源采样')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_SECONDS)
+    parser.add_argument('--count', type=int, default=10, help='采样次数')
+    parser.add_argument('--output', help='追加写入的 CSV')
+    args = parser.parse_args()
+
+    sampler = HostSampler(args.output, args.interval)
+    if not sampler.start():
+        raise SystemExit("❌ 没有 /proc，只支持 Linux")
+    try:
+        for _ in range(args.count):
+            time.sleep(args.interval)
+            s = sampler.latest()
+            if s:
+                print(f"CPU {s['cpu_avg_pct']:5.1f}% (max core {s['cpu_max_core_pct']:5.1f}%) | "
+                      f"RSS {s['rss_mb']:7.1f}MB | fd {s['fds']} | TCP est {s['tcp_established']} "
+                      f"tw {s['tcp_time_wait']} | rx {s['net_rx_bytes_per_s'] / 1024:8.1f}KB/s | "
+                      f"{s['pressure'] or 'ok'}")
+    finally:
+        sampler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+图片理解批处理：一次请求打包多张图片、多个问题
+- 同一条消息内按 "Image N:" 依次放入图片，系统提示词和问题说明每批只发送一次
+- 要求模型只输出 JSON 数组（每张图片一个对象），解析后拆回逐图结果并校验字段
+- 缺失或校验失败的图片退回单图请求重试
+- 批大小按延迟目标自适应（加性增、乘性减），并受模型单请求图片数和请求体大小限制
+- main() 对同一批图片比较 单图请求（与 nova_image_understanding.py 相同的纯文本问题）与 批处理 的吞吐
+
+用法:
+    python image_batching.py ../images/*.png --count 200 --stand-in --compare
+    python image_batching.py photos/ --question title="Give a short title." --target-latency-ms 8000
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from image_preprocess import ImagePreprocessor, image_format
+from tier_scheduler import percentile
+
+# Nova 单次请求的图片数与内联请求体上限
+MAX_IMAGES_PER_REQUEST = 20
+MAX_REQUEST_BYTES = 25 * 1024 * 1024
+
+DEFAULT_QUESTIONS = {
+    "title": "Give a short title for the image.",
+    "objects": "List the main objects, comma-separated.",
+    "setting": "Is the scene indoor or outdoor?",
+}
+SYSTEM_PROMPT = "You are an image labeling assistant. Answer concisely and only with the requested JSON."
+OUTPUT_TOKENS_PER_IMAGE = 150
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+
+class AdaptiveBatchSize:
+    """AIMD：延迟低于目标时批大小 +1，超过目标或解析失败时乘以 decrease"""
+
+    def __init__(self, target_latency_ms, initial=4, minimum=1, maximum=MAX_IMAGES_PER_REQUEST, decrease=0.7):
+        self.target_latency_ms = target_latency_ms
+        self.size = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return int(self.size)
+
+    def update(self, latency_ms, ok):
+        with self._lock:
+            if not ok or latency_ms > self.target_latency_ms:
+                self.size = max(self.minimum, self.size * self.decrease)
+            elif latency_ms < self.target_latency_ms * 0.8:
+                self.size = min(self.maximum, self.size + 1)
+
+
+def build_request(images, questions, max_tokens_per_image=OUTPUT_TOKENS_PER_IMAGE):
+    """images: [(image_id, base64, format)] → invoke_model 请求体"""
+    content = []
+    for index, (_, image_b64, fmt) in enumerate(images, 1):
+        content.append({"text": f"Image {index}:"})
+        content.append({"image": {"format": fmt, "source": {"bytes": image_b64}}})
+    example = ", ".join(f'"{qid}": "..."' for qid in questions)
+    content.append({"text": (
+        f"Answer the following questions for each of the {len(images)} images above.\n"
+        "Questions:\n" + "\n".join(f"- {qid}: {text}" for qid, text in questions.items()) + "\n"
+        f"Reply with only a JSON array containing one object per image, in order: "
+        f'[{{"image": 1, {example}}}, ...]'
+    )})
+    return {
+        "schemaVersion": "messages-v1",
+        "system": [{"text": SYSTEM_PROMPT}],
+        "messages": [{"role": "user", "content": content}],
+        "inferenceConfig": {"maxTokens": max_tokens_per_image * len(images), "temperature": 0},
+    }
+
+
+def build_plain_request(image, questions, max_tokens=OUTPUT_TOKENS_PER_IMAGE):
+    """单图请求的常规写法（同 nova_image_understanding.py）：图片 + 纯文本问题，不要求 JSON，作为对比基准"""
+    _, image_b64, fmt = image
+    return {
+        "schemaVersion": "messages-v1",
+        "messages": [{"role": "user", "content": [
+            {"image": {"format": fmt, "source": {"bytes": image_b64}}},
+            {"text": " ".join(questions.values())},
+        ]}],
+        "inferenceConfig": {"maxTokens": max_tokens, "temperature": 0},
+    }
+
+
+def parse_response(text, count, questions):
+    """模型输出 → {序号(1 起): answers}；只返回通过校验的图片"""
+    match = re.search(r"\[.*\]", text, re.S)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("image")
+        if not isinstance(index, int) or not 1 <= index <= count or index in parsed:
+            continue
+        answers = {qid: item.get(qid) for qid in questions}
+        if all(value not in (None, "", [], {}) for value in answers.values()):
+            parsed[index] = answers
+    return parsed
+
+
+class BatchLabeler:
+    """多线程批量标注；plain=True 为单图模式：每图一个常规请求，回复为自由文本，非空即视为有效"""
+
+    def __init__(self, client, model_id, questions=None, target_latency_ms=10000, initial_batch=4,
+                 max_batch=MAX_IMAGES_PER_REQUEST, adaptive=True, workers=4, plain=False):
+        self.client = client
+        self.model_id = model_id
+        self.questions = questions or DEFAULT_QUESTIONS
+        self.plain = plain
+        if plain:
+            initial_batch, max_batch, adaptive = 1, 1, False
+        self.batch_size = AdaptiveBatchSize(target_latency_ms, initial_batch, maximum=max_batch)
+        self.adaptive = adaptive
+        self.workers = workers
+        self.results = {}
+        self.latencies = []
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.fallbacks = 0
+        self.batch_sizes = []
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def _take(self, queue, retries):
+        """取下一批：重试队列中的图片单独发送，其余按当前批大小和请求体上限打包"""
+        with self._lock:
+            if retries:
+                return [retries.popleft()], True
+            batch, size = [], 0
+            while queue and len(batch) < self.batch_size.current:
+                item_bytes = len(queue[0][1])
+                if batch and size + item_bytes > MAX_REQUEST_BYTES:
+                    break
+                batch.append(queue.popleft())
+                size += item_bytes
+            return batch, False
+
+    def _invoke(self, batch):
+        body = build_plain_request(batch[0], self.questions) if self.plain else build_request(batch, self.questions)
+        start = time.time()
+        try:
+            response = self.client.invoke_model(modelId=self.model_id, body=json.dumps(body))
+            model_response = json.loads(response["body"].read())
+            text = model_response["output"]["message"]["content"][0]["text"]
+            usage = model_response.get("usage", {})
+            error = None
+        except Exception as e:
+            text, usage, error = "", {}, str(e)[:200]
+        return text, usage, error, int((time.time() - start) * 1000)
+
+    def _worker(self, queue, retries):
+        while True:
+            batch, is_retry = self._take(queue, retries)
+            if not batch:
+                return
+            text, usage, error, latency = self._invoke(batch)
+            if self.plain:
+                parsed = {1: {"text": text.strip()}} if text.strip() else {}
+            else:
+                parsed = parse_response(text, len(batch), self.questions)
+            if self.adaptive and not is_retry:
+                self.batch_size.update(latency, len(parsed) == len(batch))
+            with self._lock:
+                self.requests += 1
+                self.latencies.append(latency)
+                self.batch_sizes.append(len(batch))
+                self.input_tokens += usage.get("inputTokens", 0)
+                self.output_tokens += usage.get("outputTokens", 0)
+                for index, (image_id, _, _) in enumerate(batch, 1):
+                    if index in parsed:
+                        self.results[image_id] = {"valid": True, "answers": parsed[index], "batch_size": len(batch)}
+                    elif len(batch) > 1:
+                        # 批内失败的图片单独重试一次
+                        self.fallbacks += 1
+                        retries.append(batch[index - 1])
+                    else:
+                        self.results[image_id] = {"valid": False, "error": error or "unparseable response",
+                                                  "batch_size": 1}
+
+    def label(self, images):
+        """images: [(image_id, base64, format)] → {image_id: result}"""
+        queue = deque(images)
+        retries = deque()
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # worker 在队列暂时为空时退出，重试产生的新任务由循环再次拉起
+            while queue or retries:
+                for future in [pool.submit(self._worker, queue, retries) for _ in range(self.workers)]:
+                    future.result()
+        self.duration = time.time() - start
+        return self.results
+
+    def report(self):
+        images = len(self.results)
+        return {
+            "images": images,
+            "valid": sum(r["valid"] for r in self.results.values()),
+            "requests": self.requests,
+            "fallbacks": self.fallbacks,
+            "mean_batch_size": round(sum(self.batch_sizes) / len(self.batch_sizes), 2) if self.batch_sizes else 0,
+            "final_batch_size": self.batch_size.current,
+            "images_per_sec": round(images / self.duration, 3) if self.duration else 0,
+            "p50_latency_ms": percentile(self.latencies, 50),
+            "p95_latency_ms": percentile(self.latencies, 95),
+            "input_tokens_per_image": round(self.input_tokens / images, 1) if images else 0,
+            "output_tokens_per_image": round(self.output_tokens / images, 1) if images else 0,
+        }
+
+
+def stand_in_responder(drop_rate=0.02, seed=None):
+    """替身端点的结构化回复：按请求中的图片和问题生成 JSON，偶尔漏掉一张图片以覆盖回退路径；单图常规请求回复纯文本"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def respond(body):
+        content = body["messages"][0]["content"]
+        if "system" not in body:
+            question = content[-1]["text"]
+            return {"text": f"stand-in answer: {question[:40]}", "input_tokens": 1300 + len(question) // 4,
+                    "output_tokens": 40}
+        count = sum("image" in block for block in content)
+        instructions = content[-1]["text"]
+        question_ids = re.findall(r"^- (\w+):", instructions, re.M)
+        with lock:
+            keep = [i for i in range(1, count + 1) if count == 1 or rng.random() >= drop_rate]
+        items = [{"image": i, **{qid: f"stand-in {qid} {i}" for qid in question_ids}} for i in keep]
+        text_tokens = (len(instructions) + len(body["system"][0]["text"])) // 4
+        return {"text": json.dumps(items), "input_tokens": 1300 * count + text_tokens,
+                "output_tokens": 40 * len(items)}
+
+    return respond
+
+
+def load_images(paths, count=None, preprocess=None):
+    """文件或目录 → [(image_id, base64, format)]；count 大于图片数时循环复用"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS))
+        else:
+            files.append(path)
+    if not files:
+        raise ValueError(f"没有找到图片（支持 {', '.join(IMAGE_EXTENSIONS)}）: {', '.join(map(str, paths))}")
+    raw = [f.read_bytes() for f in files]
+    if preprocess:
+        processed = ImagePreprocessor(format=preprocess).process_many(raw)
+        encoded = [(image.base64, image.format) for image in processed]
+    else:
+        encoded = [(base64.b64encode(data).decode("utf-8"), image_format(data)) for data in raw]
+    count = count or len(files)
+    return [(f"{files[i % len(files)].name}#{i}", *encoded[i % len(files)]) for i in range(count)]
+
+
+def print_report(label, report):
+    print(f"  {label:10} {report['images']:>6} 图 {report['requests']:>6} 请求 "
+          f"批大小 {report['mean_batch_size']:>5} (末 {report['final_batch_size']:>2}) | "
+          f"{report['images_per_sec']:>7.2f} 图/s | p50 {report['p50_latency_ms']}ms p95 {report['p95_latency_ms']}ms | "
+          f"输入 {report['input_tokens_per_image']} / 输出 {report['output_tokens_per_image']} token/图 | "
+          f"校验通过 {report['valid']}/{report['images']} (回退 {report['fallbacks']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片理解批处理标注')
+    parser.add_argument('images', nargs='+', help='图片文件或目录')
+    parser.add_argument('--count', type=int, help='标注的图片总数（不足时循环复用，便于压测）')
+    parser.add_argument('--question', action='append', metavar='ID=TEXT', help='问题，可重复；默认 title/objects/setting')
+    parser.add_argument('--target-latency-ms', type=int, default=10000, help='批处理延迟目标 (默认: 10000)')
+    parser.add_argument('--max-batch', type=int, default=MAX_IMAGES_PER_REQUEST)
+    parser.add_argument('--workers', type=int, default=4, help='并发请求数 (默认: 4)')
+    parser.add_argument('--preprocess', nargs='?', const='jpeg', choices=['jpeg', 'webp'], help='上传前缩放并重新编码')
+    parser.add_argument('--compare', action='store_true', help='同时运行单图请求模式作对比')
+    parser.add_argument('--region', default='us-west-2')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0')
+    parser.add_argument('--stand-in', action='store_true', help='使用本地替身端点')
+    parser.add_argument('--output', help='逐图结果 JSON')
+    args = parser.parse_args()
+
+    questions = dict(q.split("=", 1) for q in args.question) if args.question else DEFAULT_QUESTIONS
+    try:
+        images = load_images(args.images, args.count, args.preprocess)
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    if args.stand_in:
+        from stand_in_client import StandInClient
+        client = StandInClient(region=args.region, latency_ms=600, responder=stand_in_responder(seed=0))
+    else:
+        import boto3
+        client = boto3.client("bedrock-runtime", region_name=args.region)
+
+    print(f"🖼️  {len(images)} 张图片，{len(questions)} 个问题: {', '.join(questions)}")
+    runs = []
+    if args.compare:
+        runs.append(("single", BatchLabeler(client, args.model, questions, workers=args.workers, plain=True)))
+    runs.append(("batched", BatchLabeler(client, args.model, questions, args.target_latency_ms,
+                                         max_batch=args.max_batch, workers=args.workers)))
+
+    reports = {}
+    for label, labeler in runs:
+        labeler.label(images)
+        reports[label] = labeler.report()
+        print_report(label, reports[label])
+    if args.compare:
+        speedup = reports["batched"]["images_per_sec"] / max(reports["single"]["images_per_sec"], 1e-9)
+        print(f"\n📊 批处理吞吐 {speedup:.2f}× 单图请求，每图输入 token {reports['batched']['input_tokens_per_image']} "
+              f"vs 单图 {reports['single']['input_tokens_per_image']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"reports": reports, "results": runs[-1][1].results}, f, indent=2, ensure_ascii=False)
+        print(f"📁 结果: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
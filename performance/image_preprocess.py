@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+图片上传前预处理
+- 按模型有效分辨率等比缩小（不放大），PNG 重新编码为 JPEG / WebP，去掉 EXIF 等元数据
+- 先按 EXIF 方向旋正再去元数据，避免图片“躺倒”
+- 结果按内容哈希（原图 + 参数）缓存，可选落盘；批量处理时缓存未命中的图片交给进程池
+- 统计节省的字节数和估算的输入 token；main() 对真实或替身端点做 原图 vs 预处理 的对比
+- 依赖 Pillow（pip install pillow）；未安装时原样返回并提示
+
+用法（替身端点上的冒烟运行）:
+    python image_preprocess.py test_image.png --requests 3 --stand-in
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# 长边上限：超过这个分辨率模型侧也会缩小，多传的像素只增加上传时间和 token
+DEFAULT_MAX_EDGE = 1024
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_QUALITY = 85
+
+# 图片 token 的粗略估计：Nova 约每 560 像素 1 个 token（1000×729 的测试图约 1300 token）
+IMAGE_PIXELS_PER_TOKEN = 560
+
+
+def estimate_image_tokens(width, height):
+    return math.ceil(width * height / IMAGE_PIXELS_PER_TOKEN)
+
+
+def image_size(data):
+    """不依赖 Pillow 读取 PNG / JPEG 尺寸；无法识别时返回 None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return int.from_bytes(data[16:20], "big"), int.from_bytes(data[20:24], "big")
+    if data[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(data):
+            marker, length = data[i + 1], int.from_bytes(data[i + 2:i + 4], "big")
+            if marker in (0xC0, 0xC1, 0xC2):
+                return int.from_bytes(data[i + 7:i + 9], "big"), int.from_bytes(data[i + 5:i + 7], "big")
+            i += 2 + length
+    return None
+
+
+def image_format(data):
+    """按文件头识别格式（Bedrock 图片 format 字段的取值）"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:2] == b"\xff\xd8":
+        return "jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:4] in (b"GIF8",):
+        return "gif"
+    return "png"
+
+
+def _process_bytes(data, max_edge, fmt, quality):
+    """缩放 + 重新编码；返回 (bytes, format, width, height)。放在模块顶层以便进程池序列化"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode != "RGB":
+            # JPEG 不支持透明通道，铺白底
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        out = io.BytesIO()
+        # 不传 exif / icc_profile，即去除元数据
+        image.save(out, format=fmt.upper(), quality=quality, optimize=True)
+        return out.getvalue(), fmt, image.width, image.height
+
+
+class PreprocessedImage:
+    """一次预处理的结果"""
+
+    def __init__(self, data, format, width, height, original_bytes, original_width, original_height,
+                 cached=False):
+        self.data = data
+        self.format = format
+        self.width = width
+        self.height = height
+        self.original_bytes = original_bytes
+        self.original_width = original_width
+        self.original_height = original_height
+        self.cached = cached
+
+    @property
+    def base64(self):
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+    @property
+    def tokens_saved(self):
+        return (estimate_image_tokens(self.original_width, self.original_height)
+                - estimate_image_tokens(self.width, self.height))
+
+
+class ImagePreprocessor:
+    """带内容哈希缓存的预处理器"""
+
+    def __init__(self, max_edge=DEFAULT_MAX_EDGE, format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY,
+                 cache_dir=None, processes=None):
+        self.max_edge = max_edge
+        self.format = format
+        if Image is not None and format == "webp" and not features.check("webp"):
+            print("⚠️  当前 Pillow 不支持 WebP，改用 JPEG")
+            self.format = "jpeg"
+        self.quality = quality
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.processes = processes
+        self._cache = {}
+        self.stats = {"images": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0, "tokens_saved": 0}
+        if Image is None:
+            print("⚠️  未安装 Pillow，图片将原样上传（pip install pillow 启用预处理）")
+
+    def _key(self, data):
+        digest = hashlib.sha256(data)
+        digest.update(f"{self.max_edge}:{self.format}:{self.quality}".encode())
+        return digest.hexdigest()
+
+    def _lookup(self, key):
+        if key in self._cache:
+            return self._cache[key]
+        if self.cache_dir:
+            path = self.cache_dir / f"{key}.{self.format}"
+            if path.exists():
+                data = path.read_bytes()
+                with Image.open(io.BytesIO(data)) as image:
+                    self._cache[key] = (data, self.format, image.width, image.height)
+                return self._cache[key]
+        return None
+
+    def _store(self, key, processed):
+        self._cache[key] = processed
+        if self.cache_dir and processed[1] == self.format:
+            tmp_path = self.cache_dir / f"{key}.tmp"
+            tmp_path.write_bytes(processed[0])
+            os.replace(tmp_path, self.cache_dir / f"{key}.{self.format}")
+
+    def _finish(self, data, processed, cached):
+        width, height = image_size(data) or (processed[2], processed[3])
+        # 重新编码反而更大（如已压缩过的小 JPEG）时保留原图
+        if len(processed[0]) >= len(data):
+            processed = (data, image_format(data), width, height)
+        result = PreprocessedImage(processed[0], processed[1], processed[2], processed[3],
+                                   len(data), width, height, cached)
+        self.stats["images"] += 1
+        self.stats["cache_hits"] += cached
+        self.stats["bytes_in"] += len(data)
+        self.stats["bytes_out"] += len(result.data)
+        self.stats["tokens_saved"] += result.tokens_saved
+        return result
+
+    def process(self, data):
+        """单张图片（原始字节）→ PreprocessedImage"""
+        return self.process_many([data])[0]
+
+    def process_many(self, images):
+        """批量处理；缓存未命中且多于一张时使用进程池"""
+        if Image is None:
+            return [self._finish(data, (data, image_format(data), 0, 0), False) for data in images]
+
+        keys = [self._key(data) for data in images]
+        cached = {key: self._lookup(key) for key in set(keys)}
+        misses = {key: data for key, data in zip(keys, images) if cached[key] is None}
+        args = (self.max_edge, self.format, self.quality)
+        if len(misses) > 1 and self.processes != 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                futures = {key: pool.submit(_process_bytes, data, *args) for key, data in misses.items()}
+                processed = {key: future.result() for key, future in futures.items()}
+        else:
+            processed = {key: _process_bytes(data, *args) for key, data in misses.items()}
+        for key, value in processed.items():
+            self._store(key, value)
+
+        return [self._finish(data, processed.get(key) or cached[key], key not in processed)
+                for key, data in zip(keys, images)]
+
+    def report(self):
+        stats = dict(self.stats)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["bytes_ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 4) if stats["bytes_in"] else None
+        return stats
+
+
+def _invoke(client, model_id, image_b64, image_format):
+    body = {
+        "schemaVersion": "messages-v1",
+        "messages": [{"role": "user", "content": [
+            {"image": {"format": image_format, "source": {"bytes": image_b64}}},
+            {"text": "What do you see in this image?"},
+        ]}],
+        "inferenceConfig": {"maxTokens": 100, "temperature": 0.7},
+    }
+    start = time.time()
+    response = client.invoke_model(modelId=model_id, body=json.dumps(body))
+    usage = json.loads(response["body"].read()).get("usage", {})
+    return int((time.time() - start) * 1000), usage.get("inputTokens", 0)
+
+
+def main():
+    """原图 vs 预处理：字节、输入 token、端到端延迟"""
+    parser = argparse.ArgumentParser(description='图片预处理与效果对比')
+    parser.add_argument('images', nargs='+', help='图片文件')
+    parser.add_argument('--max-edge', type=int, default=DEFAULT_MAX_EDGE)
+    parser.add_argument('--format', choices=['jpeg', 'webp'], default=DEFAULT_FORMAT)
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY)
+    parser.add_argument('--cache-dir', help='缓存目录（默认只在内存中缓存）')
+    parser.add_argument('--requests', type=int, default=0, help='每张图片原图 / 预处理各发送的请求数，0 表示只做预处理')
+    parser.add_argument('--region', default='us-west-2')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0')
+    parser.add_argument('--stand-in', action='store_true', help='使用本地替身端点')
+    args = parser.parse_args()
+
+    preprocessor = ImagePreprocessor(args.max_edge, args.format, args.quality, args.cache_dir)
+    paths = [Path(p) for p in args.images]
+    raw = [p.read_bytes() for p in paths]
+    start = time.time()
+    results = preprocessor.process_many(raw)
+    print(f"⏱️  预处理 {len(raw)} 张图片: {time.time() - start:.2f}s")
+
+    for path, result in zip(paths, results):
+        print(f"  {path.name}: {result.original_width}×{result.original_height} {result.original_bytes:,}B → "
+              f"{result.width}×{result.height} {result.format} {len(result.data):,}B "
+              f"(省 {result.bytes_saved:,}B, 约 {result.tokens_saved} token)")
+    report = preprocessor.report()
+    print(f"📦 合计 {report['bytes_in']:,}B → {report['bytes_out']:,}B，节省 {report['bytes_saved']:,}B，"
+          f"估计节省 {report['tokens_saved']} 输入 token")
+
+    if args.requests:
+        if args.stand_in:
+            from stand_in_client import StandInClient
+            client = StandInClient(region=args.region)
+        else:
+            import boto3
+            client = boto3.client("bedrock-runtime", region_name=args.region)
+
+        totals = {"raw": [0, 0], "processed": [0, 0]}
+        for path, data, result in zip(paths, raw, results):
+            raw_b64 = base64.b64encode(data).decode("utf-8")
+            raw_format = image_format(data)
+            for _ in range(args.requests):
+                for label, image_b64, fmt in (("raw", raw_b64, raw_format), ("processed", result.base64, result.format)):
+                    latency, tokens = _invoke(client, args.model, image_b64, fmt)
+                    totals[label][0] += latency
+                    totals[label][1] += tokens
+
+        count = len(paths) * args.requests
+        (raw_latency, raw_tokens), (new_latency, new_tokens) = totals["raw"], totals["processed"]
+        print(f"\n📊 {count} 对请求（原图 / 预处理）")
+        print(f"   平均延迟: {raw_latency / count:.0f}ms → {new_latency / count:.0f}ms "
+              f"({(new_latency - raw_latency) / max(1, raw_latency):+.1%})")
+        print(f"   平均输入 token: {raw_tokens / count:.0f} → {new_tokens / count:.0f} "
+              f"(实际节省 {(raw_tokens - new_tokens) / count:.0f} / 请求)")
+
+
+if __name__ == "__main__":
+    main()
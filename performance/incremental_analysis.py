@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+增量分析：只处理上次运行之后追加的数据
+- 按 (区域, 层级, 并发, 小时) 维护物化聚合；每个桶带可合并的延迟统计（加权矩、最值、分位数草图），
+  汇总报告由这些统计合并得到，而不是对小时均值再求统计
+- 每个源文件记录水位线（已处理的字节偏移），只读取新追加的完整行
+- 记录本次变更的聚合键，只重新生成输入发生变化的图表
+- 状态保存在 analysis_state.json，测试进行中可每隔几分钟重跑一次
+"""
+
+import csv
+import io
+import json
+import os
+from pathlib import Path
+
+from streaming_aggregation import QuantileSketch, StreamingSummary
+from weighted_stats import WeightedStats
+
+# 2：聚合桶增加 latency / sketch / first / last，旧状态文件整体重建
+STATE_VERSION = 2
+
+# 聚合字段：按成功请求数加权的和，方便之后求真实平均值
+SUM_FIELDS = [
+    'batches', 'successful', 'failed',
+    'server_latency_sum', 'client_latency_sum',
+    'input_tokens_sum', 'output_tokens_sum', 'batch_time_sum',
+]
+
+
+def hour_bucket(timestamp):
+    """ISO 时间戳 → 小时桶（'2025-01-01T08'）"""
+    return timestamp[:13]
+
+
+class IncrementalAggregator:
+    """带水位线的物化聚合"""
+
+    def __init__(self, state_path):
+        self.state_path = Path(state_path)
+        self.aggregates = {}
+        self.watermarks = {}
+        self.chart_versions = {}
+        if self.state_path.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get('version') != STATE_VERSION:
+            return
+        self.aggregates = {}
+        for key, value in state['aggregates'].items():
+            value['latency'] = WeightedStats.from_dict(value['latency'])
+            value['sketch'] = QuantileSketch.from_dict(value['sketch'])
+            self.aggregates[tuple(json.loads(key))] = value
+        self.watermarks = state['watermarks']
+        self.chart_versions = state.get('chart_versions', {})
+
+    def save(self):
+        state = {
+            'version': STATE_VERSION,
+            'aggregates': {json.dumps(list(key)): {**value, 'latency': value['latency'].to_dict(),
+                                                   'sketch': value['sketch'].to_dict()}
+                           for key, value in self.aggregates.items()},
+            'watermarks': self.watermarks,
+            'chart_versions': self.chart_versions,
+        }
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self):
+        self.aggregates = {}
+        self.watermarks = {}
+
+    def _fold_row(self, region, row):
+        key = (region, row['tier'], int(row['concurrency']), hour_bucket(row['timestamp']))
+        agg = self.aggregates.get(key)
+        if agg is None:
+            agg = self.aggregates[key] = {field: 0 for field in SUM_FIELDS}
+            agg['latency'] = WeightedStats()
+            agg['sketch'] = QuantileSketch()
+            agg['first'] = agg['last'] = row['timestamp']
+        successful = int(row['successful'])
+        server_latency = float(row['avg_server_latency'])
+        agg['batches'] += 1
+        agg['successful'] += successful
+        agg['failed'] += int(row['failed'])
+        agg['server_latency_sum'] += server_latency * successful
+        agg['client_latency_sum'] += float(row['avg_client_latency']) * successful
+        agg['input_tokens_sum'] += float(row['avg_input_tokens']) * successful
+        agg['output_tokens_sum'] += float(row['avg_output_tokens']) * successful
+        agg['batch_time_sum'] += float(row['batch_time'])
+        agg['latency'].add(server_latency, successful)
+        agg['sketch'].add(server_latency, successful)
+        # ISO 时间戳按字符串比较即按时间比较
+        agg['first'] = min(agg['first'], row['timestamp'])
+        agg['last'] = max(agg['last'], row['timestamp'])
+        return key
+
+    def update(self, sources):
+        """sources: [(region_code, csv_path), ...]；返回本次变更的聚合键集合"""
+        # 文件被截断或替换时水位线失效，整体重建
+        for _, csv_path in sources:
+            mark = self.watermarks.get(str(csv_path))
+            if mark is not None:
+                stat = os.stat(csv_path)
+                if stat.st_size < mark['offset'] or stat.st_ino != mark['inode']:
+                    print(f"⚠️  {csv_path} 已被截断或替换，重建全部聚合")
+                    self.reset()
+                    break
+
+        dirty = set()
+        for region, csv_path in sources:
+            dirty |= self._update_file(region, Path(csv_path))
+        return dirty
+
+    def _update_file(self, region, csv_path):
+        mark = self.watermarks.get(str(csv_path))
+        offset = mark['offset'] if mark else 0
+        header = mark['header'] if mark else None
+
+        with open(csv_path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        # 只处理以换行结尾的完整行，写了一半的最后一行留到下次
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return set()
+        text = chunk[:end].decode('utf-8')
+
+        lines = io.StringIO(text)
+        if header is None:
+            header = next(csv.reader(lines))
+        dirty = set()
+        for row in csv.DictReader(lines, fieldnames=header):
+            dirty.add(self._fold_row(region, row))
+
+        self.watermarks[str(csv_path)] = {
+            'offset': offset + end,
+            'inode': os.stat(csv_path).st_ino,
+            'header': header,
+        }
+        return dirty
+
+    def to_frame(self):
+        """聚合 → 小时粒度 DataFrame，列名与 load_all_data() 一致，可直接交给绘图函数"""
+        import pandas as pd
+
+        rows = []
+        for (region, tier, concurrency, hour), agg in self.aggregates.items():
+            successful = agg['successful']
+            rows.append({
+                'timestamp': pd.Timestamp(hour + ':00:00'),
+                'region': region,
+                'tier': tier,
+                'concurrency': concurrency,
+                'batches': agg['batches'],
+                'successful': successful,
+                'failed': agg['failed'],
+                'avg_server_latency': agg['server_latency_sum'] / successful if successful else 0.0,
+                'avg_client_latency': agg['client_latency_sum'] / successful if successful else 0.0,
+                'avg_input_tokens': agg['input_tokens_sum'] / successful if successful else 0.0,
+                'avg_output_tokens': agg['output_tokens_sum'] / successful if successful else 0.0,
+                'batch_time': agg['batch_time_sum'] / agg['batches'],
+            })
+        return pd.DataFrame(rows)
+
+    def summary(self, region_names):
+        """聚合 → StreamingSummary：合并各桶的批次级统计，报告与全量 / 流式模式一致（时间范围精确到批次）"""
+        import pandas as pd
+
+        summary = StreamingSummary()
+        for (region, tier, concurrency, hour), agg in self.aggregates.items():
+            first, last = pd.Timestamp(agg['first']), pd.Timestamp(agg['last'])
+            summary.start = first if summary.start is None else min(summary.start, first)
+            summary.end = last if summary.end is None else max(summary.end, last)
+            summary.successful += agg['successful']
+            summary.failed += agg['failed']
+            summary.input_tokens += agg['input_tokens_sum']
+            summary.output_tokens += agg['output_tokens_sum']
+            window = summary.windows.setdefault(pd.Timestamp(hour + ':00:00'), [0, 0.0])
+            window[0] += agg['successful'] + agg['failed']
+            window[1] += agg['input_tokens_sum'] + agg['output_tokens_sum']
+
+            summary.tiers.setdefault(tier, WeightedStats()).merge(agg['latency'])
+            summary.sketches.setdefault(('tier', tier), QuantileSketch()).merge(agg['sketch'])
+            if tier == 'default':
+                region_name = region_names[region]
+                summary.regional.setdefault(region_name, WeightedStats()).merge(agg['latency'])
+                summary.sketches.setdefault(('region', region_name), QuantileSketch()).merge(agg['sketch'])
+                calls = summary.regional_calls.setdefault(region_name, [0, 0])
+                calls[0] += agg['successful']
+                calls[1] += agg['failed']
+                summary.concurrency.setdefault(concurrency, WeightedStats()).merge(agg['latency'])
+        return summary
+
+    def charts_to_render(self, charts, dirty):
+        """charts: [(name, tiers)]，tiers 为 None 表示依赖所有层级；返回需要重绘的图表名"""
+        dirty_tiers = {key[1] for key in dirty}
+        stale = []
+        for name, tiers in charts:
+            touched = dirty_tiers if tiers is None else dirty_tiers & set(tiers)
+            if touched or name not in self.chart_versions:
+                stale.append(name)
+        return stale
+
+    def mark_rendered(self, names):
+        total = sum(agg['batches'] for agg in self.aggregates.values())
+        for name in names:
+            self.chart_versions[name] = total
@@ -34,6 +34,7 @@ for region in "${!REGIONS[@]}"; do
 
 TEST_SCRIPT="test_concurrent_96h_robust.py"
 LOG_FILE="concurrent_96h_${region_safe}.log"
+JSON_LOG="logs/concurrent_96h_${region_safe}.jsonl"
 PID_FILE="concurrent_96h_${region_safe}.pid"
 DAEMON_LOG="daemon_${region_safe}.log"
 
@@ -42,7 +43,8 @@ cd /home/ubuntu/codes/nova/performance
 echo "🛡️  启动 $region 测试守护进程" > "\$DAEMON_LOG"
 echo "================================" >> "\$DAEMON_LOG"
 echo "测试脚本: \$TEST_SCRIPT" >> "\$DAEMON_LOG"
-echo "日志文件: \$LOG_FILE" >> "\$DAEMON_LOG"
+echo "日志文件: \$LOG_FILE（仅启动信息和错误）" >> "\$DAEMON_LOG"
+echo "结构化日志: \$JSON_LOG" >> "\$DAEMON_LOG"
 echo "PID文件: \$PID_FILE" >> "\$DAEMON_LOG"
 echo "================================" >> "\$DAEMON_LOG"
 echo "" >> "\$DAEMON_LOG"
@@ -63,7 +65,8 @@ while true; do
     fi
 
     echo "[\$(date '+%Y-%m-%d %H:%M:%S')] 🚀 启动测试..." >> "\$DAEMON_LOG"
-    python3 "\$TEST_SCRIPT" --region "$region" --model "$model_id" >> "\$LOG_FILE" 2>&1 &
+    # 批次进度写入按大小 / 时间轮转并压缩的 JSON Lines 日志，标准输出只剩启动信息和错误
+    python3 "\$TEST_SCRIPT" --region "$region" --model "$model_id" --log-file "\$JSON_LOG" --quiet >> "\$LOG_FILE" 2>&1 &
     NEW_PID=\$!
     echo "\$NEW_PID" > "\$PID_FILE"
     echo "[\$(date '+%Y-%m-%d %H:%M:%S')] ✅ 测试已启动 (PID: \$NEW_PID)" >> "\$DAEMON_LOG"
@@ -105,7 +108,8 @@ echo "   ps aux | grep test_concurrent_96h_robust.py"
 echo ""
 echo "📝 查看日志:"
 echo "   tail -f daemon_*.log"
-echo "   tail -f concurrent_96h_*.log"
+echo "   python3 structured_log.py logs/ --tail 20 -f"
+echo "   python3 structured_log.py logs/ --level WARNING --since 1h"
 echo ""
 echo "📂 数据目录:"
 for region in "${!REGIONS[@]}"; do
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+压测进程内的实时指标端点（Prometheus 文本格式）
+- 每个工作线程写自己的分片，热路径不加锁；抓取时合并所有分片
+- 请求计数、延迟直方图（区域 / 层级 / 并发）、在途请求、限流与重试、token 吞吐（含缓存读写）、连接池利用率
+- 用法：MetricsRegistry().serve(port) 后访问 http://127.0.0.1:<port>/metrics
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图桶上界（毫秒）
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 3000, 5000, 8000, 12000, 20000, 30000, 60000]
+
+# botocore 默认 max_pool_connections
+DEFAULT_POOL_SIZE = 10
+
+
+class _Shard:
+    """单个线程独占的指标分片"""
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def fold(self, other):
+        """把另一个分片的数据累加进来（仅在 other 不再被写入时调用）"""
+        for key, value in other.counters.copy().items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, value in other.gauges.copy().items():
+            self.gauges[key] = self.gauges.get(key, 0) + value
+        for key, value in other.histograms.copy().items():
+            merged = self.histograms.setdefault(key, [0] * len(value))
+            for i, v in enumerate(list(value)):
+                merged[i] += v
+
+
+class MetricsRegistry:
+    """按线程分片的指标注册表"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, buckets=LATENCY_BUCKETS_MS):
+        self.pool_size = pool_size
+        self.buckets = buckets
+        self.start_time = time.time()
+        self._local = threading.local()
+        self._shards = []
+        # 已退出线程的分片合并到这里，避免每批次新建线程导致分片无限增长
+        self._retired = _Shard()
+        self._shards_lock = threading.Lock()
+        self._server = None
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # 只有线程第一次写入时加锁登记分片
+            shard = _Shard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    # ---- 热路径 ----
+
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def gauge_add(self, name, labels=(), value=1):
+        gauges = self._shard().gauges
+        key = (name, labels)
+        gauges[key] = gauges.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # [各桶计数..., +Inf 计数, 总和]
+            histogram = histograms[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(self.buckets)] += 1
+        histogram[-1] += value
+
+    # ---- 压测专用的便捷方法 ----
+
+    def request_started(self, region, tier):
+        self.gauge_add("nova_requests_in_flight", (("region", region), ("tier", tier)))
+
+    def request_finished(self, region, tier, concurrency, outcome, latency_ms=None,
+                         input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0):
+        labels = (("region", region), ("tier", tier), ("concurrency", str(concurrency)))
+        self.gauge_add("nova_requests_in_flight", (("region", region), ("tier", tier)), -1)
+        self.inc("nova_requests_total", labels + (("outcome", outcome),))
+        if latency_ms is not None:
+            self.observe("nova_request_latency_ms", labels, latency_ms)
+        if input_tokens:
+            self.inc("nova_input_tokens_total", labels, input_tokens)
+        if output_tokens:
+            self.inc("nova_output_tokens_total", labels, output_tokens)
+        if cache_read_tokens:
+            self.inc("nova_cache_read_tokens_total", labels, cache_read_tokens)
+        if cache_write_tokens:
+            self.inc("nova_cache_write_tokens_total", labels, cache_write_tokens)
+
+    def throttled(self, region, tier):
+        self.inc("nova_throttles_total", (("region", region), ("tier", tier)))
+
+    def retried(self, region, tier):
+        self.inc("nova_retries_total", (("region", region), ("tier", tier)))
+
+    # ---- 抓取 ----
+
+    def _merge(self):
+        with self._shards_lock:
+            alive = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    alive.append(shard)
+                else:
+                    self._retired.fold(shard)
+            self._shards = alive
+            merged = _Shard()
+            merged.fold(self._retired)
+        for shard in alive:
+            # dict.copy() 在 GIL 下是原子的，避免遍历时被写线程修改
+            merged.fold(shard)
+        return merged.counters, merged.gauges, merged.histograms
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        counters, gauges, histograms = self._merge()
+        lines = []
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        def emit_family(name, kind, series):
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series):
+                lines.append(f"{name}{fmt(labels)} {value}")
+
+        families = {}
+        for (name, labels), value in counters.items():
+            families.setdefault((name, "counter"), []).append((labels, value))
+        for (name, labels), value in gauges.items():
+            families.setdefault((name, "gauge"), []).append((labels, value))
+        for (name, kind), series in sorted(families.items()):
+            emit_family(name, kind, series)
+
+        in_flight = sum(v for (name, _), v in gauges.items() if name == "nova_requests_in_flight")
+        emit_family("nova_client_pool_size", "gauge", [((), self.pool_size)])
+        emit_family("nova_client_pool_utilization", "gauge", [((), round(in_flight / self.pool_size, 4))])
+        emit_family("nova_uptime_seconds", "gauge", [((), round(time.time() - self.start_time, 1))])
+
+        by_name = {}
+        for (name, labels), value in histograms.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name, series in sorted(by_name.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, value in sorted(series):
+                cumulative = 0
+                for bound, count in zip(self.buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                cumulative += value[len(self.buckets)]
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {cumulative}")
+                lines.append(f"{name}_sum{fmt(labels)} {round(value[-1], 3)}")
+                lines.append(f"{name}_count{fmt(labels)} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程启动 HTTP 端点"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def main():
+    """启动端点并用本地替身流量填充指标"""
+    import random
+
+    parser = argparse.ArgumentParser(description="压测指标端点（本地演示）")
+    parser.add_argument("--port", type=int, default=9464)
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    port = registry.serve(args.port)
+    print(f"📈 指标端点: http://127.0.0.1:{port}/metrics")
+
+    def worker(tier):
+        rng = random.Random(tier)
+        deadline = time.time() + args.seconds
+        while time.time() < deadline:
+            registry.request_started("local", tier)
+            latency = rng.uniform(0.05, 0.2)
+            time.sleep(latency)
+            outcome = "success" if rng.random() > 0.05 else "throttled"
+            if outcome == "throttled":
+                registry.throttled("local", tier)
+            registry.request_finished("local", tier, 1, outcome, latency * 1000, 1300, 100)
+
+    threads = [threading.Thread(target=worker, args=(tier,)) for tier in ["flex", "default", "priority"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(registry.render())
+
+
+if __name__ == "__main__":
+    main()
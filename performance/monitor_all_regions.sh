@@ -49,7 +49,8 @@ for region in "${REGIONS[@]}"; do
     fi
 
     if [ -d "$data_dir" ]; then
-        csv_file=$(ls -t "$data_dir"/*.csv 2>/dev/null | head -1)
+        # 目录里还有 requests_* / host_samples_* 等 CSV，只看批次汇总文件（--coalesce 运行写 coalesced_*）
+        csv_file=$(ls -t "$data_dir"/concurrent_96h_image_*.csv "$data_dir"/coalesced_96h_image_*.csv 2>/dev/null | head -1)
         if [ -f "$csv_file" ]; then
             lines=$(($(wc -l < "$csv_file") - 1))
             rounds=$((lines / 3))
@@ -70,6 +71,15 @@ for region in "${REGIONS[@]}"; do
     fi
 done
 
+echo "📝 最近一小时的告警"
+echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+if [ -d logs ]; then
+    python3 structured_log.py logs/ --level WARNING --since 1h --tail 10
+else
+    echo "未找到 logs/ 目录"
+fi
+echo ""
+
 echo "💾 系统资源"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo "磁盘使用: $(df -h . | tail -1 | awk '{print $3 " / " $2 " (" $5 ")"}')"
@@ -80,6 +90,7 @@ echo "🔧 快捷命令"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo "查看所有进程: ps aux | grep test_concurrent_96h_robust.py | grep -v grep"
 echo "查看守护日志: tail -f daemon_*.log"
-echo "查看测试日志: tail -f concurrent_96h_*.log"
+echo "查看测试日志: python3 structured_log.py logs/ --tail 20 -f"
+echo "按区域过滤:   python3 structured_log.py logs/ --region us-east-1 --event batch_result --since 2h"
 echo "停止所有测试: pkill -f test_concurrent_96h_robust.py"
 echo ""
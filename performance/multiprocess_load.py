@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+多进程负载生成
+- 单进程里 SigV4 签名、大 base64 请求体的 JSON 编码和响应解析都抢同一把 GIL，
+  请求速率高时客户端先于 Bedrock 成为瓶颈
+- 把场景的到达速率 / 并发 / 在途上限按进程数切分，每个工作进程独立创建客户端运行一个分片
+- 逐请求结果按批通过管道流回父进程，由单个聚合器汇总（与单进程的 summarize_run 结果结构一致）
+- --benchmark 对同一场景分别用单进程和多进程运行，比较吞吐、延迟和客户端 CPU 开销
+
+用法:
+    python multiprocess_load.py scenarios/mixed_smoke.toml --processes 4
+    python multiprocess_load.py scenarios/mixed_smoke.toml --processes 4 --benchmark --time-scale 0.2
+"""
+
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from scenario_runner import ScenarioRun, load_scenario, make_client, summarize_run
+from workloads import RequestResult
+
+# 工作进程攒够一批或超过间隔就发送，减少管道往返和 pickle 次数
+SEND_BATCH_SIZE = 200
+SEND_INTERVAL_SECONDS = 0.5
+PROGRESS_INTERVAL_SECONDS = 5
+
+
+def _split(total, index, parts):
+    """把整数 total 尽量均匀地分给 parts 份，返回第 index 份"""
+    return total // parts + (1 if index < total % parts else 0)
+
+
+def shard_scenario(scenario, index, processes):
+    """第 index 个分片：速率、突发大小、并发和容量均按进程数切分"""
+    shard = copy.deepcopy(scenario)
+    if shard.get("seed") is not None:
+        shard["seed"] = shard["seed"] * 1000 + index
+    if shard.get("stand_in", {}).get("capacity"):
+        shard["stand_in"]["capacity"] = math.ceil(shard["stand_in"]["capacity"] / processes)
+    for phase in shard["phases"]:
+        for key in ("rate", "rate_from"):
+            if key in phase:
+                phase[key] = float(phase[key]) / processes
+        if "burst_size" in phase:
+            phase["burst_size"] = _split(int(phase["burst_size"]), index, processes)
+        if "concurrency" in phase:
+            phase["concurrency"] = _split(int(phase["concurrency"]), index, processes)
+        if "max_in_flight" in phase:
+            phase["max_in_flight"] = max(1, math.ceil(int(phase["max_in_flight"]) / processes))
+    return shard
+
+
+def _pack(phase, result):
+    return (phase, result.workload, result.tier, result.ok, result.latency_ms, result.ttft_ms,
+            result.input_tokens, result.output_tokens, result.error, result.throttled,
+            result.cache_read_tokens, result.cache_write_tokens, result.finished_at)
+
+
+def _unpack(row):
+    (phase, workload, tier, ok, latency, ttft, input_tokens, output_tokens, error, throttled,
+     cache_read, cache_write, finished_at) = row
+    result = RequestResult(workload, tier, ok, latency, ttft, input_tokens, output_tokens, error, throttled,
+                           cache_read, cache_write)
+    result.finished_at = finished_at
+    return phase, result
+
+
+def _worker(index, processes, scenario, base_dir, endpoint, time_scale, conn):
+    """工作进程：运行一个分片，结果按批写回管道"""
+    shard = shard_scenario(scenario, index, processes)
+    buffer = []
+    lock = threading.Lock()
+    last_send = [time.time()]
+
+    def flush():
+        if buffer:
+            conn.send(("results", buffer[:]))
+            buffer.clear()
+        last_send[0] = time.time()
+
+    def on_result(phase, result):
+        with lock:
+            buffer.append(_pack(phase, result))
+            if len(buffer) >= SEND_BATCH_SIZE or time.time() - last_send[0] >= SEND_INTERVAL_SECONDS:
+                flush()
+
+    run = ScenarioRun(shard, base_dir, make_client(shard, endpoint), time_scale,
+                      on_result=on_result, keep_results=False).run()
+    with lock:
+        flush()
+    times = os.times()
+    conn.send(("done", run.phase_durations, run.dropped, times.user + times.system))
+    conn.close()
+
+
+class ShardedScenarioRun:
+    """与 ScenarioRun 接口一致（results / phase_durations / dropped），负载由多个工作进程产生"""
+
+    def __init__(self, scenario, base_dir, endpoint, processes, time_scale=1.0):
+        self.scenario = scenario
+        self.base_dir = base_dir
+        self.endpoint = endpoint
+        self.processes = processes
+        self.time_scale = time_scale
+        self.results = []
+        self.phase_durations = {}
+        self.dropped = {}
+        self.worker_cpu_seconds = 0.0
+        self.messages = 0
+
+    def run(self):
+        # spawn：子进程不继承父进程的客户端连接和线程
+        context = multiprocessing.get_context("spawn")
+        conns = []
+        workers = []
+        for index in range(self.processes):
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            worker = context.Process(target=_worker, args=(index, self.processes, self.scenario, self.base_dir,
+                                                           self.endpoint, self.time_scale, child_conn), daemon=True)
+            worker.start()
+            child_conn.close()
+            conns.append(parent_conn)
+            workers.append(worker)
+
+        start = last_progress = time.time()
+        pending = list(conns)
+        while pending:
+            for conn in wait(pending, timeout=1):
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    pending.remove(conn)
+                    continue
+                self.messages += 1
+                if message[0] == "results":
+                    self.results.extend(_unpack(row) for row in message[1])
+                else:
+                    _, durations, dropped, cpu_seconds = message
+                    for name, duration in durations.items():
+                        self.phase_durations[name] = max(self.phase_durations.get(name, 0.0), duration)
+                    for name, count in dropped.items():
+                        self.dropped[name] = self.dropped.get(name, 0) + count
+                    self.worker_cpu_seconds += cpu_seconds
+                    pending.remove(conn)
+            if time.time() - last_progress >= PROGRESS_INTERVAL_SECONDS:
+                last_progress = time.time()
+                print(f"   ⏱️  {last_progress - start:.0f}s: 已汇总 {len(self.results)} 个结果")
+
+        for worker in workers:
+            worker.join()
+            if worker.exitcode:
+                print(f"⚠️  工作进程 {worker.pid} 异常退出 (exit code {worker.exitcode})")
+        # 按阶段顺序排列，与单进程运行一致
+        order = [phase.get("name", f"phase{i + 1}") for i, phase in enumerate(self.scenario["phases"])]
+        self.phase_durations = {name: self.phase_durations[name] for name in order if name in self.phase_durations}
+        return self
+
+
+def measure(run_fn):
+    """运行并记录墙钟时间与父进程 CPU 时间"""
+    before = os.times()
+    start = time.time()
+    run = run_fn()
+    after = os.times()
+    return run, time.time() - start, (after.user + after.system) - (before.user + before.system)
+
+
+def benchmark(scenario, base_dir, endpoint, processes, time_scale):
+    """同一场景：单进程 vs 多进程"""
+    rows = []
+    single, wall, cpu = measure(lambda: ScenarioRun(scenario, base_dir, make_client(scenario, endpoint),
+                                                    time_scale).run())
+    rows.append(("single", 1, single, wall, cpu))
+    sharded, wall, cpu = measure(lambda: ShardedScenarioRun(scenario, base_dir, endpoint, processes,
+                                                            time_scale).run())
+    rows.append(("multi", processes, sharded, wall, cpu + sharded.worker_cpu_seconds))
+
+    report = []
+    print(f"\n{'模式':8} {'进程':>4} {'请求':>7} {'req/s':>8} {'p50':>7} {'p95':>7} {'丢弃':>6} {'CPU ms/请求':>12}")
+    for mode, count, run, wall, cpu in rows:
+        overall = summarize_run(run)["overall"]
+        cpu_per_request = cpu * 1000 / max(1, overall["requests"])
+        print(f"{mode:8} {count:>4} {overall['requests']:>7} {overall['throughput_rps']:>8.1f} "
+              f"{overall['p50_latency_ms']:>7} {overall['p95_latency_ms']:>7} {overall['dropped']:>6} "
+              f"{cpu_per_request:>12.2f}")
+        report.append({"mode": mode, "processes": count, "wall_seconds": round(wall, 2),
+                       "cpu_ms_per_request": round(cpu_per_request, 3), **overall})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程负载生成')
+    parser.add_argument('scenario', help='场景文件（.yaml/.yml/.toml）')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='工作进程数 (默认: CPU 核数)')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='阶段时长缩放')
+    endpoint = parser.add_mutually_exclusive_group()
+    endpoint.add_argument('--stand-in', dest='endpoint', action='store_const', const='stand-in')
+    endpoint.add_argument('--live', dest='endpoint', action='store_const', const='live')
+    parser.add_argument('--benchmark', action='store_true', help='与单进程运行比较吞吐和客户端开销')
+    parser.add_argument('--output', help='结果 JSON 路径')
+    args = parser.parse_args()
+
+    path = Path(args.scenario)
+    scenario = load_scenario(path)
+    scenario.setdefault("name", path.stem)
+    endpoint = args.endpoint or scenario.get("endpoint", "live")
+    print(f"🎬 场景: {scenario['name']} | 端点: {endpoint} | 进程: {args.processes}")
+
+    if args.benchmark:
+        result = {"scenario": scenario["name"], "benchmark": benchmark(scenario, path.parent, endpoint,
+                                                                       args.processes, args.time_scale)}
+    else:
+        run, wall, cpu = measure(lambda: ShardedScenarioRun(scenario, path.parent, endpoint, args.processes,
+                                                            args.time_scale).run())
+        result = {"scenario": scenario["name"], "processes": args.processes, **summarize_run(run)}
+        overall = result["overall"]
+        print(f"\n📊 {overall['requests']} 请求 | {overall['throughput_rps']:.1f} req/s | "
+              f"p50 {overall['p50_latency_ms']}ms | p95 {overall['p95_latency_ms']}ms | 丢弃 {overall['dropped']}")
+        print(f"   管道消息 {run.messages} 条 | 工作进程 CPU {run.worker_cpu_seconds:.1f}s | 聚合器 CPU {cpu:.1f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"📁 结果: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
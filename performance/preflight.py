@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+请求发送前的本地预检：载荷大小与输入 token 估算
+- 载荷：请求 JSON 的实际大小（内联图片 / 视频按 base64 计，比原始字节大 1/3）
+- 输入 token：文本按字符数、图片按像素（image_preprocess.estimate_image_tokens）、
+  视频按时长（MP4 / MOV 读 mvhd，其他容器按码率估计）× 采样帧率 × 每帧 token
+- TokenCalibration：用压测实测的 usage.inputTokens 按模态校准估算系数，保存为 JSON
+- Preflight.check() 在发送前给出处理方式，超限的请求不再等完整上传后才收到 ValidationException：
+    send       正常发送
+    downscale  内联图片过大 / 分辨率超限 / 超出上下文窗口，缩放重编码后可发送（需要 Pillow）
+    s3         内联视频使载荷超限，上传到 S3 改用 s3Location 后可发送
+    batch      超过 batch_above_tokens，交给离线批处理（batch_inference.py）
+    reject     本地无法修正，直接拒绝
+- 估算值也可供调度器按 token 预算组批
+
+用法:
+    python preflight.py test_image.png --prompt "What do you see?"
+    python preflight.py media/animals.mp4 --model us.amazon.nova-lite-v1:0 --s3
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import threading
+from pathlib import Path
+
+from image_preprocess import DEFAULT_MAX_EDGE, Image, ImagePreprocessor, estimate_image_tokens, image_size
+from workloads import CHARS_PER_TOKEN
+
+# 请求体上限（内联媒体按 base64 计入）
+MAX_INLINE_PAYLOAD_BYTES = 25 * 1024 * 1024
+# s3Location 视频的大小上限
+MAX_S3_VIDEO_BYTES = 1024 ** 3
+# 图片单边像素上限
+MAX_IMAGE_EDGE = 8000
+
+# 上下文窗口（按模型 ID 中的名称匹配，未匹配时用默认值；以模型文档为准）
+MODEL_CONTEXT_TOKENS = {
+    "nova-micro": 128000,
+    "nova-lite": 300000,
+    "nova-pro": 300000,
+    "nova-premier": 1000000,
+    "nova-2-lite": 1000000,
+}
+DEFAULT_CONTEXT_TOKENS = 300000
+
+# 视频 token 的粗略先验：按 1 fps 采样，长视频最多采样 VIDEO_MAX_FRAMES 帧；由校准修正
+VIDEO_FRAMES_PER_SECOND = 1
+VIDEO_MAX_FRAMES = 960
+VIDEO_TOKENS_PER_FRAME = 290
+# 无法读取时长时按码率估计（约 2 Mbps）
+DEFAULT_VIDEO_BYTES_PER_SECOND = 250000
+
+# 校准：某模态累计估算 token 达到下限后才使用实测系数；超过上限时减半，让旧观测逐步淡出
+MIN_CALIBRATION_TOKENS = 10000
+CALIBRATION_DECAY_TOKENS = 10 ** 9
+
+KINDS = ("text", "image", "video")
+SEND, DOWNSCALE, S3, BATCH, REJECT = "send", "downscale", "s3", "batch", "reject"
+
+
+def context_tokens(model_id):
+    for name, tokens in MODEL_CONTEXT_TOKENS.items():
+        if model_id and name in model_id:
+            return tokens
+    return DEFAULT_CONTEXT_TOKENS
+
+
+def estimate_text_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_video_tokens(seconds):
+    frames = min(VIDEO_MAX_FRAMES, max(1, math.ceil(seconds * VIDEO_FRAMES_PER_SECOND)))
+    return frames * VIDEO_TOKENS_PER_FRAME
+
+
+def mp4_duration(data):
+    """MP4 / MOV 的 moov/mvhd 时长（秒）；不是 ISO BMFF 或没找到时返回 None"""
+    def boxes(start, end):
+        i = start
+        while i + 8 <= end:
+            size, header = int.from_bytes(data[i:i + 4], "big"), 8
+            if size == 1:
+                size, header = int.from_bytes(data[i + 8:i + 16], "big"), 16
+            elif size == 0:
+                size = end - i
+            if size < header:
+                return
+            yield data[i + 4:i + 8], i + header, min(i + size, end)
+            i += size
+
+    for kind, start, end in boxes(0, len(data)):
+        if kind != b"moov":
+            continue
+        for kind, start, _ in boxes(start, end):
+            if kind == b"mvhd":
+                if data[start] == 1:
+                    timescale = int.from_bytes(data[start + 20:start + 24], "big")
+                    duration = int.from_bytes(data[start + 24:start + 32], "big")
+                else:
+                    timescale = int.from_bytes(data[start + 12:start + 16], "big")
+                    duration = int.from_bytes(data[start + 16:start + 20], "big")
+                return duration / timescale if timescale else None
+    return None
+
+
+def _base64_size(length):
+    return 4 * math.ceil(length / 3)
+
+
+def _raw_bytes(source):
+    """source.bytes 可以是原始字节（converse）或 base64 字符串（invoke_model 请求体）"""
+    value = source.get("bytes")
+    if value is None:
+        return None
+    return value if isinstance(value, (bytes, bytearray)) else base64.b64decode(value)
+
+
+class MediaInfo:
+    """请求中的一个内联媒体块"""
+
+    def __init__(self, kind, block, data, tokens, width=None, height=None, seconds=None):
+        self.kind = kind
+        self.block = block
+        self.size = len(data)
+        self.tokens = tokens
+        self.width = width
+        self.height = height
+        self.seconds = seconds
+
+
+class RequestEstimate:
+    """一个请求的载荷大小与按模态的 token 估算（未校准）"""
+
+    def __init__(self):
+        self.tokens = dict.fromkeys(KINDS, 0)
+        self.payload_bytes = 0
+        self.max_output_tokens = 0
+        self.media = []
+        self.notes = []
+
+    def input_tokens(self, calibration=None):
+        factor = calibration.factor if calibration else (lambda kind: 1.0)
+        return round(sum(factor(kind) * tokens for kind, tokens in self.tokens.items()))
+
+    def media_of(self, kind):
+        return [m for m in self.media if m.kind == kind]
+
+
+def estimate_request(body):
+    """converse 参数或 Nova invoke_model 请求体（messages-v1）→ RequestEstimate"""
+    estimate = RequestEstimate()
+    inline_bytes = []
+
+    def skip_bytes(value):
+        if isinstance(value, (bytes, bytearray)):
+            inline_bytes.append(len(value))
+            return ""
+        raise TypeError(type(value).__name__)
+
+    estimate.payload_bytes = len(json.dumps(body, default=skip_bytes)) + sum(_base64_size(n) for n in inline_bytes)
+    config = body.get("inferenceConfig", {})
+    estimate.max_output_tokens = config.get("maxTokens") or config.get("max_new_tokens") or 0
+
+    blocks = list(body.get("system", []))
+    for message in body.get("messages", []):
+        blocks.extend(message.get("content", []))
+    for block in blocks:
+        if "text" in block:
+            estimate.tokens["text"] += estimate_text_tokens(block["text"])
+        elif "image" in block:
+            data = _raw_bytes(block["image"]["source"])
+            if data is None:
+                estimate.notes.append("s3 图片未计入 token")
+                continue
+            width, height = image_size(data) or (0, 0)
+            info = MediaInfo("image", block["image"], data, estimate_image_tokens(width, height), width, height)
+            if not width:
+                estimate.notes.append(f"无法读取 {block['image'].get('format')} 图片尺寸，token 未计入")
+            estimate.media.append(info)
+            estimate.tokens["image"] += info.tokens
+        elif "video" in block:
+            data = _raw_bytes(block["video"]["source"])
+            if data is None:
+                estimate.notes.append("s3 视频未计入 token")
+                continue
+            seconds = mp4_duration(data)
+            if seconds is None:
+                seconds = len(data) / DEFAULT_VIDEO_BYTES_PER_SECOND
+                estimate.notes.append(f"无法读取 {block['video'].get('format')} 时长，按码率估计 {seconds:.0f}s")
+            info = MediaInfo("video", block["video"], data, estimate_video_tokens(seconds), seconds=seconds)
+            estimate.media.append(info)
+            estimate.tokens["video"] += info.tokens
+    return estimate
+
+
+class TokenCalibration:
+    """按模态累计 (估算, 实测) token，系数 = 实测 / 估算；path 给出时从 JSON 加载、save() 写回"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.totals = {kind: [0.0, 0.0] for kind in KINDS}
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            try:
+                saved = {kind: [entry["estimated"], entry["observed"]]
+                         for kind, entry in json.loads(self.path.read_text()).items() if kind in self.totals}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"⚠️  token 校准 {self.path} 无法读取（{e}），从未校准开始")
+                saved = {}
+            self.totals.update(saved)
+
+    def factor(self, kind):
+        estimated, observed = self.totals[kind]
+        return observed / estimated if estimated >= MIN_CALIBRATION_TOKENS else 1.0
+
+    def observe(self, estimate, observed_tokens, weight=1):
+        """一次（或 weight 次相同）请求的 usage.inputTokens：归到估算占比最大的模态，其余模态按当前系数扣除"""
+        kind = max(estimate.tokens, key=estimate.tokens.get)
+        if not estimate.tokens[kind] or not observed_tokens or not weight:
+            return
+        others = sum(self.factor(k) * tokens for k, tokens in estimate.tokens.items() if k != kind)
+        with self._lock:
+            totals = self.totals[kind]
+            totals[0] += estimate.tokens[kind] * weight
+            totals[1] += max(0, observed_tokens - others) * weight
+            if totals[0] > CALIBRATION_DECAY_TOKENS:
+                totals[0] /= 2
+                totals[1] /= 2
+
+    def to_dict(self):
+        return {kind: {"estimated": round(estimated), "observed": round(observed), "factor": round(self.factor(kind), 4)}
+                for kind, (estimated, observed) in self.totals.items()}
+
+    def save(self):
+        if self.path:
+            with self._lock:
+                data = self.to_dict()
+            # 先写临时文件再替换：每轮都会保存，写到一半被杀不能留下截断的 JSON
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data, indent=2))
+            os.replace(tmp_path, self.path)
+
+
+class PreflightDecision:
+    """预检结果：处理方式、校准后的输入 token 估算和原因"""
+
+    def __init__(self, action, estimate, input_tokens, reasons):
+        self.action = action
+        self.estimate = estimate
+        self.input_tokens = input_tokens
+        self.reasons = reasons
+
+    def __str__(self):
+        detail = f"（{'; '.join(self.reasons)}）" if self.reasons else ""
+        return (f"{self.action}: 约 {self.input_tokens:,} 输入 token，"
+                f"载荷 {self.estimate.payload_bytes / 1024 ** 2:.2f}MB{detail}")
+
+
+class Preflight:
+    """发送前检查；s3=True 表示调用方可以把视频上传到 S3，batch_above_tokens 以上的请求转批处理"""
+
+    def __init__(self, model_id=None, calibration=None, max_payload_bytes=MAX_INLINE_PAYLOAD_BYTES,
+                 context=None, batch_above_tokens=None, s3=False):
+        self.calibration = calibration
+        self.max_payload_bytes = max_payload_bytes
+        self.context = context or context_tokens(model_id)
+        self.batch_above_tokens = batch_above_tokens
+        self.s3 = s3
+
+    def check(self, body):
+        estimate = estimate_request(body)
+        tokens = estimate.input_tokens(self.calibration)
+        reasons = []
+        limit_mb = self.max_payload_bytes / 1024 ** 2
+        over_payload = estimate.payload_bytes > self.max_payload_bytes
+        over_context = tokens + estimate.max_output_tokens > self.context
+        oversize = [m for m in estimate.media_of("image") if max(m.width or 0, m.height or 0) > MAX_IMAGE_EDGE]
+        if over_payload:
+            reasons.append(f"载荷 {estimate.payload_bytes / 1024 ** 2:.1f}MB 超过 {limit_mb:.0f}MB")
+        if over_context:
+            reasons.append(f"输入 {tokens:,} + 输出 {estimate.max_output_tokens:,} token 超过上下文 {self.context:,}")
+        if oversize:
+            reasons.append(f"{len(oversize)} 张图片边长超过 {MAX_IMAGE_EDGE}px")
+
+        def decide(action):
+            return PreflightDecision(action, estimate, tokens, reasons)
+
+        if not (over_payload or over_context or oversize):
+            if self.batch_above_tokens and tokens > self.batch_above_tokens:
+                reasons.append(f"超过实时阈值 {self.batch_above_tokens:,} token")
+                return decide(BATCH)
+            return decide(SEND)
+
+        videos = estimate.media_of("video")
+        images = estimate.media_of("image")
+        video_payload = sum(_base64_size(m.size) for m in videos)
+        # 图片缩到 DEFAULT_MAX_EDGE 后的 token（上下文超限时能否靠缩图解决）
+        scale = self.calibration.factor("image") if self.calibration else 1.0
+        shrunk = tokens - round(scale * sum(
+            m.tokens - estimate_image_tokens(*_fit(m.width, m.height, DEFAULT_MAX_EDGE)) for m in images))
+        if over_context and shrunk + estimate.max_output_tokens > self.context:
+            return decide(REJECT)
+        if videos and over_payload and estimate.payload_bytes - video_payload <= self.max_payload_bytes:
+            if not self.s3:
+                reasons.append("视频需上传到 S3 改用 s3Location")
+                return decide(REJECT)
+            if any(m.size > MAX_S3_VIDEO_BYTES for m in videos):
+                reasons.append(f"视频超过 S3 输入上限 {MAX_S3_VIDEO_BYTES / 1024 ** 3:.0f}GB")
+                return decide(REJECT)
+            if not (oversize or over_context):
+                return decide(S3)
+        if images and Image is not None:
+            return decide(DOWNSCALE)
+        if images:
+            reasons.append("缩放图片需要 Pillow")
+        return decide(REJECT)
+
+
+def _fit(width, height, max_edge):
+    if not width or max(width, height) <= max_edge:
+        return width, height
+    ratio = max_edge / max(width, height)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def downscale_images(body, max_edge=DEFAULT_MAX_EDGE):
+    """把请求中的内联图片缩放重编码（原地修改，保持原始字节 / base64 的表示方式）；返回节省的字节数"""
+    preprocessor = ImagePreprocessor(max_edge)
+    saved = 0
+    for info in estimate_request(body).media_of("image"):
+        source = info.block["source"]
+        encoded = isinstance(source["bytes"], str)
+        result = preprocessor.process(_raw_bytes(source))
+        source["bytes"] = result.base64 if encoded else result.data
+        info.block["format"] = result.format
+        saved += result.bytes_saved
+    return saved
+
+
+def s3_uploader(s3_client, s3_uri):
+    """返回 upload(data, format) → s3:// URI；对象名取内容哈希，重复上传同一视频只写一次"""
+    bucket, _, prefix = s3_uri[len("s3://"):].partition("/")
+
+    def upload(data, media_format):
+        key = f"{prefix.rstrip('/')}/{hashlib.sha256(data).hexdigest()[:32]}.{media_format}".lstrip("/")
+        s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+        return f"s3://{bucket}/{key}"
+    return upload
+
+
+def move_videos_to_s3(body, upload, bucket_owner=None):
+    """把请求中的内联视频上传到 S3 并改为 s3Location（原地修改）；返回上传的 URI 列表"""
+    uris = []
+    for info in estimate_request(body).media_of("video"):
+        uri = upload(_raw_bytes(info.block["source"]), info.block.get("format", "mp4"))
+        info.block["source"] = {"s3Location": {"uri": uri, **({"bucketOwner": bucket_owner} if bucket_owner else {})}}
+        uris.append(uri)
+    return uris
+
+
+def main():
+    parser = argparse.ArgumentParser(description='请求预检：载荷大小与输入 token 估算')
+    parser.add_argument('files', nargs='+', help='图片 / 视频文件，或 .txt 文本（作为提示词）')
+    parser.add_argument('--prompt', default='Describe this.', help='与媒体一起发送的问题')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0')
+    parser.add_argument('--max-tokens', type=int, default=300)
+    parser.add_argument('--calibration', help='压测生成的 token_calibration.json')
+    parser.add_argument('--batch-above-tokens', type=int, help='超过该输入 token 数的请求转批处理')
+    parser.add_argument('--s3', action='store_true', help='可以把视频上传到 S3')
+    args = parser.parse_args()
+
+    calibration = TokenCalibration(args.calibration) if args.calibration else None
+    if calibration:
+        print(f"📐 校准系数: " + ", ".join(f"{k} ×{v['factor']}" for k, v in calibration.to_dict().items()))
+    preflight = Preflight(args.model, calibration, batch_above_tokens=args.batch_above_tokens, s3=args.s3)
+    icons = {SEND: "✅", DOWNSCALE: "🖼️ ", S3: "☁️ ", BATCH: "📦", REJECT: "❌"}
+    for path in map(Path, args.files):
+        data = path.read_bytes()
+        media_format = path.suffix.lstrip(".").lower().replace("jpg", "jpeg")
+        if media_format == "txt":
+            content = [{"text": data.decode("utf-8")}]
+        else:
+            kind = "video" if media_format in ("mp4", "mov", "mkv", "webm", "flv", "mpeg", "mpg", "wmv", "3gp") \
+                else "image"
+            content = [{kind: {"format": media_format, "source": {"bytes": data}}}, {"text": args.prompt}]
+        body = {"messages": [{"role": "user", "content": content}], "inferenceConfig": {"maxTokens": args.max_tokens}}
+        decision = preflight.check(body)
+        tokens = ", ".join(f"{k} {v:,}" for k, v in decision.estimate.tokens.items() if v)
+        print(f"{icons[decision.action]} {path.name}: {decision}")
+        print(f"   估算（未校准）: {tokens or '0'} token")
+        for note in decision.estimate.notes:
+            print(f"   ⚠️  {note}")
+
+
+if __name__ == "__main__":
+    main()
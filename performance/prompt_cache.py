@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+提示词缓存（Nova prompt caching）
+- 在 messages-v1 请求体中插入 cachePoint：system 提示词之后和 / 或媒体块之后
+  缓存点之前的前缀在 TTL（约 5 分钟，命中时刷新）内再次出现即按缓存读取，延迟和输入计费都更低
+- 缓存点之后的内容（如带请求编号的问题）不影响命中，变化的部分应放在最后
+- 解析响应中的缓存读 / 写 token（invoke_model 与 converse 的字段名不同）
+- CacheStats 线程安全地汇总命中率与缓存读写 token
+"""
+
+import copy
+import threading
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+# none: 不缓存；system: system 提示词之后；media: 最后一个图片 / 视频 / 文档块之后；all: 两处都加
+CACHE_PLACEMENTS = ("none", "system", "media", "all")
+
+# 前缀短于此 token 数时模型不建立缓存
+MIN_CACHE_TOKENS = 1000
+
+MEDIA_BLOCKS = ("image", "video", "document")
+
+
+def add_cache_points(body, placement="media"):
+    """在请求体中插入缓存点（原地修改并返回 body）；没有对应内容时不插入"""
+    if placement not in CACHE_PLACEMENTS:
+        raise ValueError(f"未知缓存位置: {placement}（可选: {', '.join(CACHE_PLACEMENTS)}）")
+    if placement in ("system", "all") and body.get("system"):
+        body["system"].append(copy.deepcopy(CACHE_POINT))
+    if placement in ("media", "all") and body.get("messages"):
+        content = body["messages"][0]["content"]
+        media = [i for i, block in enumerate(content) if any(kind in block for kind in MEDIA_BLOCKS)]
+        if media:
+            content.insert(media[-1] + 1, copy.deepcopy(CACHE_POINT))
+    return body
+
+
+def cache_usage(usage):
+    """usage → (缓存读取 token, 缓存写入 token)"""
+    read = usage.get("cacheReadInputTokenCount", usage.get("cacheReadInputTokens")) or 0
+    write = usage.get("cacheWriteInputTokenCount", usage.get("cacheWriteInputTokens")) or 0
+    return read, write
+
+
+class CacheStats:
+    """缓存命中统计；inputTokens 不含缓存读写部分，三者之和为完整输入"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.input_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, input_tokens, cache_read_tokens, cache_write_tokens):
+        with self._lock:
+            self.requests += 1
+            self.hits += cache_read_tokens > 0
+            self.input_tokens += input_tokens
+            self.cache_read_tokens += cache_read_tokens
+            self.cache_write_tokens += cache_write_tokens
+
+    def to_dict(self):
+        total = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return {
+            "requests": self.requests,
+            "hit_rate": round(self.hits / self.requests, 4) if self.requests else None,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "cached_input_share": round(self.cache_read_tokens / total, 4) if total else None,
+        }
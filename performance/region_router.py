@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+延迟感知的自适应区域路由
+- 按 (区域, 推理配置文件, 服务层级) 维护 EWMA 延迟、错误率、限流率
+- 数据来源：压测脚本写出的 router_stats.json / CSV，以及线上调用实时反馈
+- 选择策略：power-of-two-choices（默认）或 least-outstanding-requests
+- 数据驻留约束（geo / 区域白名单）作为硬过滤条件
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 区域 → 推理配置文件（与 launch_multi_region.sh 保持一致）
+DEFAULT_REGION_PROFILES = {
+    "us-west-2": "us.amazon.nova-2-lite-v1:0",
+    "us-east-1": "us.amazon.nova-2-lite-v1:0",
+    "us-west-1": "global.amazon.nova-2-lite-v1:0",
+    "eu-west-1": "eu.amazon.nova-2-lite-v1:0",
+    "eu-central-1": "eu.amazon.nova-2-lite-v1:0",
+    "ap-northeast-1": "jp.amazon.nova-2-lite-v1:0",
+}
+
+# 跨区域推理配置文件前缀 → 数据驻留地理范围
+PROFILE_GEOS = {
+    "us.": "us",
+    "eu.": "eu",
+    "jp.": "jp",
+    "apac.": "apac",
+    "global.": "global",
+}
+
+EWMA_ALPHA = 0.2
+# 没有任何观测数据时的先验延迟（毫秒）
+PRIOR_LATENCY_MS = 1000.0
+
+
+def profile_geo(profile, region):
+    """推理配置文件对应的数据驻留范围；无前缀时按区域判断"""
+    for prefix, geo in PROFILE_GEOS.items():
+        if profile.startswith(prefix):
+            return geo
+    if region.startswith("us-"):
+        return "us"
+    if region.startswith("eu-"):
+        return "eu"
+    if region == "ap-northeast-1":
+        return "jp"
+    return "apac"
+
+
+class EndpointStats:
+    """单个 (区域, 配置文件, 层级) 端点的实时统计"""
+
+    def __init__(self, region, profile, tier):
+        self.region = region
+        self.profile = profile
+        self.tier = tier
+        self.geo = profile_geo(profile, region)
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.throttle_rate = 0.0
+        self.outstanding = 0
+        self.samples = 0
+
+    @property
+    def key(self):
+        return (self.region, self.profile, self.tier)
+
+    def record(self, latency_ms, success, throttled=False, weight=1):
+        """合并一次（或一批 weight 次）观测"""
+        alpha = 1 - (1 - EWMA_ALPHA) ** weight
+        if success and latency_ms is not None:
+            if self.ewma_latency is None:
+                self.ewma_latency = float(latency_ms)
+            else:
+                self.ewma_latency += alpha * (latency_ms - self.ewma_latency)
+        # 每次失败只计入一项：限流计入 throttle_rate，其余错误计入 error_rate（score 中两者相加）
+        self.error_rate += alpha * ((0.0 if success or throttled else 1.0) - self.error_rate)
+        self.throttle_rate += alpha * ((1.0 if throttled else 0.0) - self.throttle_rate)
+        self.samples += weight
+
+    def score(self, prior_latency):
+        """越小越好：延迟 × 在途请求数，再按失败概率放大"""
+        latency = self.ewma_latency if self.ewma_latency is not None else prior_latency
+        availability = max(0.05, 1.0 - self.error_rate - self.throttle_rate)
+        return latency * (self.outstanding + 1) / availability
+
+    def to_dict(self):
+        return {
+            "region": self.region,
+            "profile": self.profile,
+            "tier": self.tier,
+            "ewma_latency": self.ewma_latency,
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+            "samples": self.samples,
+        }
+
+
+class NoEligibleEndpoint(Exception):
+    """数据驻留约束过滤后没有可用端点"""
+
+
+class RegionRouter:
+    """按实时测量选择最佳端点"""
+
+    def __init__(self, region_profiles=None, tiers=("default",), policy="p2c", clients=None, seed=None):
+        if policy not in ("p2c", "least_outstanding"):
+            raise ValueError(f"未知路由策略: {policy}")
+        self.policy = policy
+        self.clients = clients or {}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        for region, profile in (region_profiles or DEFAULT_REGION_PROFILES).items():
+            for tier in tiers:
+                self.add_endpoint(region, profile, tier)
+
+    def add_endpoint(self, region, profile, tier):
+        with self._lock:
+            key = (region, profile, tier)
+            if key not in self._endpoints:
+                self._endpoints[key] = EndpointStats(region, profile, tier)
+            return self._endpoints[key]
+
+    def endpoints(self):
+        with self._lock:
+            return list(self._endpoints.values())
+
+    def record(self, region, profile, tier, latency_ms, success, throttled=False, weight=1):
+        """写入一次观测（压测或线上流量均调用此方法）"""
+        endpoint = self.add_endpoint(region, profile, tier)
+        with self._lock:
+            endpoint.record(latency_ms, success, throttled, weight)
+
+    def _candidates(self, tier, allowed_geos=None, allowed_regions=None):
+        candidates = []
+        for endpoint in self._endpoints.values():
+            if endpoint.tier != tier:
+                continue
+            if allowed_geos is not None and endpoint.geo not in allowed_geos:
+                continue
+            if allowed_regions is not None and endpoint.region not in allowed_regions:
+                continue
+            candidates.append(endpoint)
+        return candidates
+
+    def choose(self, tier="default", allowed_geos=None, allowed_regions=None):
+        """选择端点并占用一个在途名额，调用结束后必须调用 release()"""
+        with self._lock:
+            candidates = self._candidates(tier, allowed_geos, allowed_regions)
+            if not candidates:
+                raise NoEligibleEndpoint(f"没有满足约束的端点: tier={tier} geos={allowed_geos} regions={allowed_regions}")
+
+            known = sorted(e.ewma_latency for e in candidates if e.ewma_latency is not None)
+            prior = known[len(known) // 2] if known else PRIOR_LATENCY_MS
+
+            if self.policy == "least_outstanding":
+                best = min(candidates, key=lambda e: (e.outstanding, e.score(prior)))
+            elif len(candidates) == 1:
+                best = candidates[0]
+            else:
+                a, b = self._random.sample(candidates, 2)
+                best = a if a.score(prior) <= b.score(prior) else b
+
+            best.outstanding += 1
+            return best
+
+    def release(self, endpoint, latency_ms, success, throttled=False):
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.record(latency_ms, success, throttled)
+
+    def invoke(self, body, tier="default", allowed_geos=None, allowed_regions=None):
+        """线上调用入口：选端点 → invoke_model → 回写测量"""
+        endpoint = self.choose(tier, allowed_geos, allowed_regions)
+        params = {
+            "modelId": endpoint.profile,
+            "body": body,
+            "contentType": "application/json",
+            "accept": "application/json",
+        }
+        if tier != "default":
+            params["serviceTier"] = tier
+
+        start_time = time.time()
+        try:
+            response = self.clients[endpoint.region].invoke_model(**params)
+        except Exception as e:
+            error_msg = str(e)
+            throttled = "ThrottlingException" in error_msg or "429" in error_msg
+            self.release(endpoint, None, False, throttled)
+            raise
+        self.release(endpoint, (time.time() - start_time) * 1000, True)
+        return endpoint, response
+
+    def save_state(self, path):
+        """先写临时文件再替换，写到一半被杀也不会留下截断的 JSON"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([e.to_dict() for e in self.endpoints()], f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load_state(self, path):
+        """加载某个区域压测进程写出的 router_stats.json；文件损坏时保持空统计并返回 False"""
+        try:
+            with open(path) as f:
+                items = [(item["region"], item["profile"], item["tier"], item["ewma_latency"], item["error_rate"],
+                          item["throttle_rate"], item["samples"]) for item in json.load(f)]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️  路由统计 {path} 无法读取（{e}），从空统计开始")
+            return False
+        for region, profile, tier, ewma_latency, error_rate, throttle_rate, samples in items:
+            endpoint = self.add_endpoint(region, profile, tier)
+            with self._lock:
+                endpoint.ewma_latency = ewma_latency
+                endpoint.error_rate = error_rate
+                endpoint.throttle_rate = throttle_rate
+                endpoint.samples = samples
+        return True
+
+    def seed_from_csv(self, csv_path, region, profile):
+        """用压测 CSV（每批次一行）初始化统计；路由回写的是客户端测得的延迟，这里同样用 avg_client_latency"""
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                successful = int(row["successful"])
+                failed = int(row["failed"])
+                if successful:
+                    self.record(region, profile, row["tier"], float(row["avg_client_latency"]), True, weight=successful)
+                if failed:
+                    self.record(region, profile, row["tier"], None, False, weight=failed)
+
+
+def main():
+    """用本地替身端点（注入不同延迟）演示路由效果"""
+    from stand_in_client import StandInClient, StandInClientError
+
+    parser = argparse.ArgumentParser(description="延迟感知区域路由（本地替身演示）")
+    parser.add_argument("--policy", default="p2c", choices=["p2c", "least_outstanding"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--geo", action="append", help="允许的数据驻留范围，可多次指定（如 --geo us --geo global）")
+    parser.add_argument("--state", action="append", default=[], help="预加载 router_stats.json，可多次指定")
+    args = parser.parse_args()
+
+    injected = {
+        "us-west-2": 300,
+        "us-east-1": 150,
+        "us-west-1": 450,
+        "eu-west-1": 200,
+        "eu-central-1": 600,
+        "ap-northeast-1": 250,
+    }
+    clients = {region: StandInClient(region=region, latency_ms=latency / 10, jitter_ms=latency / 50, capacity=4)
+               for region, latency in injected.items()}
+    router = RegionRouter(policy=args.policy, clients=clients, seed=0)
+    for path in args.state:
+        router.load_state(path)
+
+    allowed_geos = set(args.geo) if args.geo else None
+    body = json.dumps({"schemaVersion": "messages-v1", "messages": [{"role": "user", "content": [{"text": "ping"}]}]})
+
+    def call(_):
+        try:
+            router.invoke(body, allowed_geos=allowed_geos)
+        except StandInClientError:
+            pass
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(call, range(args.requests)))
+    elapsed = time.time() - start_time
+
+    print(f"\n{'='*80}")
+    print(f"路由策略: {args.policy} | 请求数: {args.requests} | 并发: {args.concurrency} | 耗时: {elapsed:.1f}s")
+    print(f"{'='*80}")
+    for endpoint in sorted(router.endpoints(), key=lambda e: e.region):
+        calls = clients[endpoint.region].calls
+        latency = f"{endpoint.ewma_latency:6.0f}ms" if endpoint.ewma_latency is not None else "     n/a"
+        print(f"  {endpoint.region:15} {endpoint.geo:7} 调用 {calls:4d}  EWMA {latency}  "
+              f"错误 {endpoint.error_rate:.2%}  限流 {endpoint.throttle_rate:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+逐请求结果的紧凑记录与无锁聚合
+- RequestRecord：__slots__ 记录，没有逐对象 __dict__；to_dict() 转回原来的结果字典（供自适应 / A/B 等模式）
+- BatchAccumulator：每个工作线程一份 threading.local 累加器，请求结束时只更新本线程的计数，
+  批次结束时由主线程合并，热路径上没有锁，也不再对结果列表做多次 sum()
+- RecordSpillBuffer：按列存放在 array 中的有界原始记录缓冲，写满或超过最长驻留时间即追加到磁盘 CSV 并清空，
+  多日运行中内存占用保持平稳
+
+用法（查看溢写文件概要）:
+    python request_records.py concurrent_96h_data_us_west_2/requests_us_west_2_*.csv
+"""
+
+import argparse
+import csv
+import threading
+import time
+from array import array
+from pathlib import Path
+
+DEFAULT_BUFFER_RECORDS = 10000
+DEFAULT_MAX_BUFFER_AGE_SECONDS = 60
+
+# 溢写 CSV 的列顺序
+RECORD_FIELDS = ["finished_at", "tier", "concurrency", "batch_id", "worker", "success", "attempts",
+                 "client_latency", "server_latency", "input_tokens", "output_tokens",
+                 "cache_read_tokens", "cache_write_tokens", "error"]
+
+# 数值列及其 array 类型码
+_NUMERIC_COLUMNS = [("finished_at", "d"), ("concurrency", "l"), ("batch_id", "l"), ("worker", "l"),
+                    ("success", "b"), ("attempts", "b"), ("client_latency", "l"), ("server_latency", "l"),
+                    ("input_tokens", "l"), ("output_tokens", "l"), ("cache_read_tokens", "l"),
+                    ("cache_write_tokens", "l")]
+
+# 求批次平均值的字段（只统计成功请求）
+_SUM_FIELDS = ("server_latency", "client_latency", "input_tokens", "output_tokens",
+               "cache_read_tokens", "cache_write_tokens")
+
+
+class RequestRecord:
+    """单次请求的结果；失败时计时和用量字段为 0"""
+
+    __slots__ = ("finished_at", "success", "attempts", "client_latency", "server_latency", "input_tokens",
+                 "output_tokens", "cache_read_tokens", "cache_write_tokens", "error")
+
+    def __init__(self, success, attempts, client_latency=0, server_latency=0, input_tokens=0, output_tokens=0,
+                 cache_read_tokens=0, cache_write_tokens=0, error=None):
+        self.finished_at = time.time()
+        self.success = success
+        self.attempts = attempts
+        self.client_latency = client_latency
+        self.server_latency = server_latency
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.error = error
+
+    def to_dict(self):
+        if not self.success:
+            return {"success": False, "error": self.error, "attempts": self.attempts}
+        return {
+            "success": True,
+            "client_latency": self.client_latency,
+            "server_latency": self.server_latency,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "attempts": self.attempts,
+        }
+
+
+class _ThreadTotals:
+    """一个工作线程的累加值，只被该线程写入"""
+
+    __slots__ = ("successful", "failed", "sums", "records")
+
+    def __init__(self):
+        self.successful = 0
+        self.failed = 0
+        self.sums = [0] * len(_SUM_FIELDS)
+        self.records = []
+
+
+class BatchAccumulator:
+    """一个批次的结果累加；keep_records=True 时每个线程同时保留 (worker, 记录) 供溢写"""
+
+    def __init__(self, keep_records=False):
+        self.keep_records = keep_records
+        self._local = threading.local()
+        self._threads = []
+
+    def _totals(self):
+        totals = getattr(self._local, "totals", None)
+        if totals is None:
+            totals = self._local.totals = _ThreadTotals()
+            # 每个线程只登记一次；list.append 在 GIL 下是原子操作
+            self._threads.append(totals)
+        return totals
+
+    def add(self, record, worker=0):
+        totals = self._totals()
+        if record.success:
+            totals.successful += 1
+            sums = totals.sums
+            sums[0] += record.server_latency
+            sums[1] += record.client_latency
+            sums[2] += record.input_tokens
+            sums[3] += record.output_tokens
+            sums[4] += record.cache_read_tokens
+            sums[5] += record.cache_write_tokens
+        else:
+            totals.failed += 1
+        if self.keep_records:
+            totals.records.append((worker, record))
+
+    def records(self):
+        """合并后的 (worker, 记录)，需在所有工作线程结束后调用"""
+        return [item for totals in self._threads for item in totals.records]
+
+    def merge(self):
+        """所有工作线程结束后调用：成功 / 失败数和各字段的成功请求平均值"""
+        successful = sum(t.successful for t in self._threads)
+        failed = sum(t.failed for t in self._threads)
+        result = {"successful": successful, "failed": failed}
+        for i, field in enumerate(_SUM_FIELDS):
+            total = sum(t.sums[i] for t in self._threads)
+            result[f"avg_{field}"] = total / successful if successful else 0
+        return result
+
+
+class RecordSpillBuffer:
+    """有界的逐请求记录缓冲：数值按列存在 array 中，层级和错误只存引用 / 稀疏保存"""
+
+    def __init__(self, path, capacity=DEFAULT_BUFFER_RECORDS, max_age_seconds=DEFAULT_MAX_BUFFER_AGE_SECONDS):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.max_age_seconds = max_age_seconds
+        self.spilled = 0
+        self.spills = 0
+        self._columns = {name: array(code) for name, code in _NUMERIC_COLUMNS}
+        self._tiers = []
+        self._errors = {}
+        self._last_spill = time.time()
+
+    def __len__(self):
+        return len(self._tiers)
+
+    def extend(self, tier, concurrency, batch_id, items):
+        """追加一个批次的 (worker, 记录)；写满或驻留过久时溢写"""
+        columns = self._columns
+        for worker, record in items:
+            if record.error:
+                self._errors[len(self._tiers)] = record.error[:200]
+            self._tiers.append(tier)
+            columns["finished_at"].append(record.finished_at)
+            columns["concurrency"].append(concurrency)
+            columns["batch_id"].append(batch_id)
+            columns["worker"].append(worker)
+            columns["success"].append(record.success)
+            columns["attempts"].append(record.attempts)
+            columns["client_latency"].append(record.client_latency)
+            columns["server_latency"].append(record.server_latency)
+            columns["input_tokens"].append(record.input_tokens)
+            columns["output_tokens"].append(record.output_tokens)
+            columns["cache_read_tokens"].append(record.cache_read_tokens)
+            columns["cache_write_tokens"].append(record.cache_write_tokens)
+        if len(self) >= self.capacity or time.time() - self._last_spill >= self.max_age_seconds:
+            self.spill()
+
+    def spill(self):
+        """把缓冲内容追加到 CSV 并清空（列数组原地清空，已分配的空间复用）"""
+        self._last_spill = time.time()
+        count = len(self)
+        if not count:
+            return
+        new_file = not self.path.exists()
+        columns = [self._columns[name] if name in self._columns else None for name in RECORD_FIELDS]
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(RECORD_FIELDS)
+            for i in range(count):
+                row = [column[i] if column is not None else None for column in columns]
+                row[0] = round(row[0], 3)
+                row[1] = self._tiers[i]
+                row[5] = bool(row[5])
+                row[-1] = self._errors.get(i, "")
+                writer.writerow(row)
+        for column in self._columns.values():
+            del column[:]
+        self._tiers.clear()
+        self._errors.clear()
+        self.spilled += count
+        self.spills += 1
+
+    def close(self):
+        self.spill()
+
+
+def summarize_spill_file(path):
+    """按层级汇总溢写文件：请求数、成功率、客户端延迟 p50 / p95（流式读取）"""
+    from tier_scheduler import percentile
+    tiers = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            entry = tiers.setdefault(row["tier"], {"requests": 0, "failed": 0, "latencies": array("l")})
+            entry["requests"] += 1
+            if row["success"] == "True":
+                entry["latencies"].append(int(row["client_latency"]))
+            else:
+                entry["failed"] += 1
+    return {tier: {"requests": e["requests"], "failed": e["failed"],
+                   "p50_client_latency": percentile(e["latencies"], 50),
+                   "p95_client_latency": percentile(e["latencies"], 95)} for tier, e in tiers.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='逐请求记录溢写文件概要')
+    parser.add_argument('files', nargs='+', help='--request-log 生成的 CSV')
+    args = parser.parse_args()
+    for path in args.files:
+        print(f"📄 {path}")
+        for tier, s in summarize_spill_file(path).items():
+            print(f"  {tier:8} 请求 {s['requests']:>8,} | 失败 {s['failed']:>6,} | "
+                  f"p50 {s['p50_client_latency'] or 0:>6}ms | p95 {s['p95_client_latency'] or 0:>6}ms")
+
+
+if __name__ == "__main__":
+    main()
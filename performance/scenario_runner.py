@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+场景化压测：YAML / TOML 场景文件 + 套件运行器
+- 场景声明负载组合（text / image / video / embedding / streaming 及权重）、
+  到达模式（constant / poisson / ramp / burst / closed / batch）、阶段时长和 SLO 断言
+- 可对真实 Bedrock 端点或本地 StandInClient 运行（--stand-in / --live 覆盖场景配置）
+- 每次运行输出机器可读的 JSON 结果（passed 字段 + 退出码），并与保存的基线比较
+
+用法:
+    python scenario_runner.py scenarios/                      # 运行目录下所有场景
+    python scenario_runner.py scenarios/mixed_smoke.toml --time-scale 0.1
+    python scenario_runner.py scenarios/image_96h.yaml --update-baseline
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from stand_in_client import StandInClient
+from tier_scheduler import percentile
+from workloads import Workload
+
+SCENARIO_SUFFIXES = (".yaml", ".yml", ".toml")
+ARRIVAL_PATTERNS = ("constant", "poisson", "ramp", "burst", "closed", "batch")
+
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_TOLERANCE = 0.10
+# 错误率基线通常接近 0，用绝对容差比较
+ERROR_RATE_TOLERANCE = 0.005
+# 样本太少时分位数波动大，不参与基线比较
+MIN_COMPARE_REQUESTS = 50
+
+# 与基线比较的指标；True 表示越小越好
+COMPARE_METRICS = {
+    "p50_latency_ms": True,
+    "p95_latency_ms": True,
+    "p99_latency_ms": True,
+    "p95_ttft_ms": True,
+    "error_rate": True,
+    "throughput_rps": False,
+}
+
+
+def load_scenario(path):
+    """读取 YAML 或 TOML 场景文件"""
+    path = Path(path)
+    if path.suffix == ".toml":
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    try:
+        import yaml
+    except ImportError:
+        raise SystemExit("❌ 读取 YAML 场景需要 PyYAML: pip install pyyaml（或改用 .toml 场景）")
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def find_scenarios(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix in SCENARIO_SUFFIXES))
+        else:
+            files.append(path)
+    return files
+
+
+def make_client(scenario, endpoint):
+    if endpoint == "stand-in":
+        return StandInClient(region=scenario.get("region", "local"), **scenario.get("stand_in", {}))
+    import boto3
+    return boto3.client("bedrock-runtime", region_name=scenario.get("region", "us-west-2"))
+
+
+def arrival_offsets(phase, duration, rng):
+    """开环到达时间（相对阶段开始的秒数）"""
+    pattern = phase.get("arrival", "constant")
+    rate = float(phase.get("rate", 1))
+    t = 0.0
+    if pattern == "burst":
+        interval = float(phase.get("interval_s", 10))
+        while t < duration:
+            for _ in range(int(phase.get("burst_size", 10))):
+                yield t
+            t += interval
+        return
+    rate_from = float(phase.get("rate_from", rate))
+    while True:
+        current = rate_from + (rate - rate_from) * t / duration if pattern == "ramp" else rate
+        current = max(current, 1e-3)
+        t += rng.expovariate(current) if pattern == "poisson" else 1 / current
+        if t >= duration:
+            return
+        yield t
+
+
+class ScenarioRun:
+    """执行单个场景的全部阶段"""
+
+    def __init__(self, scenario, base_dir, client, time_scale=1.0, seed=None, on_result=None, keep_results=True):
+        self.scenario = scenario
+        self.base_dir = base_dir
+        self.client = client
+        self.time_scale = time_scale
+        self.on_result = on_result
+        self.keep_results = keep_results
+        seed = scenario.get("seed") if seed is None else seed
+        # 到达时间和负载抽样各用一个随机源，固定 seed 时两者都可复现
+        self.rng = random.Random(seed)
+        self.arrival_rng = random.Random(None if seed is None else seed + 1)
+        self.model = scenario.get("model")
+        self.results = []  # [(phase_name, RequestResult)]
+        self.dropped = {}
+        self.phase_durations = {}
+        self._lock = threading.Lock()
+        self._request_ids = iter(range(1, sys.maxsize))
+        self._workload_cache = {}
+
+    def _workloads(self, phase):
+        specs = phase.get("workloads", self.scenario.get("workloads"))
+        if not specs:
+            raise ValueError(f"阶段 {phase.get('name')} 未声明任何负载")
+        key = id(specs)
+        if key not in self._workload_cache:
+            self._workload_cache[key] = [Workload(spec, self.base_dir, self.model) for spec in specs]
+        return self._workload_cache[key]
+
+    def _one(self, phase_name, workloads, weights, tier):
+        with self._lock:
+            workload = self.rng.choices(workloads, weights)[0]
+            request_id = next(self._request_ids)
+        result = workload.run(self.client, tier, request_id)
+        if self.keep_results:
+            with self._lock:
+                self.results.append((phase_name, result))
+        if self.on_result:
+            self.on_result(phase_name, result)
+
+    def run_phase(self, phase):
+        name = phase.get("name", f"phase{len(self.phase_durations) + 1}")
+        pattern = phase.get("arrival", "constant")
+        if pattern not in ARRIVAL_PATTERNS:
+            raise ValueError(f"未知到达模式: {pattern}（可选: {', '.join(ARRIVAL_PATTERNS)}）")
+        duration = float(phase["duration_s"]) * self.time_scale
+        tier = phase.get("tier", self.scenario.get("tier", "default"))
+        workloads = self._workloads(phase)
+        weights = [w.weight for w in workloads]
+
+        print(f"▶️  阶段 {name}: {pattern}, {duration:.0f}s, 层级 {tier}, "
+              f"负载 {', '.join(f'{w.name}×{w.weight:g}' for w in workloads)}")
+        start = time.time()
+        if pattern == "closed":
+            # 闭环：固定并发，每个 worker 完成即发下一个（对应原 96h 测试的批次模式）
+            deadline = start + duration
+
+            def loop():
+                while time.time() < deadline:
+                    self._one(name, workloads, weights, tier)
+
+            threads = [threading.Thread(target=loop) for _ in range(int(phase.get("concurrency", 1)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elif pattern == "batch":
+            # 批次：每 interval_s 一轮，各负载按声明顺序各发一批 concurrency 个并发请求，整批完成再发下一个负载；
+            # 一轮超时则下一轮立即开始（对应原 96h 测试：每分钟一轮，三个层级依次各一批）。忽略负载权重
+            interval = float(phase.get("interval_s", 60)) * self.time_scale
+            concurrency = int(phase.get("concurrency", 1))
+            round_start = start
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                while round_start < start + duration:
+                    for workload in workloads:
+                        list(pool.map(lambda _: self._one(name, [workload], [1], tier), range(concurrency)))
+                    round_start = max(round_start + interval, time.time())
+                    time.sleep(max(0.0, round_start - time.time()))
+        else:
+            # 开环：按计划时间发出；在途达到上限时丢弃而不是排队，避免掩盖真实延迟
+            max_in_flight = int(phase.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+            slots = threading.BoundedSemaphore(max_in_flight)
+            dropped = 0
+
+            def task():
+                try:
+                    self._one(name, workloads, weights, tier)
+                finally:
+                    slots.release()
+
+            with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+                for offset in arrival_offsets(phase, duration, self.arrival_rng):
+                    delay = start + offset - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if not slots.acquire(blocking=False):
+                        dropped += 1
+                        continue
+                    pool.submit(task)
+            self.dropped[name] = dropped
+        self.phase_durations[name] = time.time() - start
+
+    def run(self):
+        for phase in self.scenario["phases"]:
+            self.run_phase(phase)
+        return self
+
+
+def summarize(results, duration, dropped=0):
+    """一组请求结果 → 指标字典"""
+    ok = [r for r in results if r.ok]
+    latencies = [r.latency_ms for r in ok]
+    ttfts = [r.ttft_ms for r in ok if r.ttft_ms is not None]
+    total = len(results)
+    summary = {
+        "requests": total,
+        "successful": len(ok),
+        "failed": total - len(ok),
+        "throttled": sum(r.throttled for r in results),
+        "dropped": dropped,
+        "error_rate": (total - len(ok)) / total if total else 0.0,
+        "mean_latency_ms": sum(latencies) / len(latencies) if latencies else None,
+        "p50_latency_ms": percentile(latencies, 50),
+        "p95_latency_ms": percentile(latencies, 95),
+        "p99_latency_ms": percentile(latencies, 99),
+        "p50_ttft_ms": percentile(ttfts, 50),
+        "p95_ttft_ms": percentile(ttfts, 95),
+        "throughput_rps": len(ok) / duration if duration else 0.0,
+        "tokens_per_sec": sum(r.input_tokens + r.cache_read_tokens + r.cache_write_tokens + r.output_tokens
+                              for r in ok) / duration if duration else 0.0,
+        "cache_hit_rate": sum(r.cache_read_tokens > 0 for r in ok) / len(ok) if ok else None,
+        "cache_read_tokens": sum(r.cache_read_tokens for r in ok),
+        "cache_write_tokens": sum(r.cache_write_tokens for r in ok),
+    }
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def summarize_run(run):
+    duration = sum(run.phase_durations.values())
+    results = [r for _, r in run.results]
+    by_workload = {}
+    for r in results:
+        by_workload.setdefault(r.workload, []).append(r)
+    return {
+        "overall": summarize(results, duration, sum(run.dropped.values())),
+        "workloads": {name: summarize(items, duration) for name, items in sorted(by_workload.items())},
+        "phases": {name: summarize([r for p, r in run.results if p == name], run.phase_durations[name],
+                                   run.dropped.get(name, 0))
+                   for name in run.phase_durations},
+    }
+
+
+def scope_summary(summary, assertion):
+    if "workload" in assertion:
+        return summary["workloads"].get(assertion["workload"]), f"workload={assertion['workload']}"
+    if "phase" in assertion:
+        return summary["phases"].get(assertion["phase"]), f"phase={assertion['phase']}"
+    return summary["overall"], "overall"
+
+
+def check_slos(summary, assertions):
+    """SLO 断言：{metric, max|min, workload? / phase?}"""
+    checks = []
+    for assertion in assertions:
+        metric = assertion["metric"]
+        scoped, scope = scope_summary(summary, assertion)
+        value = scoped.get(metric) if scoped else None
+        if value is None:
+            passed = False
+        else:
+            passed = ("max" not in assertion or value <= assertion["max"]) and \
+                     ("min" not in assertion or value >= assertion["min"])
+        checks.append({
+            "scope": scope, "metric": metric, "value": value,
+            "max": assertion.get("max"), "min": assertion.get("min"), "passed": passed,
+        })
+    return checks
+
+
+def compare_baseline(summary, baseline, tolerance):
+    """与基线逐项比较；劣化超过容差记为回归"""
+    comparisons = []
+    scopes = [("overall", summary["overall"], baseline.get("overall", {}))]
+    scopes += [(f"workload={name}", current, baseline.get("workloads", {}).get(name, {}))
+               for name, current in summary["workloads"].items()]
+    for scope, current, previous in scopes:
+        for metric, lower_is_better in COMPARE_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None or min(current["requests"], previous["requests"]) < MIN_COMPARE_REQUESTS:
+                continue
+            if metric == "error_rate":
+                worse = new - old > ERROR_RATE_TOLERANCE
+                change = new - old
+            else:
+                change = (new - old) / old if old else 0.0
+                worse = change > tolerance if lower_is_better else change < -tolerance
+            comparisons.append({
+                "scope": scope, "metric": metric, "baseline": old, "current": new,
+                "change": round(change, 4), "regression": worse,
+            })
+    return comparisons
+
+
+def baseline_path(scenario, scenario_file, baseline_dir):
+    configured = scenario.get("baseline", {}).get("path")
+    if configured:
+        return scenario_file.parent / configured
+    return Path(baseline_dir or scenario_file.parent / "baselines") / f"{scenario['name']}.json"
+
+
+def run_scenario(scenario_file, endpoint=None, time_scale=1.0, baseline_dir=None, update_baseline=False,
+                 processes=1):
+    scenario = load_scenario(scenario_file)
+    scenario.setdefault("name", scenario_file.stem)
+    endpoint = endpoint or scenario.get("endpoint", "live")
+
+    print(f"\n{'='*80}")
+    print(f"🎬 场景: {scenario['name']} ({scenario_file})")
+    print(f"   端点: {endpoint} | 模型: {scenario.get('model')} | 区域: {scenario.get('region', '-')}"
+          f" | 进程: {processes}")
+    print(f"{'='*80}")
+
+    started = datetime.now()
+    if processes > 1:
+        from multiprocess_load import ShardedScenarioRun
+        run = ShardedScenarioRun(scenario, scenario_file.parent, endpoint, processes, time_scale).run()
+    else:
+        run = ScenarioRun(scenario, scenario_file.parent, make_client(scenario, endpoint), time_scale).run()
+    summary = summarize_run(run)
+    slo_checks = check_slos(summary, scenario.get("slo", []))
+
+    baseline_config = scenario.get("baseline", {})
+    path = baseline_path(scenario, scenario_file, baseline_dir)
+    comparisons = []
+    if path.exists() and not update_baseline:
+        with open(path) as f:
+            comparisons = compare_baseline(summary, json.load(f),
+                                           float(baseline_config.get("tolerance", DEFAULT_TOLERANCE)))
+    regressions = [c for c in comparisons if c["regression"]]
+    fail_on_regression = baseline_config.get("fail_on_regression", True)
+    passed = all(c["passed"] for c in slo_checks) and not (fail_on_regression and regressions)
+
+    if update_baseline:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"scenario": scenario["name"], "recorded_at": started.isoformat(), **summary}, f, indent=2)
+        print(f"💾 基线已更新: {path}")
+
+    overall = summary["overall"]
+    print(f"\n📊 {overall['requests']} 请求 | 成功 {overall['successful']} | 失败 {overall['failed']} "
+          f"(限流 {overall['throttled']}) | 丢弃 {overall['dropped']}")
+    print(f"   p50 {overall['p50_latency_ms']}ms | p95 {overall['p95_latency_ms']}ms | "
+          f"p99 {overall['p99_latency_ms']}ms | {overall['throughput_rps']:.2f} req/s")
+    if overall["cache_read_tokens"] or overall["cache_write_tokens"]:
+        print(f"   提示词缓存: 命中率 {overall['cache_hit_rate']:.1%} | 读取 {overall['cache_read_tokens']:,} / "
+              f"写入 {overall['cache_write_tokens']:,} token")
+    for check in slo_checks:
+        bound = f"<= {check['max']}" if check["max"] is not None else f">= {check['min']}"
+        print(f"   {'✅' if check['passed'] else '❌'} SLO {check['scope']} {check['metric']} = {check['value']} ({bound})")
+    for c in regressions:
+        print(f"   ⚠️  回归 {c['scope']} {c['metric']}: {c['baseline']} → {c['current']} ({c['change']:+.1%})")
+    print(f"{'✅ PASS' if passed else '❌ FAIL'}: {scenario['name']}")
+
+    return {
+        "scenario": scenario["name"],
+        "file": str(scenario_file),
+        "endpoint": endpoint,
+        "started": started.isoformat(),
+        "time_scale": time_scale,
+        "processes": processes,
+        "passed": passed,
+        "slo": slo_checks,
+        "baseline": {"path": str(path), "comparisons": comparisons, "regressions": len(regressions)},
+        "summary": summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='场景化压测套件运行器')
+    parser.add_argument('scenarios', nargs='+', help='场景文件（.yaml/.yml/.toml）或包含场景文件的目录')
+    endpoint = parser.add_mutually_exclusive_group()
+    endpoint.add_argument('--stand-in', dest='endpoint', action='store_const', const='stand-in',
+                          help='强制使用本地替身端点')
+    endpoint.add_argument('--live', dest='endpoint', action='store_const', const='live',
+                          help='强制使用真实 Bedrock 端点')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='阶段时长缩放（如 0.1 做快速冒烟）')
+    parser.add_argument('--baseline-dir', help='基线目录 (默认: 场景文件旁的 baselines/)')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--processes', type=int, default=1, help='负载分片到多个工作进程（绕开 GIL，默认: 1）')
+    parser.add_argument('--output', help='套件结果 JSON 路径 (默认: scenario_results/suite_<时间>.json)')
+    args = parser.parse_args()
+
+    files = find_scenarios(args.scenarios)
+    if not files:
+        print("❌ 未找到场景文件")
+        sys.exit(2)
+
+    results = [run_scenario(f, args.endpoint, args.time_scale, args.baseline_dir, args.update_baseline,
+                            args.processes)
+               for f in files]
+    suite = {"passed": all(r["passed"] for r in results), "scenarios": results}
+
+    output = Path(args.output or f"scenario_results/suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(suite, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'='*80}")
+    print(f"{'✅' if suite['passed'] else '❌'} 套件: {sum(r['passed'] for r in results)}/{len(results)} 场景通过")
+    print(f"📁 结果: {output}")
+    sys.exit(0 if suite["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+本地替身 Bedrock Runtime 客户端
+- 接口与 boto3 bedrock-runtime 客户端的 invoke_model / invoke_model_with_response_stream / converse / converse_stream 兼容
+- 可注入延迟、抖动、限流和错误，用于离线测试路由 / 调度 / 并发控制
+- 模拟容量：在途请求超过容量后延迟线性上升，超过两倍容量开始限流
+- 可传入 responder(request_body) 按请求内容生成回复，此时生成时间按输出 token 数计入延迟
+- unary_generation=True 时非流式调用也计入生成时间，与流式调用的总耗时可比
+- 模拟提示词缓存：cachePoint 之前的前缀在 TTL 内重复出现记为缓存读取，输入 token 和预填充延迟相应减少
+"""
+
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+
+from prompt_cache import MIN_CACHE_TOKENS
+
+# 各服务层级相对 default 的延迟倍数
+TIER_LATENCY_FACTOR = {
+    "flex": 1.6,
+    "default": 1.0,
+    "priority": 0.7,
+}
+
+# 输入全部命中缓存时延迟最多减少的比例（只省预填充，生成时间不变）
+CACHE_READ_LATENCY_SAVING = 0.3
+DEFAULT_CACHE_TTL_SECONDS = 300
+
+
+class StandInClientError(Exception):
+    """替身客户端抛出的错误，消息格式与 botocore ClientError 一致"""
+
+    def __init__(self, code, operation="InvokeModel", message=""):
+        self.code = code
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message}")
+
+
+class _StreamBody:
+    """流式响应体：迭代结束、中途关闭或从未迭代就被丢弃时，释放一次在途计数"""
+
+    def __init__(self, events, release):
+        self._events = events
+        self._release = release
+
+    def _done(self):
+        release, self._release = self._release, None
+        if release:
+            release()
+
+    def __iter__(self):
+        try:
+            yield from self._events
+        finally:
+            self._done()
+
+    def __del__(self):
+        self._done()
+
+
+class StandInClient:
+    """带注入延迟的本地替身客户端"""
+
+    def __init__(self, region="local", latency_ms=800, jitter_ms=100,
+                 throttle_rate=0.0, error_rate=0.0, capacity=None,
+                 input_tokens=1300, output_tokens=100, token_interval_ms=10, seed=None, responder=None,
+                 cache_ttl_seconds=DEFAULT_CACHE_TTL_SECONDS, unary_generation=False):
+        self.region = region
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.token_interval_ms = token_interval_ms
+        self.responder = responder
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.unary_generation = unary_generation
+        self.calls = 0
+        self._prompt_cache = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def _enter(self, operation):
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            in_flight = self._in_flight
+            roll = self._random.random()
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+
+        overloaded = self.capacity is not None and in_flight > 2 * self.capacity
+        if overloaded or roll < self.throttle_rate:
+            self._exit()
+            raise StandInClientError("ThrottlingException", operation, "Too many requests, please wait before trying again.")
+        if roll < self.throttle_rate + self.error_rate:
+            self._exit()
+            raise StandInClientError("ServiceUnavailableException", operation, "Service unavailable.")
+        return in_flight, jitter
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _latency_ms(self, tier, in_flight, jitter):
+        latency = self.latency_ms * TIER_LATENCY_FACTOR.get(tier, 1.0) + jitter
+        if self.capacity is not None and in_flight > self.capacity:
+            # 超出容量的部分排队，延迟线性增长
+            latency *= 1 + (in_flight - self.capacity) / self.capacity
+        return max(1, int(latency))
+
+    def _cache_usage(self, body, input_tokens):
+        """按最后一个 cachePoint 之前的请求体前缀模拟缓存，返回 (读取, 写入) token"""
+        end = body.rfind('{"cachePoint"')
+        if end < 0:
+            return 0, 0
+        tokens = int(input_tokens * end / len(body))
+        if tokens < MIN_CACHE_TOKENS:
+            return 0, 0
+        key = hashlib.sha256(body[:end].encode("utf-8")).hexdigest()
+        now = time.time()
+        with self._lock:
+            hit = self._prompt_cache.get(key, 0) > now
+            # 命中也刷新 TTL
+            self._prompt_cache[key] = now + self.cache_ttl_seconds
+        return (tokens, 0) if hit else (0, tokens)
+
+    def _usage(self, reply, cache_read, cache_write, converse=False):
+        # converse 的缓存字段名为 cacheRead/WriteInputTokens，invoke_model 为 ...TokenCount
+        suffix = "" if converse else "Count"
+        input_tokens = reply["input_tokens"] - cache_read - cache_write
+        return {
+            "inputTokens": input_tokens,
+            "outputTokens": reply["output_tokens"],
+            "totalTokens": reply["input_tokens"] + reply["output_tokens"],
+            f"cacheReadInputToken{suffix}": cache_read,
+            f"cacheWriteInputToken{suffix}": cache_write,
+        }
+
+    def _stream_events(self, first_token_ms, reply, cache_read, cache_write, wrap, converse=False):
+        """首个 token 前等待注入延迟，之后按固定间隔输出；wrap 把事件包装成对应接口的格式
+        在途计数由外层的 _StreamBody 释放"""
+        start = time.time()
+        time.sleep(first_token_ms / 1000)
+        yield wrap({"messageStart": {"role": "assistant"}})
+        for i in range(reply["output_tokens"]):
+            if i:
+                time.sleep(self.token_interval_ms / 1000)
+            yield wrap({"contentBlockDelta": {"delta": {"text": f"t{i} "}, "contentBlockIndex": 0}})
+        yield wrap({"contentBlockStop": {"contentBlockIndex": 0}})
+        yield wrap({"messageStop": {"stopReason": "end_turn"}})
+        latency_ms = int((time.time() - start) * 1000)
+        if converse:
+            yield wrap({"metadata": {"usage": self._usage(reply, cache_read, cache_write, converse),
+                                     "metrics": {"latencyMs": latency_ms}}})
+        else:
+            # invoke_model 流的最后一个分块附带服务端计时
+            yield wrap({"metadata": {"usage": self._usage(reply, cache_read, cache_write)},
+                        "amazon-bedrock-invocationMetrics": {
+                            "inputTokenCount": reply["input_tokens"], "outputTokenCount": reply["output_tokens"],
+                            "invocationLatency": latency_ms, "firstByteLatency": int(first_token_ms)}})
+
+    def _open_stream(self, operation, tier, body, wrap, converse=False):
+        """流式调用的公共部分：在途计数从发起持续到流被消费完；创建流时出错或流从未被迭代也会释放"""
+        in_flight, jitter = self._enter(operation)
+        release = self._exit
+        try:
+            first_token_ms = self._latency_ms(tier, in_flight, jitter)
+            reply = {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+            cache_read, cache_write = self._cache_usage(body, self.input_tokens)
+            first_token_ms *= 1 - CACHE_READ_LATENCY_SAVING * cache_read / max(1, self.input_tokens)
+            stream = _StreamBody(self._stream_events(first_token_ms, reply, cache_read, cache_write, wrap, converse),
+                                 release)
+            release = None
+            return stream
+        finally:
+            if release:
+                release()
+
+    @staticmethod
+    def _converse_body(messages, system):
+        """converse 参数序列化成字符串，供缓存模拟按前缀比较（图片字节以摘要代替）"""
+        return json.dumps({"system": system or [], "messages": messages},
+                          default=lambda b: hashlib.sha256(b).hexdigest())
+
+    @staticmethod
+    def _converse_tier(serviceTier):
+        return serviceTier.get("type", "default") if isinstance(serviceTier, dict) else "default"
+
+    def invoke_model(self, modelId, body, serviceTier="default", **kwargs):
+        """模拟 invoke_model，返回结构与 boto3 一致"""
+        in_flight, jitter = self._enter("InvokeModel")
+        reply = {"text": f"stand-in response from {self.region}",
+                 "input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+        try:
+            latency = self._latency_ms(serviceTier, in_flight, jitter)
+            if self.responder:
+                reply.update(self.responder(json.loads(body)))
+            if self.responder or self.unary_generation:
+                latency += reply["output_tokens"] * self.token_interval_ms
+            cache_read, cache_write = self._cache_usage(body, reply["input_tokens"])
+            latency = int(latency * (1 - CACHE_READ_LATENCY_SAVING * cache_read / max(1, reply["input_tokens"])))
+            time.sleep(latency / 1000)
+        finally:
+            self._exit()
+
+        model_response = {
+            "output": {"message": {"role": "assistant", "content": [{"text": reply["text"]}]}},
+            "stopReason": "end_turn",
+            "usage": self._usage(reply, cache_read, cache_write),
+        }
+        return {
+            "body": io.BytesIO(json.dumps(model_response).encode("utf-8")),
+            "contentType": "application/json",
+            "ResponseMetadata": {
+                "HTTPStatusCode": 200,
+                "HTTPHeaders": {"x-amzn-bedrock-invocation-latency": str(latency)},
+            },
+        }
+
+    def invoke_model_with_response_stream(self, modelId, body, serviceTier="default", **kwargs):
+        """模拟流式调用：首个 token 前等待注入延迟，之后按固定间隔输出"""
+        def chunk(payload):
+            return {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+        return {
+            "body": self._open_stream("InvokeModelWithResponseStream", serviceTier, body, chunk),
+            "contentType": "application/json",
+            "ResponseMetadata": {"HTTPStatusCode": 200, "RequestId": f"stand-in-{self.calls}"},
+        }
+
+    def converse(self, modelId, messages, system=None, inferenceConfig=None, serviceTier=None, **kwargs):
+        """模拟 converse：参数为结构化消息，响应直接是字典（无 body 流）"""
+        in_flight, jitter = self._enter("Converse")
+        reply = {"text": f"stand-in response from {self.region}",
+                 "input_tokens": self.input_tokens, "output_tokens": self.output_tokens}
+        try:
+            latency = self._latency_ms(self._converse_tier(serviceTier), in_flight, jitter)
+            if self.unary_generation:
+                latency += reply["output_tokens"] * self.token_interval_ms
+            cache_read, cache_write = self._cache_usage(self._converse_body(messages, system), reply["input_tokens"])
+            latency = int(latency * (1 - CACHE_READ_LATENCY_SAVING * cache_read / max(1, reply["input_tokens"])))
+            time.sleep(latency / 1000)
+        finally:
+            self._exit()
+
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": reply["text"]}]}},
+            "stopReason": "end_turn",
+            "usage": self._usage(reply, cache_read, cache_write, converse=True),
+            "metrics": {"latencyMs": latency},
+            "ResponseMetadata": {"HTTPStatusCode": 200, "RequestId": f"stand-in-{self.calls}"},
+        }
+
+    def converse_stream(self, modelId, messages, system=None, inferenceConfig=None, serviceTier=None, **kwargs):
+        """模拟 converse_stream：事件直接是字典，不再包一层 chunk.bytes"""
+        return {
+            "stream": self._open_stream("ConverseStream", self._converse_tier(serviceTier),
+                                        self._converse_body(messages, system), lambda e: e, converse=True),
+            "ResponseMetadata": {"HTTPStatusCode": 200, "RequestId": f"stand-in-{self.calls}"},
+        }
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+流式（out-of-core）聚合引擎
+- 按块读取 CSV，一次遍历计算可合并统计量（计数、加权和、分位数草图）
+- 峰值内存只取决于块大小和分组数，与数据总量无关
+- 输出与 generate_summary_report 相同结构的汇总，可由同一个打印函数输出
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from weighted_stats import WeightedStats
+
+DEFAULT_CHUNKSIZE = 100_000
+
+CSV_DTYPES = {
+    'concurrency': 'int32',
+    'tier': 'category',
+    'successful': 'int32',
+    'failed': 'int32',
+    'avg_server_latency': 'float64',
+    'avg_client_latency': 'float64',
+    'avg_input_tokens': 'float64',
+    'avg_output_tokens': 'float64',
+    'batch_time': 'float64',
+}
+
+
+class QuantileSketch:
+    """DDSketch：对数分桶的相对误差分位数草图，可合并，内存有界"""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0.0
+        self.count = 0.0
+
+    def add_array(self, values, weights=None):
+        values = np.asarray(values, dtype='float64')
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype='float64')
+        positive = values > 0
+        self.zero_count += float(weights[~positive].sum())
+        self.count += float(weights.sum())
+        if not positive.any():
+            return
+        indexes = np.ceil(np.log(values[positive]) / self.log_gamma).astype('int64')
+        keys, inverse = np.unique(indexes, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights[positive])
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0.0) + count
+
+    def add(self, value, weight=1.0):
+        """单个值（标量版 add_array）"""
+        if weight <= 0:
+            return
+        self.count += weight
+        if value > 0:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0.0) + weight
+        else:
+            self.zero_count += weight
+
+    def to_dict(self):
+        """JSON 可序列化的状态（增量分析的状态文件使用）"""
+        return {'relative_accuracy': self.relative_accuracy, 'zero_count': self.zero_count, 'count': self.count,
+                'bins': {str(key): count for key, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.bins = {int(key): count for key, count in data['bins'].items()}
+        return sketch
+
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0.0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float('nan')
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+class StreamingSummary:
+    """一次遍历得到 generate_summary_report 所需的全部统计量（按请求数加权）"""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.successful = 0
+        self.failed = 0
+        self.input_tokens = 0.0
+        self.output_tokens = 0.0
+        self.regional = {}        # region_name → WeightedStats（default 层级）
+        self.regional_calls = {}  # region_name → [successful, failed]
+        self.sketches = {}        # region_name / tier → QuantileSketch
+        self.tiers = {}           # tier → WeightedStats
+        self.concurrency = {}     # concurrency → WeightedStats（default 层级）
+        self.windows = {}         # 小时 → [requests, tokens]
+
+    def add_chunk(self, chunk, region_name):
+        timestamps = pd.to_datetime(chunk['timestamp'])
+        lo, hi = timestamps.min(), timestamps.max()
+        self.start = lo if self.start is None else min(self.start, lo)
+        self.end = hi if self.end is None else max(self.end, hi)
+
+        successful = chunk['successful']
+        tokens = (chunk['avg_input_tokens'] + chunk['avg_output_tokens']) * successful
+        self.successful += int(successful.sum())
+        self.failed += int(chunk['failed'].sum())
+        self.input_tokens += float((chunk['avg_input_tokens'] * successful).sum())
+        self.output_tokens += float((chunk['avg_output_tokens'] * successful).sum())
+
+        hourly = pd.DataFrame({'requests': successful + chunk['failed'], 'tokens': tokens}).groupby(
+            timestamps.dt.floor('h')).sum()
+        for hour, row in hourly.iterrows():
+            window = self.windows.setdefault(hour, [0, 0.0])
+            window[0] += int(row['requests'])
+            window[1] += float(row['tokens'])
+
+        for tier, group in chunk.groupby('tier', observed=True):
+            self.tiers.setdefault(tier, WeightedStats()).add_array(group['avg_server_latency'], group['successful'])
+            self.sketches.setdefault(('tier', tier), QuantileSketch()).add_array(
+                group['avg_server_latency'], group['successful'])
+
+        default = chunk[chunk['tier'] == 'default']
+        if len(default):
+            self.regional.setdefault(region_name, WeightedStats()).add_array(
+                default['avg_server_latency'], default['successful'])
+            self.sketches.setdefault(('region', region_name), QuantileSketch()).add_array(
+                default['avg_server_latency'], default['successful'])
+            calls = self.regional_calls.setdefault(region_name, [0, 0])
+            calls[0] += int(default['successful'].sum())
+            calls[1] += int(default['failed'].sum())
+            for conc, group in default.groupby('concurrency'):
+                self.concurrency.setdefault(int(conc), WeightedStats()).add_array(
+                    group['avg_server_latency'], group['successful'])
+
+    def merge(self, other):
+        """合并另一个（例如并行处理其他文件得到的）汇总"""
+        if other.start is not None:
+            self.start = other.start if self.start is None else min(self.start, other.start)
+            self.end = other.end if self.end is None else max(self.end, other.end)
+        self.successful += other.successful
+        self.failed += other.failed
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        for name in ('regional', 'sketches', 'tiers', 'concurrency'):
+            mine = getattr(self, name)
+            for key, value in getattr(other, name).items():
+                if key in mine:
+                    mine[key].merge(value)
+                else:
+                    mine[key] = value
+        for key, (ok, failed) in other.regional_calls.items():
+            calls = self.regional_calls.setdefault(key, [0, 0])
+            calls[0] += ok
+            calls[1] += failed
+        for hour, (requests, tokens) in other.windows.items():
+            window = self.windows.setdefault(hour, [0, 0.0])
+            window[0] += requests
+            window[1] += tokens
+
+    def _latency_stats(self, stats, sketch):
+        return {
+            'mean': stats.mean, 'ci95': stats.ci95, 'min': stats.min, 'max': stats.max, 'std': stats.std,
+            'p50': sketch.quantile(0.50), 'p95': sketch.quantile(0.95), 'p99': sketch.quantile(0.99),
+        }
+
+    def to_report(self):
+        """转换为 print_summary_report 使用的字典"""
+        regional = {}
+        for region_name in sorted(self.regional):
+            regional[region_name] = self._latency_stats(self.regional[region_name],
+                                                        self.sketches[('region', region_name)])
+            ok, failed = self.regional_calls[region_name]
+            regional[region_name]['successful'] = ok
+            regional[region_name]['failed'] = failed
+
+        duration = max((self.end - self.start).total_seconds(), 1)
+        return {
+            'start': self.start,
+            'end': self.end,
+            'successful': self.successful,
+            'failed': self.failed,
+            'regional': regional,
+            'tiers': {tier: self._latency_stats(stats, self.sketches[('tier', tier)])
+                      for tier, stats in self.tiers.items()},
+            'concurrency': {conc: self.concurrency[conc].mean for conc in sorted(self.concurrency)
+                            if self.concurrency[conc].sum_w},
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'throughput': {
+                'requests_per_sec': (self.successful + self.failed) / duration,
+                'tokens_per_sec': (self.input_tokens + self.output_tokens) / duration,
+                'peak_requests_per_sec': max(w[0] for w in self.windows.values()) / 3600,
+                'peak_tokens_per_sec': max(w[1] for w in self.windows.values()) / 3600,
+            },
+        }
+
+
+def iter_chunks(csv_file, chunksize=DEFAULT_CHUNKSIZE):
+    """按块读取单个 CSV"""
+    return pd.read_csv(csv_file, chunksize=chunksize, dtype=CSV_DTYPES)
+
+
+def summarize_files(sources, region_names, chunksize=DEFAULT_CHUNKSIZE):
+    """sources: [(region_code, csv_file), ...]；逐文件逐块折叠，返回 StreamingSummary"""
+    summary = StreamingSummary()
+    for region_code, csv_file in sources:
+        rows = 0
+        for chunk in iter_chunks(csv_file, chunksize):
+            summary.add_chunk(chunk, region_names[region_code])
+            rows += len(chunk)
+        print(f"Streamed {rows} records from {region_code} ({csv_file.name})")
+    return summary
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+压测进程的结构化日志（JSON Lines）与跨区域查询
+- log_event(event, **fields)：工作线程只把记录放进内存队列（QueueHandler），格式化后的写盘、轮转和压缩
+  都在 QueueListener 的后台线程里完成，请求线程不会阻塞在磁盘 I/O 上
+- RotatingJsonLinesHandler：按大小或时间轮转，旧文件压缩为 .zst（安装了 zstandard 时）或 .gz，只保留最近 backups 个
+- 没有调用 setup_logging() 时 log_event 不产生任何输出
+- 查询：合并多个区域的日志按时间排序，支持按区域 / 事件 / 级别 / 字段过滤、tail 和 follow；
+  tail 从当前文件末尾倒读，--since 时跳过更早的压缩归档
+
+用法（查询）:
+    python structured_log.py logs/ --tail 20
+    python structured_log.py logs/ --region us-east-1 --event batch_result --since 2h
+    python structured_log.py logs/ --level WARNING --where tier=flex -f
+"""
+
+import argparse
+import atexit
+import glob
+import gzip
+import heapq
+import json
+import logging
+import os
+import queue
+import re
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_ROTATE_SECONDS = 6 * 3600
+DEFAULT_BACKUPS = 40
+LOGGER_NAME = "nova.perf"
+
+# 压缩方式 → (后缀, 打开函数)
+COMPRESSORS = {"gzip": (".gz", gzip.open)}
+if zstd is not None:
+    COMPRESSORS["zstd"] = (".zst", zstd.open)
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+_listener = None
+
+
+def resolve_compression(name):
+    """auto → 有 zstandard 用 zstd，否则 gzip；none → 不压缩"""
+    if name == "auto":
+        return "zstd" if "zstd" in COMPRESSORS else "gzip"
+    if name != "none" and name not in COMPRESSORS:
+        raise ValueError(f"不支持的压缩方式: {name}（zstd 需要 pip install zstandard）")
+    return name
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """一条记录一行 JSON；static 中的字段（区域、模型、pid）写进每一行"""
+
+    def __init__(self, static=None):
+        super().__init__()
+        self.static = static or {}
+
+    def format(self, record):
+        entry = {"ts": round(record.created, 3),
+                 "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname, **self.static, "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingJsonLinesHandler(RotatingFileHandler):
+    """按大小或时间轮转；轮转出的文件名带时间戳并压缩，超出 backups 的最旧归档删除"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                 backups=DEFAULT_BACKUPS, compression="auto"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.compression = resolve_compression(compression)
+        self.opened_at = time.time()
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() - self.opened_at >= self.rotate_seconds:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            archive = f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            suffix = 1
+            while glob.glob(glob.escape(archive) + "*"):
+                archive = f"{self.baseFilename}.{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+                suffix += 1
+            os.replace(self.baseFilename, archive)
+            if self.compression != "none":
+                self._compress(archive)
+            self._prune()
+        self.opened_at = time.time()
+        self.stream = self._open()
+
+    def _compress(self, archive):
+        extension, opener = COMPRESSORS[self.compression]
+        with open(archive, "rb") as src, opener(archive + extension, "wb") as dst:
+            while chunk := src.read(1024 * 1024):
+                dst.write(chunk)
+        os.remove(archive)
+
+    def _prune(self):
+        archives = sorted(glob.glob(glob.escape(self.baseFilename) + ".*"), key=lambda p: (os.path.getmtime(p), p))
+        for old in archives[:-self.backupCount] if self.backupCount else []:
+            os.remove(old)
+
+
+def setup_logging(path, max_bytes=DEFAULT_MAX_BYTES, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                  backups=DEFAULT_BACKUPS, compression="auto", **static):
+    """开启 JSON Lines 日志；退出时 shutdown_logging() 把队列中剩余的记录写完"""
+    global _listener
+    shutdown_logging()
+    handler = RotatingJsonLinesHandler(path, max_bytes, rotate_seconds, backups, compression)
+    handler.setFormatter(JsonLinesFormatter(static))
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, handler)
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    _listener.start()
+
+
+@atexit.register
+def shutdown_logging():
+    """停止后台写入线程并关闭日志文件；可重复调用"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """记录一个事件；fields 成为 JSON 的顶层字段"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+# ---------------------------------------------------------------- 查询
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstd is None:
+            raise SystemExit(f"❌ 读取 {path} 需要 pip install zstandard")
+        return zstd.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def find_log_files(paths):
+    """目录 / 文件 / 通配符 → {当前日志: [归档, ...（从旧到新）]}"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.jsonl")) + glob.glob(os.path.join(path, "*.jsonl.*")))
+        else:
+            matched = glob.glob(path) or [path]
+            files.extend(matched)
+            # 指定当前日志时带上它的归档
+            files.extend(archive for name in matched for archive in glob.glob(glob.escape(name) + ".*"))
+    logs = {}
+    for path in sorted(set(files)):
+        base = re.sub(r"\.jsonl\..*$", ".jsonl", path)
+        logs.setdefault(base, [])
+        if path != base:
+            logs[base].append(path)
+    for archives in logs.values():
+        archives.sort(key=os.path.getmtime)
+    return logs
+
+
+def parse_since(value):
+    """30m / 2h / 1d 或 ISO 时间 → epoch 秒"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value)
+    if match:
+        return time.time() - float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    return datetime.fromisoformat(value).timestamp()
+
+
+def entry_filter(regions=None, events=None, level=None, where=None, since=None):
+    """过滤条件 → 判定函数；where 为 key=value 列表，按字符串比较"""
+    minimum = logging.getLevelName(level.upper()) if level else 0
+    conditions = [item.split("=", 1) for item in where or []]
+
+    def matches(entry):
+        if since and entry.get("ts", 0) < since:
+            return False
+        if regions and entry.get("region") not in regions:
+            return False
+        if events and entry.get("event") not in events:
+            return False
+        if minimum and logging.getLevelName(entry.get("level", "INFO")) < minimum:
+            return False
+        return all(str(entry.get(key)) == value for key, value in conditions)
+    return matches
+
+
+def _parse(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None  # 进程被杀时可能留下半行
+
+
+def read_entries(path, matches):
+    with _open_text(path) as f:
+        for line in f:
+            entry = _parse(line)
+            if entry is not None and matches(entry):
+                yield entry
+
+
+def read_backwards(path, block_size=64 * 1024):
+    """从文件末尾倒序逐行读取（未压缩的当前日志）"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8", errors="replace")
+        if remainder.strip():
+            yield remainder.decode("utf-8", errors="replace")
+
+
+def tail_log(base, archives, matches, count):
+    """一个日志（当前文件 + 归档）中最后 count 条匹配记录：先倒读当前文件，不够再从新到旧读归档"""
+    found = []
+    if os.path.exists(base):
+        for line in read_backwards(base):
+            entry = _parse(line)
+            if entry is not None and matches(entry):
+                found.append(entry)
+                if len(found) >= count:
+                    return found[::-1]
+    found.reverse()
+    for archive in reversed(archives):
+        older = deque(read_entries(archive, matches), maxlen=count - len(found))
+        found[:0] = older
+        if len(found) >= count:
+            break
+    return found
+
+
+def query(logs, matches, since=None, tail=None):
+    """多个日志按时间合并；since 早于归档的最后修改时间的归档直接跳过"""
+    if tail:
+        merged = heapq.merge(*(tail_log(base, archives, matches, tail) for base, archives in logs.items()),
+                             key=lambda e: e.get("ts", 0))
+        return deque(merged, maxlen=tail)
+    streams = []
+    for base, archives in logs.items():
+        paths = [p for p in archives if not since or os.path.getmtime(p) >= since]
+        if os.path.exists(base):
+            paths.append(base)
+        streams.append(entry for path in paths for entry in read_entries(path, matches))
+    return heapq.merge(*streams, key=lambda e: e.get("ts", 0))
+
+
+def follow(logs, matches, interval=1.0):
+    """持续输出各当前日志新追加的匹配记录；文件轮转（变小 / inode 变化）后从头读新文件"""
+    positions = {}
+    for base in logs:
+        if os.path.exists(base):
+            stat = os.stat(base)
+            positions[base] = (stat.st_ino, stat.st_size)
+    while True:
+        for base in logs:
+            if not os.path.exists(base):
+                continue
+            stat = os.stat(base)
+            inode, offset = positions.get(base, (stat.st_ino, 0))
+            if inode != stat.st_ino or stat.st_size < offset:
+                offset = 0
+            if stat.st_size > offset:
+                with open(base, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+                complete = data.rfind(b"\n") + 1  # 半行留到下次
+                for line in data[:complete].decode("utf-8", errors="replace").splitlines():
+                    entry = _parse(line)
+                    if entry is not None and matches(entry):
+                        yield entry
+                offset += complete
+            positions[base] = (stat.st_ino, offset)
+        time.sleep(interval)
+
+
+def format_entry(entry):
+    fields = " ".join(f"{key}={value}" for key, value in entry.items()
+                      if key not in ("ts", "time", "level", "region", "event", "model", "pid"))
+    return (f"{entry.get('time', '')[:19]} {entry.get('region', '-'):14} {entry.get('level', ''):7} "
+            f"{entry.get('event', '')} {fields}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跨区域查询 JSON Lines 压测日志')
+    parser.add_argument('paths', nargs='*', default=['logs'], help='日志目录、文件或通配符 (默认: logs)')
+    parser.add_argument('--region', action='append', help='只看这些区域（可重复）')
+    parser.add_argument('--event', action='append', help='只看这些事件（可重复）')
+    parser.add_argument('--level', help='最低级别，如 WARNING')
+    parser.add_argument('--where', action='append', metavar='KEY=VALUE', help='字段等于该值（可重复）')
+    parser.add_argument('--since', help='起始时间：30m / 2h / 1d 或 ISO 时间')
+    parser.add_argument('--tail', type=int, help='只输出最后 N 条')
+    parser.add_argument('-f', '--follow', action='store_true', help='输出后继续跟踪新记录')
+    parser.add_argument('--json', action='store_true', help='输出原始 JSON 行')
+    args = parser.parse_args()
+
+    logs = find_log_files(args.paths)
+    if not logs:
+        raise SystemExit(f"❌ 没有找到日志: {' '.join(args.paths)}")
+    since = parse_since(args.since) if args.since else None
+    matches = entry_filter(args.region, args.event, args.level, args.where, since)
+    render = (lambda e: json.dumps(e, ensure_ascii=False)) if args.json else format_entry
+    try:
+        if args.tail or not args.follow:
+            for entry in query(logs, matches, since, args.tail):
+                print(render(entry))
+        if args.follow:
+            for entry in follow(logs, matches):
+                print(render(entry), flush=True)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,35 @@
 
 import boto3
 import json
+import logging
+import os
 import time
 import csv
 import signal
 import sys
 import threading
 import argparse
+import atexit
 import base64
 from datetime import datetime, timedelta
 from pathlib import Path
 import pickle
+import itertools
+
+from region_router import RegionRouter
+from adaptive_concurrency import AdaptiveConcurrencyRunner
+from coalescing_client import CoalescingClient
+from metrics_server import MetricsRegistry
+from change_detection import ChangeMonitor
+from trace_replay import TraceReplayer, load_trace, print_report
+from image_preprocess import DEFAULT_MAX_EDGE, ImagePreprocessor
+from prompt_cache import CACHE_PLACEMENTS, CacheStats, add_cache_points, cache_usage
+from tier_scheduler import percentile
+from request_records import DEFAULT_BUFFER_RECORDS, BatchAccumulator, RecordSpillBuffer, RequestRecord
+from host_sampler import DEFAULT_INTERVAL_SECONDS as HOST_SAMPLE_INTERVAL_SECONDS, HostSampler
+from preflight import REJECT, Preflight, TokenCalibration
+from structured_log import (COMPRESSORS, DEFAULT_MAX_BYTES as LOG_MAX_BYTES,
+                            DEFAULT_ROTATE_SECONDS as LOG_ROTATE_SECONDS, log_event, setup_logging)
 
 # ====== 默认配置 ======
 DEFAULT_REGION = "us-west-2"
@@ -28,6 +47,15 @@ HOURS_PER_LEVEL = 32
 REQUEST_INTERVAL_SECONDS = 60
 SERVICE_TIERS = ["flex", "default", "priority"]
 
+# 自适应并发模式（--adaptive）
+ADAPTIVE_HOURS_PER_TIER = 2
+ADAPTIVE_WINDOW_SECONDS = 60
+ADAPTIVE_SLO_MS = 10000
+
+# 提示词缓存 A/B 模式（--cache-ab）：每个层级缓存 / 不缓存交替发送
+CACHE_AB_REQUESTS = 50
+CACHE_AB_INTERVAL_SECONDS = 2
+
 # 图片配置
 TEST_IMAGE_PATH = Path(__file__).parent / "test_image.png"
 
@@ -39,9 +67,28 @@ MODEL_ID = None
 DATA_DIR = None
 CSV_FILE = None
 STATE_FILE = None
+ROUTER_STATS_FILE = None
+CHANGE_ALERTS_FILE = None
 client = None
+router = None  # 按 (区域, 模型, 层级) 记录 EWMA 延迟，供线上路由加载
+metrics = None  # 进程内指标，--metrics-port 开启 HTTP 端点
+change_monitor = None  # 逐批次的在线变点检测
 running = True
 TEST_IMAGE_BASE64 = None  # 图片的base64编码
+TEST_IMAGE_FORMAT = "png"  # --preprocess 时为 jpeg / webp
+PROMPT_CACHE = "none"  # --prompt-cache 时在图片之后插入缓存点，带 Test ID 的问题在缓存点之后
+REQUEST_LOG = None  # --request-log 时的逐请求记录缓冲（RecordSpillBuffer）
+HOST_SAMPLER = None  # 客户端主机资源采样（/proc），用于区分主机瓶颈和服务端延迟
+COALESCE = False  # --coalesce 时问题不带 Test ID，同一批次内的并发请求完全相同，才能被合并
+QUIET = False  # --quiet 时批次进度只写结构化日志，不再打印
+TOKEN_CALIBRATION = None  # 预检 token 估算的校准（实测 usage.inputTokens / 估算），保存在 token_calibration.json
+TEST_ESTIMATE = None  # 测试请求的预检估算
+
+def report(text, event, level=logging.INFO, **fields):
+    """写一条结构化日志（--log-file），并在非 --quiet 时打印 text"""
+    log_event(event, level, **fields)
+    if not QUIET:
+        print(text)
 
 class TestState:
     """测试状态管理"""
@@ -71,38 +118,53 @@ def signal_handler(sig, frame):
     """处理中断信号"""
     global running
     print("\n\n⚠️  收到中断信号，正在保存状态...")
+    log_event("interrupted", logging.WARNING, signal=sig)
     running = False
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
-def test_single_request_with_retry(tier, test_id, max_retries=3):
-    """带重试的单次请求（使用图片输入）"""
-    for attempt in range(max_retries):
-        try:
-            request_body = {
-                "schemaVersion": "messages-v1",
-                "messages": [{
-                    "role": "user",
-                    "content": [
-                        {
-                            "image": {
-                                "format": "png",
-                                "source": {
-                                    "bytes": TEST_IMAGE_BASE64
-                                }
-                            }
-                        },
-                        {
-                            "text": f"What do you see in this image? Test ID: {test_id}"
+def test_single_request_with_retry(tier, test_id, max_retries=3, concurrency="-", prompt_cache=None):
+    """带重试的单次请求，返回结果字典（自适应 / A/B 等模式使用）"""
+    return invoke_with_retry(tier, test_id, max_retries, concurrency, prompt_cache).to_dict()
+
+def build_request_body(test_id, prompt_cache):
+    """测试请求体：测试图片 + 带 Test ID 的问题（--coalesce 时不带 Test ID）"""
+    question = "What do you see in this image?" if COALESCE else f"What do you see in this image? Test ID: {test_id}"
+    request_body = {
+        "schemaVersion": "messages-v1",
+        "messages": [{
+            "role": "user",
+            "content": [
+                {
+                    "image": {
+                        "format": TEST_IMAGE_FORMAT,
+                        "source": {
+                            "bytes": TEST_IMAGE_BASE64
                         }
-                    ]
-                }],
-                "inferenceConfig": {
-                    "maxTokens": 100,
-                    "temperature": 0.7
+                    }
+                },
+                {
+                    "text": question
                 }
-            }
+            ]
+        }],
+        "inferenceConfig": {
+            "maxTokens": 100,
+            "temperature": 0.7
+        }
+    }
+    if prompt_cache != "none":
+        add_cache_points(request_body, prompt_cache)
+    return request_body
+
+def invoke_with_retry(tier, test_id, max_retries=3, concurrency="-", prompt_cache=None):
+    """带重试的单次请求（使用图片输入），返回 RequestRecord；prompt_cache 为 None 时使用 --prompt-cache 的设置"""
+    prompt_cache = prompt_cache or PROMPT_CACHE
+    for attempt in range(max_retries):
+        metrics.request_started(AWS_REGION, tier)
+        try:
+            request_body = build_request_body(test_id, prompt_cache)
 
             invoke_params = {
                 "modelId": MODEL_ID,
@@ -120,51 +182,52 @@ def test_single_request_with_retry(tier, test_id, max_retries=3):
 
             model_response = json.loads(response["body"].read())
             usage = model_response.get("usage", {})
+            cache_read, cache_write = cache_usage(usage)
             http_headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
             server_latency = int(http_headers.get("x-amzn-bedrock-invocation-latency", 0))
+            router.record(AWS_REGION, MODEL_ID, tier, latency, True)
+            metrics.request_finished(AWS_REGION, tier, concurrency, "success", latency,
+                                     usage.get("inputTokens", 0), usage.get("outputTokens", 0), cache_read, cache_write)
 
-            return {
-                "success": True,
-                "client_latency": latency,
-                "server_latency": server_latency,
-                "input_tokens": usage.get("inputTokens", 0),
-                "output_tokens": usage.get("outputTokens", 0),
-                "attempts": attempt + 1
-            }
+            return RequestRecord(True, attempt + 1, latency, server_latency, usage.get("inputTokens", 0),
+                                 usage.get("outputTokens", 0), cache_read, cache_write)
 
         except Exception as e:
             error_msg = str(e)
+            throttled = "ThrottlingException" in error_msg or "429" in error_msg
+            router.record(AWS_REGION, MODEL_ID, tier, None, False, throttled)
+            metrics.request_finished(AWS_REGION, tier, concurrency, "throttled" if throttled else "error")
 
             # 限流错误，等待后重试
-            if "ThrottlingException" in error_msg or "429" in error_msg:
+            if throttled:
+                metrics.throttled(AWS_REGION, tier)
                 if attempt < max_retries - 1:
                     wait_time = (attempt + 1) * 5  # 5, 10, 15 秒
-                    print(f"    ⚠️  限流，等待 {wait_time}s 后重试...")
+                    report(f"    ⚠️  限流，等待 {wait_time}s 后重试...", "throttled_retry", logging.WARNING,
+                           tier=tier, concurrency=concurrency, attempt=attempt + 1, wait_seconds=wait_time)
+                    metrics.retried(AWS_REGION, tier)
                     time.sleep(wait_time)
                     continue
 
             # 其他错误
             if attempt < max_retries - 1:
+                metrics.retried(AWS_REGION, tier)
                 time.sleep(2)
                 continue
 
-            return {
-                "success": False,
-                "error": error_msg,
-                "attempts": max_retries
-            }
+            log_event("request_failed", logging.WARNING, tier=tier, concurrency=concurrency,
+                      attempts=max_retries, error=error_msg[:200])
+            return RequestRecord(False, max_retries, error=error_msg)
 
-    return {"success": False, "error": "Max retries exceeded"}
+    return RequestRecord(False, max_retries, error="Max retries exceeded")
 
 def test_concurrent_batch(tier, concurrency, batch_id):
-    """测试一批并发请求"""
-    results = []
-    lock = threading.Lock()
+    """测试一批并发请求；每个工作线程只累加自己的计数，批次结束时合并"""
+    accumulator = BatchAccumulator(keep_records=REQUEST_LOG is not None)
 
     def worker(worker_id):
-        result = test_single_request_with_retry(tier, f"{tier}_{concurrency}_{batch_id}_{worker_id}")
-        with lock:
-            results.append(result)
+        record = invoke_with_retry(tier, f"{tier}_{concurrency}_{batch_id}_{worker_id}", concurrency=concurrency)
+        accumulator.add(record, worker_id)
 
     threads = []
     batch_start_time = time.time()
@@ -179,27 +242,12 @@ def test_concurrent_batch(tier, concurrency, batch_id):
 
     batch_time = time.time() - batch_start_time
 
-    # 统计
-    successful = [r for r in results if r.get('success')]
-    failed = len(results) - len(successful)
-
-    if successful:
-        avg_server = sum(r['server_latency'] for r in successful) / len(successful)
-        avg_client = sum(r['client_latency'] for r in successful) / len(successful)
-        avg_input = sum(r['input_tokens'] for r in successful) / len(successful)
-        avg_output = sum(r['output_tokens'] for r in successful) / len(successful)
-    else:
-        avg_server = avg_client = avg_input = avg_output = 0
-
-    return {
-        "successful": len(successful),
-        "failed": failed,
-        "avg_server_latency": avg_server,
-        "avg_client_latency": avg_client,
-        "avg_input_tokens": avg_input,
-        "avg_output_tokens": avg_output,
-        "batch_time": batch_time
-    }
+    # 统计（successful / failed / avg_* 各字段）
+    result = accumulator.merge()
+    result["batch_time"] = batch_time
+    if REQUEST_LOG is not None:
+        REQUEST_LOG.extend(tier, concurrency, batch_id, accumulator.records())
+    return result
 
 def save_to_csv(data):
     """保存数据"""
@@ -208,12 +256,148 @@ def save_to_csv(data):
     with open(CSV_FILE, 'a', newline='') as f:
         fieldnames = ['timestamp', 'concurrency', 'tier', 'successful', 'failed',
                       'avg_server_latency', 'avg_client_latency',
-                      'avg_input_tokens', 'avg_output_tokens', 'batch_time']
+                      'avg_input_tokens', 'avg_output_tokens', 'avg_cache_read_tokens',
+                      'avg_cache_write_tokens', 'batch_time']
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         if not file_exists:
             writer.writeheader()
         writer.writerow(data)
 
+def run_adaptive(slo_ms, hours_per_tier, window_seconds):
+    """自适应并发模式：每个层级独立探测满足 SLO 的最大吞吐工作点"""
+    curve_file = DATA_DIR / f"adaptive_curve_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    request_ids = itertools.count()
+    operating_points = {}
+
+    for tier in SERVICE_TIERS:
+        if not running:
+            break
+
+        print(f"\n{'#'*80}")
+        print(f"# 自适应并发: {tier} | SLO p95 ≤ {slo_ms}ms | 最长 {hours_per_tier}h")
+        print(f"{'#'*80}\n")
+
+        def request_fn():
+            # 不在内部重试，让限流信号直接反馈给控制器
+            return test_single_request_with_retry(tier, f"{tier}_adaptive_{next(request_ids)}", max_retries=1,
+                                                  concurrency="adaptive")
+
+        def on_window(point, new_limit):
+            row = {'timestamp': datetime.now().isoformat(), 'tier': tier, **point.to_row()}
+            file_exists = curve_file.exists()
+            with open(curve_file, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                if not file_exists:
+                    writer.writeheader()
+                writer.writerow(row)
+            print(f"  [{datetime.now().strftime('%H:%M:%S')}] 并发 {point.limit:3d} → {new_limit:3d} | "
+                  f"吞吐 {point.throughput:.2f} rps | p95 {point.p95 or 0:.0f}ms | 限流 {point.throttled}")
+
+        runner = AdaptiveConcurrencyRunner(request_fn, slo_ms, window_seconds=window_seconds)
+        best = runner.run(hours_per_tier * 3600, should_continue=lambda: running, on_window=on_window)
+        router.save_state(ROUTER_STATS_FILE)
+
+        if best:
+            operating_points[tier] = best.to_row()
+            print(f"\n✅ {tier} 工作点: 并发 {best.limit}，吞吐 {best.throughput:.2f} rps，p95 {best.p95:.0f}ms")
+        else:
+            print(f"\n⚠️  {tier} 没有满足 SLO 的窗口")
+
+    with open(DATA_DIR / "adaptive_operating_points.json", 'w') as f:
+        json.dump({'region': AWS_REGION, 'model': MODEL_ID, 'slo_ms': slo_ms, 'tiers': operating_points}, f, indent=2)
+    print(f"\n曲线数据: {curve_file}")
+
+def run_replay(trace_path, time_scale, video_file=None):
+    """回放模式：按生产请求日志的规模和到达间隔发送请求，替代固定的图片批次"""
+    records = load_trace(trace_path)
+    if not records:
+        print(f"❌ 日志为空: {trace_path}")
+        return
+    output = DATA_DIR / f"replay_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    span = records[-1]['timestamp'] - records[0]['timestamp']
+    print(f"▶️  回放 {len(records)} 条记录: {trace_path}")
+    print(f"   原始跨度 {span/3600:.2f}h，时间缩放 {time_scale}，预计 {span * time_scale / 3600:.2f}h")
+
+    def on_start(record):
+        metrics.request_started(AWS_REGION, record['tier'])
+
+    def on_result(result):
+        outcome = "success" if result.ok else ("throttled" if result.throttled else "error")
+        metrics.request_finished(AWS_REGION, result.tier, "replay", outcome, result.latency_ms if result.ok else None,
+                                 result.input_tokens, result.output_tokens)
+
+    replayer = TraceReplayer(client, records, MODEL_ID, time_scale, video_file=video_file,
+                             on_start=on_start, on_result=on_result).run(lambda: running)
+    print_report(replayer.report())
+    replayer.save_csv(output)
+    print(f"📁 逐请求结果: {output}")
+
+def run_cache_ab(requests_per_arm, placement):
+    """提示词缓存 A/B：每个层级缓存 / 不缓存交替发送（每对轮换先后顺序），比较延迟和输入 token"""
+    output = DATA_DIR / f"cache_ab_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    arms = {"cached": placement, "uncached": "none"}
+    summary = {}
+
+    for tier in SERVICE_TIERS:
+        if not running:
+            break
+        print(f"\n# 提示词缓存 A/B: {tier} | 缓存位置 {placement} | 每组 {requests_per_arm} 次")
+        latencies = {arm: [] for arm in arms}
+        stats = {arm: CacheStats() for arm in arms}
+        for i in range(requests_per_arm):
+            if not running:
+                break
+            for arm in (("cached", "uncached") if i % 2 == 0 else ("uncached", "cached")):
+                result = test_single_request_with_retry(tier, f"{tier}_cache_ab_{arm}_{i}", max_retries=1,
+                                                        concurrency="cache_ab", prompt_cache=arms[arm])
+                row = {'timestamp': datetime.now().isoformat(), 'tier': tier, 'arm': arm, 'index': i,
+                       'success': result['success'], 'client_latency': result.get('client_latency'),
+                       'server_latency': result.get('server_latency'),
+                       'input_tokens': result.get('input_tokens'),
+                       'cache_read_tokens': result.get('cache_read_tokens'),
+                       'cache_write_tokens': result.get('cache_write_tokens')}
+                file_exists = output.exists()
+                with open(output, 'a', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+                    if not file_exists:
+                        writer.writeheader()
+                    writer.writerow(row)
+                if result['success']:
+                    latencies[arm].append(result['client_latency'])
+                    stats[arm].record(result['input_tokens'], result['cache_read_tokens'],
+                                      result['cache_write_tokens'])
+            time.sleep(CACHE_AB_INTERVAL_SECONDS)
+
+        summary[tier] = {arm: {'p50_latency_ms': percentile(latencies[arm], 50),
+                               'p95_latency_ms': percentile(latencies[arm], 95),
+                               'mean_uncached_input_tokens': stats[arm].input_tokens / max(1, stats[arm].requests),
+                               **stats[arm].to_dict()} for arm in arms}
+        cached, uncached = summary[tier]['cached'], summary[tier]['uncached']
+        if cached['requests'] and uncached['requests']:
+            print(f"  延迟 p50 {uncached['p50_latency_ms']}ms → {cached['p50_latency_ms']}ms "
+                  f"({cached['p50_latency_ms'] / uncached['p50_latency_ms'] - 1:+.1%}) | "
+                  f"p95 {uncached['p95_latency_ms']}ms → {cached['p95_latency_ms']}ms")
+            print(f"  未缓存输入 token {uncached['mean_uncached_input_tokens']:.0f} → "
+                  f"{cached['mean_uncached_input_tokens']:.0f} /请求 | 命中率 {cached['hit_rate']:.1%} | "
+                  f"缓存读取 {cached['cache_read_tokens']:,} / 写入 {cached['cache_write_tokens']:,} token")
+
+    with open(DATA_DIR / "cache_ab_summary.json", 'w') as f:
+        json.dump({'region': AWS_REGION, 'model': MODEL_ID, 'placement': placement, 'tiers': summary}, f, indent=2)
+    print(f"\n📁 逐请求结果: {output}")
+
+def detect_changes(tier, concurrency, timestamp, result):
+    """把批次结果送入在线变点检测，有告警时打印并追加到 change_alerts.jsonl"""
+    alerts = change_monitor.observe_batch(AWS_REGION, tier, concurrency, timestamp, result['successful'],
+                                          result['failed'], result['avg_server_latency'])
+    for alert in alerts:
+        report(f"  🚨 {alert}", "change_alert", logging.WARNING, tier=tier, concurrency=concurrency,
+               metric=alert.key[3], start=alert.start.isoformat(), baseline=round(alert.baseline, 4),
+               observed=round(alert.level, 4))
+        metrics.inc("nova_change_alerts_total",
+                    (("region", AWS_REGION), ("tier", tier), ("metric", alert.key[3])))
+        with open(CHANGE_ALERTS_FILE, 'a') as f:
+            f.write(json.dumps(alert.to_dict(), ensure_ascii=False) + "\n")
+
 def health_check():
     """健康检查"""
     try:
@@ -223,7 +407,8 @@ def health_check():
         free_gb = stat.free / (1024**3)
 
         if free_gb < 1:
-            print(f"⚠️  磁盘空间不足: {free_gb:.2f}GB")
+            report(f"⚠️  磁盘空间不足: {free_gb:.2f}GB", "health_check_failed", logging.WARNING,
+                   reason="disk", free_gb=round(free_gb, 2))
             return False
 
         # 检查内存
@@ -234,7 +419,8 @@ def health_check():
                     mem_available_kb = int(line.split()[1])
                     mem_available_gb = mem_available_kb / (1024**2)
                     if mem_available_gb < 0.5:
-                        print(f"⚠️  可用内存不足: {mem_available_gb:.2f}GB")
+                        report(f"⚠️  可用内存不足: {mem_available_gb:.2f}GB", "health_check_failed",
+                               logging.WARNING, reason="memory", available_gb=round(mem_available_gb, 2))
                         return False
 
         return True
@@ -243,12 +429,45 @@ def health_check():
 
 def main():
     """主函数"""
-    global AWS_REGION, MODEL_ID, DATA_DIR, CSV_FILE, STATE_FILE, client, TEST_IMAGE_BASE64
+    global AWS_REGION, MODEL_ID, DATA_DIR, CSV_FILE, STATE_FILE, ROUTER_STATS_FILE, CHANGE_ALERTS_FILE, client, router, metrics, change_monitor, TEST_IMAGE_BASE64, TEST_IMAGE_FORMAT, PROMPT_CACHE, REQUEST_LOG, HOST_SAMPLER, COALESCE, QUIET, TOKEN_CALIBRATION, TEST_ESTIMATE
 
     # 解析命令行参数
     parser = argparse.ArgumentParser(description='96小时持续并发性能测试（图片输入）')
     parser.add_argument('--region', default=DEFAULT_REGION, help=f'AWS区域 (默认: {DEFAULT_REGION})')
     parser.add_argument('--model', default=DEFAULT_MODEL, help=f'模型ID (默认: {DEFAULT_MODEL})')
+    parser.add_argument('--metrics-port', type=int, default=0, help='本地指标端点端口，0 表示不开启 (如 9464)')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='合并并发中的相同请求（singleflight）；问题不再带 Test ID，否则每个请求体都不同；'
+                             '批次数据写入 coalesced_96h_image_*.csv，不计入多区域分析')
+    parser.add_argument('--adaptive', action='store_true', help='自适应并发模式：自动寻找吞吐拐点，替代固定并发级别')
+    parser.add_argument('--slo-ms', type=int, default=ADAPTIVE_SLO_MS, help=f'自适应模式的 p95 延迟 SLO (默认: {ADAPTIVE_SLO_MS})')
+    parser.add_argument('--adaptive-hours', type=float, default=ADAPTIVE_HOURS_PER_TIER, help=f'自适应模式每个层级最长运行小时数 (默认: {ADAPTIVE_HOURS_PER_TIER})')
+    parser.add_argument('--replay', metavar='TRACE', help='回放模式：按生产请求日志（.csv/.jsonl）回放，替代固定图片测试')
+    parser.add_argument('--replay-time-scale', type=float, default=1.0, help='回放到达间隔缩放，0.5 表示两倍速 (默认: 1.0)')
+    parser.add_argument('--replay-video', help='回放视频记录时使用的参考视频文件')
+    parser.add_argument('--preprocess', nargs='?', const='jpeg', choices=['jpeg', 'webp'],
+                        help='上传前缩放并重新编码测试图片（默认 jpeg，需要 Pillow）')
+    parser.add_argument('--max-edge', type=int, default=DEFAULT_MAX_EDGE, help=f'预处理长边上限 (默认: {DEFAULT_MAX_EDGE})')
+    parser.add_argument('--prompt-cache', choices=CACHE_PLACEMENTS, default='none',
+                        help='提示词缓存点位置（测试请求没有 system 提示词，media 与 all 等效）(默认: none)')
+    parser.add_argument('--cache-ab', type=int, nargs='?', const=CACHE_AB_REQUESTS, metavar='N',
+                        help=f'提示词缓存 A/B 模式：每个层级缓存 / 不缓存各 N 次 (默认 N: {CACHE_AB_REQUESTS})')
+    parser.add_argument('--request-log', action='store_true',
+                        help='记录逐请求结果：内存中只保留有界缓冲，写满即追加到 requests_*.csv')
+    parser.add_argument('--request-log-buffer', type=int, default=DEFAULT_BUFFER_RECORDS,
+                        help=f'逐请求记录缓冲的最大条数 (默认: {DEFAULT_BUFFER_RECORDS})')
+    parser.add_argument('--host-sample-interval', type=float, default=HOST_SAMPLE_INTERVAL_SECONDS,
+                        help=f'客户端主机资源采样间隔秒数，0 表示关闭 (默认: {HOST_SAMPLE_INTERVAL_SECONDS})')
+    parser.add_argument('--log-file', help='结构化 JSON Lines 日志路径（如 logs/concurrent_96h_us_east_1.jsonl），'
+                                           '按大小 / 时间轮转并压缩，用 structured_log.py 查询')
+    parser.add_argument('--log-max-mb', type=float, default=LOG_MAX_BYTES / 1024**2,
+                        help=f'日志文件超过该大小即轮转 (默认: {LOG_MAX_BYTES / 1024**2:g})')
+    parser.add_argument('--log-rotate-hours', type=float, default=LOG_ROTATE_SECONDS / 3600,
+                        help=f'日志文件最长使用小时数，0 表示只按大小轮转 (默认: {LOG_ROTATE_SECONDS / 3600:g})')
+    parser.add_argument('--log-compression', choices=['auto', 'none', *COMPRESSORS], default='auto',
+                        help='轮转归档的压缩方式，auto 在安装了 zstandard 时用 zstd，否则 gzip (默认: auto)')
+    parser.add_argument('--quiet', action='store_true', help='批次进度只写 --log-file，不打印到标准输出')
+    parser.add_argument('--window-seconds', type=int, default=ADAPTIVE_WINDOW_SECONDS, help=f'自适应模式控制窗口秒数 (默认: {ADAPTIVE_WINDOW_SECONDS})')
     args = parser.parse_args()
 
     # 读取并编码测试图片
@@ -262,18 +481,86 @@ def main():
 
     print(f"✅ 已加载测试图片: {TEST_IMAGE_PATH} ({len(image_bytes)} bytes)")
 
+    if args.preprocess:
+        image = ImagePreprocessor(args.max_edge, args.preprocess).process(image_bytes)
+        TEST_IMAGE_BASE64, TEST_IMAGE_FORMAT = image.base64, image.format
+        print(f"🖼️  预处理: {image.original_width}×{image.original_height} {image.original_bytes} bytes → "
+              f"{image.width}×{image.height} {image.format} {len(image.data)} bytes "
+              f"(节省 {image.bytes_saved / image.original_bytes:.0%}，估计少 {image.tokens_saved} 输入 token)")
+
     # 初始化全局变量
     AWS_REGION = args.region
     MODEL_ID = args.model
+    PROMPT_CACHE = args.prompt_cache
     DATA_DIR = Path(f"./concurrent_96h_data_{AWS_REGION.replace('-', '_')}")
     DATA_DIR.mkdir(exist_ok=True)
 
     # CSV文件名包含区域信息（标注为image测试）
-    CSV_FILE = DATA_DIR / f"concurrent_96h_image_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    # --coalesce 时一批 N 个请求只发出一次上游调用，不是真实的 N 路并发数据：换用分析脚本不收录的前缀
+    csv_prefix = "coalesced_96h_image" if args.coalesce else "concurrent_96h_image"
+    CSV_FILE = DATA_DIR / f"{csv_prefix}_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     STATE_FILE = DATA_DIR / "test_state.pkl"
+    ROUTER_STATS_FILE = DATA_DIR / "router_stats.json"
+    CHANGE_ALERTS_FILE = DATA_DIR / "change_alerts.jsonl"
+    if args.log_file:
+        setup_logging(args.log_file, int(args.log_max_mb * 1024**2), args.log_rotate_hours * 3600,
+                      compression=args.log_compression, region=AWS_REGION, model=MODEL_ID, pid=os.getpid())
+    QUIET = args.quiet
+    COALESCE = args.coalesce
+
+    # 预检：发送前估算测试请求的载荷和输入 token，超限时不必等到服务端返回 ValidationException
+    TOKEN_CALIBRATION = TokenCalibration(DATA_DIR / "token_calibration.json")
+    decision = Preflight(MODEL_ID, TOKEN_CALIBRATION).check(build_request_body("preflight", PROMPT_CACHE))
+    TEST_ESTIMATE = decision.estimate
+    print(f"🧮 预检 {decision}")
+    if decision.action == REJECT:
+        print("❌ 测试请求无法发送，请更换测试图片或使用 --preprocess")
+        sys.exit(1)
+    if args.request_log:
+        REQUEST_LOG = RecordSpillBuffer(
+            DATA_DIR / f"requests_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            args.request_log_buffer)
+        # 中断、出错退出时也把缓冲中剩余的记录写盘
+        atexit.register(REQUEST_LOG.close)
+    if args.host_sample_interval > 0:
+        HOST_SAMPLER = HostSampler(
+            DATA_DIR / f"host_samples_{AWS_REGION.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            args.host_sample_interval)
+        if HOST_SAMPLER.start():
+            atexit.register(HOST_SAMPLER.stop)
+        else:
+            print("⚠️  没有 /proc，不采样客户端主机资源")
+            HOST_SAMPLER = None
 
     # 初始化客户端
     client = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+    if args.coalesce:
+        client = CoalescingClient(client)
+
+    # 实时指标
+    metrics = MetricsRegistry()
+    if args.metrics_port:
+        port = metrics.serve(args.metrics_port)
+        print(f"📈 指标端点: http://127.0.0.1:{port}/metrics")
+
+    # 路由统计：断点续传时沿用之前的 EWMA
+    router = RegionRouter(region_profiles={AWS_REGION: MODEL_ID}, tiers=SERVICE_TIERS)
+    if ROUTER_STATS_FILE.exists():
+        router.load_state(ROUTER_STATS_FILE)
+
+    change_monitor = ChangeMonitor()
+
+    if args.replay:
+        run_replay(args.replay, args.replay_time_scale, args.replay_video)
+        return
+
+    if args.cache_ab:
+        run_cache_ab(args.cache_ab, PROMPT_CACHE if PROMPT_CACHE != 'none' else 'media')
+        return
+
+    if args.adaptive:
+        run_adaptive(args.slo_ms, args.adaptive_hours, args.window_seconds)
+        return
 
     print(f"\n{'='*80}")
     print(f"96小时持续并发性能测试（增强版 - 支持断点续传）")
@@ -295,8 +582,16 @@ def main():
     print(f"测试模型: {MODEL_ID}")
     print(f"并发级别: {CONCURRENCY_LEVELS}")
     print(f"数据保存: {CSV_FILE}")
+    if REQUEST_LOG is not None:
+        print(f"逐请求记录: {REQUEST_LOG.path}（缓冲 {REQUEST_LOG.capacity:,} 条）")
+    if HOST_SAMPLER is not None:
+        print(f"主机采样: {HOST_SAMPLER.path}（每 {HOST_SAMPLER.interval:g}s）")
+    if args.log_file:
+        print(f"结构化日志: {args.log_file}{'（--quiet：批次进度只写日志）' if QUIET else ''}")
     print(f"状态文件: {STATE_FILE}")
     print(f"{'='*80}\n")
+    log_event("test_started", concurrency_levels=CONCURRENCY_LEVELS, hours_per_level=HOURS_PER_LEVEL,
+              resumed=state.batch_count > 0 or state.current_concurrency_index > 0, csv_file=CSV_FILE)
     print("✨ 支持断点续传：测试中断后可自动恢复")
     print("⚡ 自动重试：遇到限流自动等待重试")
     print("🔍 健康检查：监控磁盘和内存")
@@ -322,6 +617,8 @@ def main():
         print(f"# 开始时间: {state.level_start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"# 预计结束: {level_end_time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'#'*80}\n")
+        log_event("level_started", concurrency=concurrency, start=state.level_start_time.isoformat(),
+                  end=level_end_time.isoformat())
 
         while running and datetime.now() < level_end_time:
             state.batch_count += 1
@@ -335,12 +632,15 @@ def main():
                     print("⚠️  健康检查失败，暂停10秒...")
                     time.sleep(10)
 
-            print(f"[{current_time.strftime('%H:%M:%S')}] 并发 {concurrency} | "
-                  f"批次 #{state.batch_count} | "
-                  f"进度: {elapsed_hours:.1f}h/{HOURS_PER_LEVEL}h ({progress:.1f}%)")
+            report(f"[{current_time.strftime('%H:%M:%S')}] 并发 {concurrency} | "
+                   f"批次 #{state.batch_count} | "
+                   f"进度: {elapsed_hours:.1f}h/{HOURS_PER_LEVEL}h ({progress:.1f}%)",
+                   "batch_started", concurrency=concurrency, batch=state.batch_count,
+                   progress_pct=round(progress, 1))
 
             # 测试三个 Tier
             for tier in SERVICE_TIERS:
+                batch_started = time.time()
                 result = test_concurrent_batch(tier, concurrency, state.batch_count)
 
                 save_to_csv({
@@ -353,15 +653,31 @@ def main():
                     'avg_client_latency': result['avg_client_latency'],
                     'avg_input_tokens': result['avg_input_tokens'],
                     'avg_output_tokens': result['avg_output_tokens'],
+                    'avg_cache_read_tokens': result['avg_cache_read_tokens'],
+                    'avg_cache_write_tokens': result['avg_cache_write_tokens'],
                     'batch_time': result['batch_time']
                 })
 
                 status = "✓" if result['failed'] == 0 else f"⚠️ {result['failed']}失败"
-                print(f"  {tier:8} {status} {result['avg_server_latency']:4.0f}ms "
-                      f"耗时: {result['batch_time']:.1f}s")
+                # 批次期间客户端主机本身的瓶颈（CPU / 换页 / fd / 端口），此时的延迟不能归因于 Bedrock
+                host = HOST_SAMPLER.pressure_between(batch_started, time.time()) if HOST_SAMPLER else []
+                report(f"  {tier:8} {status} {result['avg_server_latency']:4.0f}ms "
+                       f"耗时: {result['batch_time']:.1f}s" + (f" 🖥️ 主机瓶颈: {', '.join(host)}" if host else ""),
+                       "batch_result", logging.WARNING if result['failed'] else logging.INFO,
+                       tier=tier, concurrency=concurrency, batch=state.batch_count,
+                       successful=result['successful'], failed=result['failed'],
+                       avg_server_latency=round(result['avg_server_latency']),
+                       avg_client_latency=round(result['avg_client_latency']),
+                       batch_time=round(result['batch_time'], 2), host_pressure=host)
+                detect_changes(tier, concurrency, current_time, result)
+                # 缓存命中的 token 不计入 inputTokens，校准时加回
+                TOKEN_CALIBRATION.observe(TEST_ESTIMATE, result['avg_input_tokens'] + result['avg_cache_read_tokens']
+                                          + result['avg_cache_write_tokens'], result['successful'])
 
             # 保存状态
             state.save()
+            router.save_state(ROUTER_STATS_FILE)
+            TOKEN_CALIBRATION.save()
 
             # 等待
             sleep_time = REQUEST_INTERVAL_SECONDS - (datetime.now() - current_time).total_seconds()
@@ -369,7 +685,7 @@ def main():
                 time.sleep(sleep_time)
 
         # 完成当前级别，重置状态
-        print(f"\n✅ 并发级别 {concurrency} 完成\n")
+        report(f"\n✅ 并发级别 {concurrency} 完成\n", "level_completed", concurrency=concurrency)
         state.level_start_time = None
         state.batch_count = 0
         state.save()
@@ -382,7 +698,14 @@ def main():
     print(f"\n{'='*80}")
     print(f"✅ 测试完成")
     print(f"总运行时间: {total_time.total_seconds()/3600:.1f} 小时")
+    log_event("test_completed", hours=round(total_time.total_seconds() / 3600, 2), csv_file=CSV_FILE)
     print(f"数据文件: {CSV_FILE}")
+    print(f"token 校准: {TOKEN_CALIBRATION.path}（图片估算系数 ×{TOKEN_CALIBRATION.factor('image'):.3f}）")
+    if REQUEST_LOG is not None:
+        REQUEST_LOG.close()
+        print(f"逐请求记录: {REQUEST_LOG.path}（{REQUEST_LOG.spilled:,} 条，溢写 {REQUEST_LOG.spills} 次）")
+    if args.coalesce:
+        print(f"请求合并: {client.stats()}")
     print(f"{'='*80}\n")
 
 if __name__ == "__main__":
@@ -392,6 +715,7 @@ if __name__ == "__main__":
         print("\n\n⚠️  测试被用户中断，状态已保存")
     except Exception as e:
         print(f"\n\n❌ 测试出错: {e}")
+        log_event("crashed", logging.ERROR, error=str(e))
         import traceback
         traceback.print_exc()
         print("\n💡 状态已保存，可以重新运行脚本继续测试")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+成本感知的服务层级调度器
+- 每个请求带延迟 SLO，选择能满足截止时间的最便宜层级
+- 各层级延迟分布来自压测 CSV，并由线上完成的请求持续更新
+- 容忍延迟的请求进入 flex 批处理窗口统一发送
+- 只有 default 的预测 p95 会错过截止时间时才升级到 priority
+- 样本不足的层级先轮流试探，避免没有历史 CSV 时永远只用 priority
+- 报告每千次请求成本与 SLO 达成率
+"""
+
+import argparse
+import csv
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 从便宜到昂贵
+TIER_ORDER = ["flex", "default", "priority"]
+
+# 相对 default 的价格倍数（flex 约五折，priority 约 1.75 倍）
+TIER_PRICE_MULTIPLIER = {
+    "flex": 0.5,
+    "default": 1.0,
+    "priority": 1.75,
+}
+
+# 按需参考单价（美元 / 千 token），请按实际账单调整
+INPUT_PRICE_PER_1K = 0.0003
+OUTPUT_PRICE_PER_1K = 0.0025
+
+# 每个层级保留的延迟样本数
+MAX_SAMPLES = 2000
+# 样本数不足时该层级的 p95 不可信，先轮流试探；每个层级最多试探这么多次（失败不产生样本，也不会无限试探）
+MIN_SAMPLES_PER_TIER = 20
+
+
+def percentile(values, pct):
+    """
+    最近秩百分位数：排序后第 ceil(pct/100 * n) 个值
+
+    >>> percentile(range(1, 101), 95)
+    95
+    >>> percentile(range(1, 11), 50)
+    5
+    >>> percentile([1, 2], 50)
+    1
+    >>> percentile([3, 1, 2], 100), percentile([3, 1, 2], 0), percentile([], 50)
+    (3, 1, None)
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def request_cost(tier, input_tokens, output_tokens):
+    base = input_tokens / 1000 * INPUT_PRICE_PER_1K + output_tokens / 1000 * OUTPUT_PRICE_PER_1K
+    return base * TIER_PRICE_MULTIPLIER[tier]
+
+
+class TierLatencyModel:
+    """各服务层级的客户端延迟分布（毫秒）"""
+
+    def __init__(self):
+        self._samples = {tier: deque(maxlen=MAX_SAMPLES) for tier in TIER_ORDER}
+        self._lock = threading.Lock()
+
+    def record(self, tier, latency_ms, weight=1):
+        with self._lock:
+            self._samples[tier].extend([latency_ms] * weight)
+
+    def p95(self, tier):
+        with self._lock:
+            return percentile(list(self._samples[tier]), 95)
+
+    def count(self, tier):
+        with self._lock:
+            return len(self._samples[tier])
+
+    def load_csv(self, csv_path):
+        """从压测 CSV 学习：每批次的平均客户端延迟按成功数加权"""
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                successful = int(row["successful"])
+                if successful and row["tier"] in self._samples:
+                    self.record(row["tier"], float(row["avg_client_latency"]), weight=successful)
+
+
+class ScheduledRequest:
+    """一次调度请求及其结果"""
+
+    def __init__(self, body, slo_ms):
+        self.body = body
+        self.slo_ms = slo_ms
+        self.submit_time = time.time()
+        self.tier = None
+        self.latency_ms = None
+        self.success = False
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.future = Future()
+
+    @property
+    def met_slo(self):
+        return self.success and self.latency_ms <= self.slo_ms
+
+
+class TierScheduler:
+    """为每个请求选择满足 SLO 的最便宜层级"""
+
+    def __init__(self, client, model_id, latency_model=None, flex_window_s=2.0,
+                 flex_batch_size=16, max_workers=32, safety_margin=1.0, min_samples=MIN_SAMPLES_PER_TIER):
+        self.client = client
+        self.model_id = model_id
+        self.latency_model = latency_model or TierLatencyModel()
+        self.flex_window_s = flex_window_s
+        self.flex_batch_size = flex_batch_size
+        self.safety_margin = safety_margin
+        self.min_samples = min_samples
+        self.completed = []
+        self._probes = dict.fromkeys(TIER_ORDER, 0)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._flex_queue = []
+        self._flex_opened = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def choose_tier(self, slo_ms):
+        """样本不足的层级先轮流试探（便宜的优先），之后选 p95 满足 SLO 的最便宜层级；flex 需要额外扣除批处理窗口"""
+        with self._lock:
+            unexplored = [tier for tier in TIER_ORDER if self.latency_model.count(tier) < self.min_samples
+                          and self._probes[tier] < self.min_samples]
+            if unexplored:
+                tier = min(unexplored, key=lambda t: self._probes[t])
+                self._probes[tier] += 1
+                return tier
+        for tier in TIER_ORDER:
+            p95 = self.latency_model.p95(tier)
+            if p95 is None:
+                continue
+            budget = slo_ms - (self.flex_window_s * 1000 if tier == "flex" else 0)
+            if p95 * self.safety_margin <= budget:
+                return tier
+        return "priority"
+
+    def submit(self, body, slo_ms):
+        """提交请求，返回 Future，结果为 ScheduledRequest"""
+        request = ScheduledRequest(body, slo_ms)
+        request.tier = self.choose_tier(slo_ms)
+        if request.tier == "flex":
+            with self._lock:
+                if not self._flex_queue:
+                    self._flex_opened = time.time()
+                self._flex_queue.append(request)
+                full = len(self._flex_queue) >= self.flex_batch_size
+            if full:
+                self._flush_flex()
+        else:
+            self._pool.submit(self._execute, request)
+        return request.future
+
+    def _flush_loop(self):
+        while not self._stop.wait(0.05):
+            with self._lock:
+                due = self._flex_queue and time.time() - self._flex_opened >= self.flex_window_s
+            if due:
+                self._flush_flex()
+
+    def _flush_flex(self):
+        with self._lock:
+            batch, self._flex_queue = self._flex_queue, []
+        for request in batch:
+            self._pool.submit(self._execute, request)
+
+    def _execute(self, request):
+        params = {
+            "modelId": self.model_id,
+            "body": request.body,
+            "contentType": "application/json",
+            "accept": "application/json",
+        }
+        if request.tier != "default":
+            params["serviceTier"] = request.tier
+
+        start_time = time.time()
+        try:
+            response = self.client.invoke_model(**params)
+            usage = json.loads(response["body"].read()).get("usage", {})
+            self.latency_model.record(request.tier, (time.time() - start_time) * 1000)
+            request.success = True
+            request.input_tokens = usage.get("inputTokens", 0)
+            request.output_tokens = usage.get("outputTokens", 0)
+        except Exception:
+            request.success = False
+        # SLO 按端到端计算，包含 flex 窗口内的排队时间
+        request.latency_ms = (time.time() - request.submit_time) * 1000
+        with self._lock:
+            self.completed.append(request)
+        request.future.set_result(request)
+
+    def shutdown(self):
+        self._stop.set()
+        self._flusher.join()
+        self._flush_flex()
+        self._pool.shutdown(wait=True)
+
+    def report(self):
+        return summarize(self.completed)
+
+
+def summarize(requests):
+    """成本（每千次请求）与 SLO 达成率"""
+    by_tier = defaultdict(int)
+    total_cost = 0.0
+    met = 0
+    for request in requests:
+        by_tier[request.tier] += 1
+        if request.success:
+            total_cost += request_cost(request.tier, request.input_tokens, request.output_tokens)
+        if request.met_slo:
+            met += 1
+    count = len(requests)
+    return {
+        "requests": count,
+        "tiers": dict(by_tier),
+        "cost_per_1k_requests": total_cost / count * 1000 if count else 0.0,
+        "slo_attainment": met / count if count else 0.0,
+    }
+
+
+def main():
+    """对比调度器与固定层级：每千次请求成本 vs SLO 达成率"""
+    from stand_in_client import StandInClient
+
+    parser = argparse.ArgumentParser(description="成本感知服务层级调度器")
+    parser.add_argument("--csv", action="append", default=[], help="压测 CSV，用于学习各层级延迟分布，可多次指定")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--flex-window", type=float, default=0.5, help="flex 批处理窗口（秒）")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="替身端点延迟缩放，便于快速演示")
+    parser.add_argument("--interval", type=float, default=0.01, help="相邻请求的提交间隔（秒），让试探结果能用于后续请求")
+    args = parser.parse_args()
+
+    scale = args.latency_scale
+    rng = random.Random(0)
+
+    body = json.dumps({"schemaVersion": "messages-v1", "messages": [{"role": "user", "content": [{"text": "ping"}]}]})
+    # 混合负载：交互式（紧 SLO）、普通、离线（宽 SLO）
+    slos = [rng.choice([7000, 12000, 60000]) * scale for _ in range(args.requests)]
+
+    def run(policy):
+        # 没有 CSV 时各策略都从空的延迟模型开始，自适应策略靠试探学习
+        latency_model = TierLatencyModel()
+        for path in args.csv:
+            latency_model.load_csv(path)
+        client = StandInClient(latency_ms=8000 * scale, jitter_ms=1500 * scale, seed=1)
+        scheduler = TierScheduler(client, "us.amazon.nova-2-lite-v1:0", latency_model,
+                                  flex_window_s=args.flex_window, max_workers=args.requests)
+        if policy != "adaptive":
+            scheduler.choose_tier = lambda slo_ms: policy
+        futures = []
+        for slo in slos:
+            futures.append(scheduler.submit(body, slo))
+            time.sleep(args.interval)
+        for future in futures:
+            future.result()
+        scheduler.shutdown()
+        return scheduler.report()
+
+    print(f"\n{'='*80}")
+    print(f"{'策略':12} {'每千次成本($)':>14} {'SLO 达成率':>12}  层级分布")
+    print(f"{'='*80}")
+    for policy in ["adaptive"] + TIER_ORDER:
+        report = run(policy)
+        print(f"{policy:12} {report['cost_per_1k_requests']:14.4f} {report['slo_attainment']:12.1%}  {report['tiers']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+生产流量回放
+- 读取脱敏的请求日志（CSV 或 JSON lines），字段：
+    timestamp（ISO 或 epoch 秒）, input_tokens, output_tokens,
+    可选 model, tier, image_bytes, video_bytes, stream
+- 按记录合成同等规模的请求：提示词 token 数、图片字节数、输出上限与原请求一致
+- 按原始到达间隔发出（--time-scale 0.5 表示间隔减半、两倍速回放）
+- 同规格的记录共享回放前构造好的 Workload，媒体只读取 / 合成一次
+- 输出逐请求 CSV 和汇总：延迟分位数、调度滞后、与原请求的 token 吻合度
+
+视频无法合成，需用 --video-file 指定一个参考视频，否则视频记录会被跳过
+"""
+
+import argparse
+import copy
+import csv
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from image_preprocess import IMAGE_PIXELS_PER_TOKEN
+from scenario_runner import summarize
+from stand_in_client import StandInClient
+from tier_scheduler import percentile
+from workloads import Workload
+
+DEFAULT_MAX_IN_FLIGHT = 256
+
+# 合成的噪声 PNG 每像素约 3 字节
+SYNTH_BYTES_PER_PIXEL = 3
+
+
+def _timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _int(value):
+    return int(float(value)) if value not in (None, "") else 0
+
+
+def load_trace(path):
+    """读取并按时间排序的请求记录列表"""
+    path = Path(path)
+    with open(path) as f:
+        if path.suffix in (".jsonl", ".json"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    records = []
+    for row in rows:
+        records.append({
+            "timestamp": _timestamp(str(row["timestamp"])),
+            "model": row.get("model") or None,
+            "tier": row.get("tier") or "default",
+            "input_tokens": _int(row.get("input_tokens")),
+            "output_tokens": _int(row.get("output_tokens")),
+            "image_bytes": _int(row.get("image_bytes")),
+            "video_bytes": _int(row.get("video_bytes")),
+            "stream": str(row.get("stream", "")).lower() in ("1", "true", "yes"),
+        })
+    records.sort(key=lambda r: r["timestamp"])
+    return records
+
+
+def image_tokens(image_bytes):
+    """按字节数估计合成图片的 token 数"""
+    if not image_bytes:
+        return 0
+    return math.ceil(image_bytes / SYNTH_BYTES_PER_PIXEL / IMAGE_PIXELS_PER_TOKEN)
+
+
+def record_shape(record, video_file=None):
+    """记录的请求规格 (负载类型, 媒体类型, 模型, 层级, 图片字节数)；无法合成时返回 None"""
+    if record["video_bytes"]:
+        if not video_file:
+            return None
+        kind = "video"
+    elif record["image_bytes"]:
+        kind = "image"
+    else:
+        kind = "text"
+    return ("streaming" if record["stream"] else kind, kind, record["model"], record["tier"],
+            record["image_bytes"] if kind == "image" else 0)
+
+
+def shape_workload(shape, default_model, video_file=None):
+    """按规格构造 Workload（读取 / 合成媒体），token 相关字段由 record_workload 逐条填写"""
+    workload_type, kind, model, tier, image_bytes = shape
+    spec = {"name": workload_type, "type": workload_type, "model": model or default_model, "tier": tier}
+    if kind == "image":
+        spec["image_bytes"] = image_bytes
+    elif kind == "video":
+        spec["video"] = video_file
+    return Workload(spec, default_model=default_model)
+
+
+def build_workloads(records, default_model, video_file=None):
+    """每种规格只构造一次：{规格: Workload}，回放开始前调用，避免在调度线程上读文件、编码媒体"""
+    workloads = {}
+    for record in records:
+        shape = record_shape(record, video_file)
+        if shape is not None and shape not in workloads:
+            workloads[shape] = shape_workload(shape, default_model, video_file)
+    return workloads
+
+
+def record_workload(record, default_model, video_file=None, workloads=None):
+    """一条记录 → Workload；无法合成时返回 None
+
+    给了 workloads（build_workloads 的结果）时浅拷贝同规格的 Workload，媒体共享，只替换 token 相关字段
+    """
+    shape = record_shape(record, video_file)
+    if shape is None:
+        return None
+    base = workloads.get(shape) if workloads is not None else None
+    workload = copy.copy(base) if base is not None else shape_workload(shape, default_model, video_file)
+    workload.max_tokens = max(1, record["output_tokens"])
+    workload.prompt_tokens = max(1, record["input_tokens"] - image_tokens(record["image_bytes"]))
+    # 要求模型写到接近原输出长度（英文约 0.75 词 / token），maxTokens 负责截断
+    workload.prompt = (f"Repeat the words below, then keep writing until you reach about "
+                       f"{max(1, record['output_tokens'] * 3 // 4)} words.")
+    return workload
+
+
+class TraceReplayer:
+    """按原始到达间隔开环回放"""
+
+    def __init__(self, client, records, default_model, time_scale=1.0, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 video_file=None, on_start=None, on_result=None):
+        self.client = client
+        self.records = records
+        self.default_model = default_model
+        self.time_scale = time_scale
+        self.max_in_flight = max_in_flight
+        self.video_file = video_file
+        self.on_start = on_start
+        self.on_result = on_result
+        self.rows = []
+        self.results = []
+        self.skipped = 0
+        self.dropped = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def _send(self, index, record, workload, scheduled):
+        lag_ms = int((time.time() - scheduled) * 1000)
+        if self.on_start:
+            self.on_start(record)
+        result = workload.run(self.client, record["tier"], index)
+        row = {
+            "index": index,
+            "offset_s": round(scheduled - self._start, 3),
+            "lag_ms": lag_ms,
+            **result.to_row(),
+            "trace_input_tokens": record["input_tokens"],
+            "trace_output_tokens": record["output_tokens"],
+            "image_bytes": record["image_bytes"],
+        }
+        with self._lock:
+            self.rows.append(row)
+            self.results.append(result)
+        if self.on_result:
+            self.on_result(result)
+
+    def run(self, should_continue=lambda: True):
+        if not self.records:
+            return self
+        t0 = self.records[0]["timestamp"]
+        workloads = build_workloads(self.records, self.default_model, self.video_file)
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._start = time.time()
+
+        def task(*args):
+            try:
+                self._send(*args)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            for index, record in enumerate(self.records):
+                if not should_continue():
+                    break
+                workload = record_workload(record, self.default_model, self.video_file, workloads)
+                if workload is None:
+                    self.skipped += 1
+                    continue
+                scheduled = self._start + (record["timestamp"] - t0) * self.time_scale
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                # 在途达到上限时丢弃而不是排队，排队会把服务端延迟伪装成到达间隔
+                if not slots.acquire(blocking=False):
+                    self.dropped += 1
+                    continue
+                pool.submit(task, index, record, workload, scheduled)
+        self.duration = time.time() - self._start
+        self.rows.sort(key=lambda r: r["index"])
+        return self
+
+    def report(self):
+        summary = summarize(self.results, self.duration, self.dropped)
+        ok = [r for r in self.rows if r["ok"]]
+
+        def token_ratio(actual, trace):
+            pairs = [(r[actual], r[trace]) for r in ok if r[actual] and r[trace]]
+            return round(sum(a for a, _ in pairs) / sum(t for _, t in pairs), 3) if pairs else None
+
+        trace_span = self.records[-1]["timestamp"] - self.records[0]["timestamp"] if self.records else 0
+        summary.update({
+            "trace_records": len(self.records),
+            "skipped": self.skipped,
+            "trace_span_s": round(trace_span, 1),
+            "replay_span_s": round(self.duration, 1),
+            "p95_lag_ms": percentile([r["lag_ms"] for r in self.rows], 95),
+            "input_token_ratio": token_ratio("input_tokens", "trace_input_tokens"),
+            "output_token_ratio": token_ratio("output_tokens", "trace_output_tokens"),
+        })
+        return summary
+
+    def save_csv(self, path):
+        if not self.rows:
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+def print_report(report):
+    print(f"\n📊 回放 {report['requests']}/{report['trace_records']} 条 "
+          f"(跳过 {report['skipped']}, 丢弃 {report['dropped']}) | "
+          f"原始跨度 {report['trace_span_s']}s → 回放 {report['replay_span_s']}s")
+    print(f"   成功 {report['successful']} | 失败 {report['failed']} (限流 {report['throttled']}) | "
+          f"{report['throughput_rps']:.2f} req/s")
+    print(f"   延迟 p50 {report['p50_latency_ms']}ms | p95 {report['p95_latency_ms']}ms | "
+          f"p99 {report['p99_latency_ms']}ms | 调度滞后 p95 {report['p95_lag_ms']}ms")
+    print(f"   token 吻合度（实际/原始）: 输入 {report['input_token_ratio']} | 输出 {report['output_token_ratio']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按生产请求日志回放负载')
+    parser.add_argument('trace', help='请求日志（.csv 或 .jsonl）')
+    parser.add_argument('--region', default='us-west-2')
+    parser.add_argument('--model', default='us.amazon.nova-2-lite-v1:0', help='日志中未给出 model 时使用')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='到达间隔缩放（0.5 = 两倍速）')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument('--video-file', help='视频记录使用的参考视频')
+    parser.add_argument('--stand-in', action='store_true', help='使用本地替身端点')
+    parser.add_argument('--output', help='逐请求结果 CSV')
+    args = parser.parse_args()
+
+    records = load_trace(args.trace)
+    if not records:
+        print("❌ 日志为空")
+        sys.exit(1)
+    if args.stand_in:
+        client = StandInClient(region=args.region)
+    else:
+        import boto3
+        client = boto3.client("bedrock-runtime", region_name=args.region)
+
+    span = records[-1]["timestamp"] - records[0]["timestamp"]
+    print(f"▶️  回放 {len(records)} 条记录，原始跨度 {span:.0f}s，预计 {span * args.time_scale:.0f}s")
+    replayer = TraceReplayer(client, records, args.model, args.time_scale, args.max_in_flight,
+                             args.video_file).run()
+    print_report(replayer.report())
+    if args.output:
+        replayer.save_csv(args.output)
+        print(f"📁 结果: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
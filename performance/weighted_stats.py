@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+按请求数加权的统计层
+- CSV 每行是一个批次的平均值，不同批次成功数不同，不能直接对平均值再求平均
+- 均值 / 标准差按 successful 加权；token 总量 = 批次平均值 × 成功数
+- 95% 置信区间使用以批次为簇的稳健标准误
+- 分位数为按请求数加权的批次平均延迟分位数（逐请求数据见每请求记录）
+- 全部向量化，统计量可合并（流式聚合同样适用）
+"""
+
+import math
+
+import numpy as np
+
+Z_95 = 1.959964
+
+
+class WeightedStats:
+    """可合并的加权统计：均值、标准差、置信区间、最值"""
+
+    def __init__(self):
+        self.batches = 0
+        self.sum_w = 0.0
+        self.sum_wx = 0.0
+        self.sum_wx2 = 0.0
+        # 簇稳健标准误所需的二阶量
+        self.sum_w2 = 0.0
+        self.sum_w2x = 0.0
+        self.sum_w2x2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add_array(self, values, weights):
+        values = np.asarray(values, dtype='float64')
+        weights = np.asarray(weights, dtype='float64')
+        mask = weights > 0
+        if not mask.any():
+            return
+        x, w = values[mask], weights[mask]
+        self.batches += int(mask.sum())
+        self.sum_w += float(w.sum())
+        self.sum_wx += float((w * x).sum())
+        self.sum_wx2 += float((w * x * x).sum())
+        self.sum_w2 += float((w * w).sum())
+        self.sum_w2x += float((w * w * x).sum())
+        self.sum_w2x2 += float((w * w * x * x).sum())
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+
+    def add(self, value, weight):
+        """单个批次（标量版 add_array，增量聚合逐行折叠时使用）"""
+        if weight <= 0:
+            return
+        x, w = float(value), float(weight)
+        self.batches += 1
+        self.sum_w += w
+        self.sum_wx += w * x
+        self.sum_wx2 += w * x * x
+        self.sum_w2 += w * w
+        self.sum_w2x += w * w * x
+        self.sum_w2x2 += w * w * x * x
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        vars(stats).update(data)
+        return stats
+
+    def merge(self, other):
+        for name in ('batches', 'sum_w', 'sum_wx', 'sum_wx2', 'sum_w2', 'sum_w2x', 'sum_w2x2'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.sum_wx / self.sum_w if self.sum_w else float('nan')
+
+    @property
+    def std(self):
+        """批次平均值的加权标准差"""
+        if not self.sum_w:
+            return float('nan')
+        return math.sqrt(max(0.0, self.sum_wx2 / self.sum_w - self.mean ** 2))
+
+    @property
+    def stderr(self):
+        """以批次为簇的稳健标准误：sqrt(Σ w²(x - x̄)² · k/(k-1)) / Σw"""
+        if self.batches < 2:
+            return float('nan')
+        m = self.mean
+        ss = self.sum_w2x2 - 2 * m * self.sum_w2x + m * m * self.sum_w2
+        return math.sqrt(max(0.0, ss) * self.batches / (self.batches - 1)) / self.sum_w
+
+    @property
+    def ci95(self):
+        half = Z_95 * self.stderr
+        return (self.mean - half, self.mean + half)
+
+
+def weighted_quantiles(values, weights, quantiles):
+    """加权分位数（向量化），weights 为 0 的行被忽略"""
+    values = np.asarray(values, dtype='float64')
+    weights = np.asarray(weights, dtype='float64')
+    mask = weights > 0
+    if not mask.any():
+        return [float('nan')] * len(quantiles)
+    order = np.argsort(values[mask], kind='stable')
+    x = values[mask][order]
+    cumulative = np.cumsum(weights[mask][order])
+    targets = np.asarray(quantiles) * cumulative[-1]
+    return x[np.minimum(np.searchsorted(cumulative, targets, side='left'), len(x) - 1)].tolist()
+
+
+def weighted_group_mean(df, by, column, weight='successful'):
+    """按 by 分组的加权均值（Series），无成功请求的组为 NaN"""
+    frame = df[[column, weight]].copy()
+    if isinstance(by, str):
+        by = [by]
+    for key in by:
+        frame[key] = df[key]
+    frame['_wx'] = frame[column] * frame[weight]
+    sums = frame.groupby(by, observed=True)[['_wx', weight]].sum()
+    result = sums['_wx'] / sums[weight].where(sums[weight] > 0)
+    result.name = column
+    return result
+
+
+def weighted_group_std(df, by, column, weight='successful'):
+    """按 by 分组的加权标准差（Series）"""
+    mean = weighted_group_mean(df, by, column, weight)
+    frame = df[[column, weight]].copy()
+    if isinstance(by, str):
+        by = [by]
+    for key in by:
+        frame[key] = df[key]
+    frame['_wx2'] = frame[column] ** 2 * frame[weight]
+    sums = frame.groupby(by, observed=True)[['_wx2', weight]].sum()
+    variance = sums['_wx2'] / sums[weight].where(sums[weight] > 0) - mean ** 2
+    return np.sqrt(variance.clip(lower=0))
+
+
+def token_totals(df):
+    """真实 token 总量：批次平均值 × 成功请求数"""
+    return (float((df['avg_input_tokens'] * df['successful']).sum()),
+            float((df['avg_output_tokens'] * df['successful']).sum()))
+
+
+def window_throughput(df, window='1h'):
+    """每个时间窗口的 请求/秒 与 token/秒（DataFrame，索引为窗口起点）"""
+    frame = df[['timestamp', 'successful', 'failed']].copy()
+    frame['tokens'] = (df['avg_input_tokens'] + df['avg_output_tokens']) * df['successful']
+    frame['requests'] = frame['successful'] + frame['failed']
+    sums = frame.set_index('timestamp').resample(window)[['requests', 'successful', 'tokens']].sum()
+    seconds = sums.index.freq.nanos / 1e9
+    return sums.assign(
+        requests_per_sec=sums['requests'] / seconds,
+        tokens_per_sec=sums['tokens'] / seconds,
+    )
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+压测工作负载：请求体构造与单次调用计时
+- 支持 text / image / video / embedding / streaming 五种负载
+- 文本可直接给 prompt，也可按 prompt_tokens 合成指定长度的提示词
+- 图片可给文件路径，也可按 image_bytes 合成指定大小的 PNG（随机像素，不可压缩）
+- 图片文件可声明 preprocess（true 或 {max_edge, format, quality, cache_dir}），上传前缩放并重新编码
+- 媒体文件只读取、编码一次，在同一负载的所有请求间复用
+- 可声明 system 提示词和 cache（none / system / media / all，true 等同 all），在对应位置插入提示词缓存点
+- 对真实 boto3 客户端和 StandInClient 均适用
+"""
+
+import base64
+import json
+import math
+import random
+import struct
+import time
+import zlib
+from pathlib import Path
+
+from prompt_cache import CACHE_PLACEMENTS, add_cache_points, cache_usage
+
+WORKLOAD_TYPES = ("text", "image", "video", "embedding", "streaming")
+
+DEFAULT_PROMPT = "What do you see in this image?"
+DEFAULT_EMBEDDING_MODEL = "amazon.nova-2-multimodal-embeddings-v1:0"
+
+# 合成提示词时的近似换算（英文约 4 字符 / token）
+CHARS_PER_TOKEN = 4
+_FILLER_WORDS = ("latency", "region", "throughput", "image", "model", "request", "tier", "token",
+                 "benchmark", "capacity", "response", "stream", "payload", "batch", "window", "cache")
+
+
+def synth_text(tokens, seed=0):
+    """合成约 tokens 个 token 的英文文本（确定性，不同 seed 内容不同，避免命中缓存）"""
+    words = []
+    length = 0
+    i = seed
+    while length < tokens * CHARS_PER_TOKEN:
+        word = _FILLER_WORDS[i % len(_FILLER_WORDS)]
+        words.append(word)
+        length += len(word) + 1
+        i = i * 7 + 3
+    return " ".join(words)
+
+
+def synth_png(target_bytes, seed=0):
+    """合成约 target_bytes 字节的 RGB 噪声 PNG（纯标准库）"""
+    side = max(1, math.ceil(math.sqrt(target_bytes / 3)))
+    rng = random.Random(seed)
+    # 每行前一个字节为过滤类型 0
+    raw = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+
+    def png_chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + png_chunk(b"IDAT", zlib.compress(raw, 1))
+            + png_chunk(b"IEND", b""))
+
+
+_synth_cache = {}
+
+
+def synth_png_base64(target_bytes):
+    """按两位有效数字分桶缓存，回放大量记录时不重复生成"""
+    bucket = int(float(f"{target_bytes:.2g}"))
+    if bucket not in _synth_cache:
+        _synth_cache[bucket] = base64.b64encode(synth_png(bucket, bucket)).decode("utf-8")
+    return _synth_cache[bucket]
+
+
+def is_throttle(error):
+    return "ThrottlingException" in str(error) or "TooManyRequests" in str(error)
+
+
+class RequestResult:
+    """单次请求的计时和用量"""
+
+    def __init__(self, workload, tier, ok, latency_ms, ttft_ms=None, input_tokens=0, output_tokens=0,
+                 error=None, throttled=False, cache_read_tokens=0, cache_write_tokens=0):
+        self.workload = workload
+        self.tier = tier
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.ttft_ms = ttft_ms
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.error = error
+        self.throttled = throttled
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+        self.finished_at = time.time()
+
+    def to_row(self):
+        return {
+            "finished_at": round(self.finished_at, 3),
+            "workload": self.workload,
+            "tier": self.tier,
+            "ok": self.ok,
+            "latency_ms": self.latency_ms,
+            "ttft_ms": self.ttft_ms,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "throttled": self.throttled,
+            "error": self.error,
+        }
+
+
+class Workload:
+    """由场景文件中的一项负载声明构造"""
+
+    def __init__(self, spec, base_dir=".", default_model=None):
+        self.type = spec["type"]
+        if self.type not in WORKLOAD_TYPES:
+            raise ValueError(f"未知负载类型: {self.type}（可选: {', '.join(WORKLOAD_TYPES)}）")
+        self.name = spec.get("name", self.type)
+        self.weight = float(spec.get("weight", 1))
+        self.tier = spec.get("tier")
+        self.model = spec.get("model") or (DEFAULT_EMBEDDING_MODEL if self.type == "embedding" else default_model)
+        self.prompt = spec.get("prompt")
+        self.system = spec.get("system")
+        cache = spec.get("cache", "none")
+        self.cache = {True: "all", False: "none"}.get(cache, cache)
+        if self.cache not in CACHE_PLACEMENTS:
+            raise ValueError(f"负载 {self.name} 的 cache 无效: {cache}（可选: {', '.join(CACHE_PLACEMENTS)}）")
+        self.prompt_tokens = spec.get("prompt_tokens")
+        self.max_tokens = int(spec.get("max_tokens", 100))
+        self.temperature = float(spec.get("temperature", 0.7))
+        self.dimension = int(spec.get("dimension", 1024))
+        self.media = None
+        media_path = spec.get("image") or spec.get("video")
+        if media_path:
+            path = Path(base_dir) / media_path
+            self.media = {
+                "kind": "video" if "video" in spec else "image",
+                "format": path.suffix.lstrip(".").lower().replace("jpg", "jpeg"),
+                "bytes": base64.b64encode(path.read_bytes()).decode("utf-8"),
+            }
+            if spec.get("preprocess") and self.media["kind"] == "image":
+                from image_preprocess import ImagePreprocessor
+                options = spec["preprocess"] if isinstance(spec["preprocess"], dict) else {}
+                image = ImagePreprocessor(**options).process(path.read_bytes())
+                self.media.update(format=image.format, bytes=image.base64)
+        elif spec.get("image_bytes"):
+            self.media = {"kind": "image", "format": "png", "bytes": synth_png_base64(int(spec["image_bytes"]))}
+        elif self.type in ("image", "video"):
+            raise ValueError(f"负载 {self.name} 缺少 {self.type} 文件路径")
+
+    def _prompt(self, request_id):
+        if self.prompt_tokens:
+            # 给了 prompt 时作为指令放在合成文本之前
+            text = synth_text(int(self.prompt_tokens), request_id)
+            return f"{self.prompt}\n{text}" if self.prompt else text
+        prompt = self.prompt or (DEFAULT_PROMPT if self.media else "Describe a high-throughput benchmark.")
+        return f"{prompt} Test ID: {request_id}"
+
+    def build_body(self, request_id):
+        if self.type == "embedding":
+            return {
+                "taskType": "SINGLE_EMBEDDING",
+                "singleEmbeddingParams": {
+                    "embeddingPurpose": "GENERIC_INDEX",
+                    "embeddingDimension": self.dimension,
+                    "text": {"truncationMode": "END", "value": self._prompt(request_id)},
+                },
+            }
+
+        content = []
+        if self.media:
+            content.append({self.media["kind"]: {"format": self.media["format"],
+                                                 "source": {"bytes": self.media["bytes"]}}})
+        content.append({"text": self._prompt(request_id)})
+        body = {"schemaVersion": "messages-v1"}
+        if self.system:
+            body["system"] = [{"text": self.system}]
+        body["messages"] = [{"role": "user", "content": content}]
+        body["inferenceConfig"] = {"maxTokens": self.max_tokens, "temperature": self.temperature}
+        if self.cache != "none":
+            add_cache_points(body, self.cache)
+        return body
+
+    def build_params(self, tier, request_id):
+        params = {
+            "modelId": self.model,
+            "body": json.dumps(self.build_body(request_id)),
+            "contentType": "application/json",
+            "accept": "application/json",
+        }
+        tier = self.tier or tier
+        if tier and tier != "default" and self.type != "embedding":
+            params["serviceTier"] = tier
+        return params
+
+    def run(self, client, tier, request_id):
+        """执行一次请求，异常不向外抛出，统一记录为失败结果"""
+        tier = self.tier or tier or "default"
+        params = self.build_params(tier, request_id)
+        start = time.time()
+        try:
+            if self.type == "streaming":
+                return self._run_stream(client, params, tier, start)
+            response = client.invoke_model(**params)
+            model_response = json.loads(response["body"].read())
+            latency = int((time.time() - start) * 1000)
+            return self._result(tier, latency, model_response.get("usage", {}))
+        except Exception as e:
+            return RequestResult(self.name, tier, False, int((time.time() - start) * 1000),
+                                 error=str(e)[:200], throttled=is_throttle(e))
+
+    def _run_stream(self, client, params, tier, start):
+        response = client.invoke_model_with_response_stream(**params)
+        ttft = None
+        usage = {}
+        for event in response["body"]:
+            chunk = event.get("chunk")
+            if not chunk:
+                continue
+            payload = json.loads(chunk["bytes"])
+            if ttft is None and "contentBlockDelta" in payload:
+                ttft = int((time.time() - start) * 1000)
+            if "metadata" in payload:
+                usage = payload["metadata"].get("usage", {})
+        return self._result(tier, int((time.time() - start) * 1000), usage, ttft)
+
+    def _result(self, tier, latency, usage, ttft=None):
+        cache_read, cache_write = cache_usage(usage)
+        return RequestResult(self.name, tier, True, latency, ttft_ms=ttft,
+                             input_tokens=usage.get("inputTokens", 0),
+                             output_tokens=usage.get("outputTokens", 0),
+                             cache_read_tokens=cache_read, cache_write_tokens=cache_write)
@@ -8,9 +8,15 @@ client = boto3.client(
 )
 
 MODEL_ID = "us.amazon.nova-lite-v1:0"
+# Inline media counts toward the 25MB request limit after Base64 encoding (4/3 of the file size).
+MAX_INLINE_PAYLOAD_BYTES = 25 * 1024 * 1024
 # Open the image you'd like to use and encode it as a Base64 string.
 with open("./media/animals.mp4", "rb") as video_file:
     binary_data = video_file.read()
+    if len(binary_data) * 4 / 3 > MAX_INLINE_PAYLOAD_BYTES:
+        # Fail before uploading; larger videos must be read from S3 ("source": {"s3Location": {"uri": ...}}),
+        # e.g. `nova video ./media/animals.mp4 --upload-to s3://my-bucket/prefix`
+        raise SystemExit(f"Video is {len(binary_data) / 1024 ** 2:.1f}MB, too large to send inline; use S3 instead")
     base_64_encoded_data = base64.b64encode(binary_data)
     base64_string = base_64_encoded_data.decode("utf-8")
 # Define your system prompt(s).